@@ -0,0 +1,300 @@
+"""
+Benchmarks the loaders and models on synthetic data, without network access:
+
+    python -m benchmarks.run --stations 100 --years 30 --cities 16 --output benchmark.json
+
+Each stage runs in a fresh process, so its peak memory is not mixed with the other stages. The peak RSS is the one of
+that process, the workers RSS is the peak of its largest worker process (RUSAGE_CHILDREN), so the memory of the
+workers of a parallel stage is at most the number of workers times that. The loaders of large frames also report
+the size of the frame they return (result), to compare it with the stage RSS. Pass the JSON of a previous run with
+--baseline to print the speedup of each stage.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks import synthetic
+
+
+def _memory_status_mb(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    return None
+
+
+def _reset_peak_rss():
+    # The high water mark (VmHWM) is reset to the current resident set size, Linux 4.0 or newer.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _rss_mb() -> float:
+    rss_mb = _memory_status_mb("VmRSS")
+    return 0.0 if rss_mb is None else rss_mb
+
+
+def _peak_rss_mb() -> float:
+    peak_rss_mb = _memory_status_mb("VmHWM")
+    # ru_maxrss (in KiB on Linux) is kept across exec, so it may include the memory of the parent process.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if peak_rss_mb is None else peak_rss_mb
+
+
+def _workers_peak_rss_mb() -> float:
+    # ru_maxrss of the children is the peak of the largest terminated (and waited for) child, in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def _bench_ecad_load(options: Dict) -> float:
+    from src.ECADDataset import ECADMeanTemperatureDataset
+
+    dataset = ECADMeanTemperatureDataset(compact=options.get("compact", False))
+    dataset.load_mean_temperature_files_by_station_id(-1, num_workers=options.get("num_workers", 1))
+    return dataset.mean_temperatures.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def _bench_noaa_load(options: Dict):
+    from src.NOAA2010Dataset import NOAA2010Dataset
+
+    NOAA2010Dataset().load_data(engine=options.get("engine", "pandas"))
+
+
+def _bench_inspire_load(options: Dict):
+    from src.InsPireDataset import InsPireDataset
+
+    InsPireDataset().load_data(num_workers=options.get("num_workers", 1))
+
+
+def _bench_processed_load(options: Dict):
+    from src.InsPireDataset import InsPireDataset
+    from src.NOAA2010Dataset import NOAA2010Dataset
+
+    for dataset in [InsPireDataset(), NOAA2010Dataset()]:
+        dataset.load_processed_data(columns=options.get("columns"))
+
+
+def _bench_processed_scale(options: Dict):
+    from src.processed_data import load_processed_cities
+
+    load_processed_cities(options["paths"], columns=options.get("columns"))
+
+
+def _bench_ground_temperature(options: Dict):
+    from src.functions import ground_temperature_day, ground_temperature_hour
+
+    hours = np.arange(1, options["num_years"] * synthetic.HOURS_IN_YEAR + 1)
+    depths = np.linspace(0.5, 20, options["num_depths"])
+    for model in ["banks", "kusuda"]:
+        ground_temperature_hour(hours, depths, [5e-7, 7e-7, 9e-7], Tg_und=12, DT_y=10, dd_min=30, dd_max=210,
+                                model=model)
+        ground_temperature_day(np.arange(1, 366), depths, [0.04, 0.06, 0.08], Tg_und=12, DT_y=10, dd_min=30,
+                               dd_max=210, model=model)
+
+
+# A stage may return the size in MB of the frame it loads.
+STAGES: Dict[str, Callable[[Dict], Optional[float]]] = {"ecad_load": _bench_ecad_load,
+                                                        "noaa_load": _bench_noaa_load,
+                                                        "inspire_load": _bench_inspire_load,
+                                                        "processed_load": _bench_processed_load,
+                                                        "processed_scale": _bench_processed_scale,
+                                                        "ground_temperature": _bench_ground_temperature}
+
+
+def _run_stage(connection, root: str, stage: str, options: Dict):
+    # Runs in a fresh process: the datasets read from ./data, relative to root.
+    try:
+        os.chdir(root)
+        if options.get("clear_excel_cache", False):
+            from src.cache import EXCEL_CACHE_DIR
+            shutil.rmtree(EXCEL_CACHE_DIR, ignore_errors=True)
+
+        _reset_peak_rss()
+        baseline_rss_mb = _rss_mb()
+        start = time.perf_counter()
+        result_mb = STAGES[stage](options)
+        wall_time = time.perf_counter() - start
+        peak_rss_mb = _peak_rss_mb()
+
+        connection.send({"wall_time_s": wall_time,
+                         "peak_rss_mb": peak_rss_mb,
+                         "stage_peak_rss_mb": peak_rss_mb - baseline_rss_mb,
+                         "workers_peak_rss_mb": _workers_peak_rss_mb(),
+                         "result_mb": result_mb})
+    except BaseException as e:
+        connection.send(RuntimeError(f"Stage '{stage}' failed: {e!r}"))
+        raise
+    finally:
+        connection.close()
+
+
+def run_stage(root: str, name: str, stage: str, options: Optional[Dict] = None) -> Dict:
+    """
+    Runs a stage in a new process and measures its wall time and peak memory (resident set size).
+
+    :param root: Folder with the synthetic data folder (root/data).
+    :param name: Name of the measurement in the report.
+    :param stage: Key of the stage in STAGES.
+    :param options: Options passed to the stage.
+    :return: A dictionary with the name, the options and the measurements.
+    """
+    options = dict() if options is None else options
+    # Not a pool: stages such as the parallel ECAD loader start their own worker processes.
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_stage, args=(sender, root, stage, options))
+    process.start()
+    sender.close()
+    try:
+        measurements = receiver.recv()
+    except EOFError:
+        measurements = RuntimeError(f"Stage '{stage}' exited with code {process.exitcode}.")
+    process.join()
+
+    if isinstance(measurements, Exception):
+        raise measurements
+
+    reported_options = {key: value for key, value in options.items() if key != "paths"}
+    return {"name": name, "stage": stage, "options": reported_options, **measurements}
+
+
+def generate_data(root: str, num_stations: int, num_years: int, num_cities: int, seed: int = 0) -> Dict:
+    """
+    Writes every synthetic input under root and returns the paths the stages need, along with the parameters of the
+    data.
+    """
+    generated = {"parameters": {"stations": num_stations, "years": num_years, "cities": num_cities, "seed": seed}}
+    start = time.perf_counter()
+    synthetic.write_ecad_dataset(root, num_stations=num_stations, num_years=num_years, seed=seed)
+    synthetic.write_noaa_dataset(root, num_stations=num_stations, seed=seed)
+    synthetic.write_inspire_dataset(root, seed=seed)
+    synthetic.write_processed_dataset(root, num_years=1, seed=seed)
+    generated["processed_paths"] = synthetic.write_processed_cities(root, num_cities=num_cities, num_years=num_years,
+                                                                   seed=seed)
+    print(f"Generated synthetic data in {root} ({time.perf_counter() - start:.1f} s).")
+
+    return generated
+
+
+def benchmark_plan(generated: Dict, num_years: int, num_workers: int) -> List[Dict]:
+    """
+    :return: The stages to run, as keyword arguments of run_stage.
+    """
+    projected_columns = ["air_temp", "season", "dayofweek", "hour", "E_el", "Total_consumption"]
+    plan = [dict(name="ecad_load", stage="ecad_load", options={}),
+            dict(name="ecad_load_compact", stage="ecad_load", options={"compact": True}),
+            dict(name="noaa_load_pandas", stage="noaa_load", options={"engine": "pandas"}),
+            dict(name="noaa_load_pyarrow", stage="noaa_load", options={"engine": "pyarrow"}),
+            # The cold load starts without the Excel cache and fills it, the next ones read from it.
+            dict(name="inspire_load_cold", stage="inspire_load", options={"clear_excel_cache": True}),
+            dict(name="inspire_load_cached", stage="inspire_load", options={}),
+            dict(name="processed_load", stage="processed_load", options={}),
+            dict(name="processed_load_columns", stage="processed_load", options={"columns": projected_columns}),
+            dict(name="processed_scale", stage="processed_scale", options={"paths": generated["processed_paths"]}),
+            dict(name="processed_scale_columns", stage="processed_scale",
+                 options={"paths": generated["processed_paths"], "columns": projected_columns}),
+            dict(name="ground_temperature", stage="ground_temperature",
+                 options={"num_years": num_years, "num_depths": 50})]
+    if num_workers > 1:
+        plan.insert(1, dict(name=f"ecad_load_{num_workers}_workers", stage="ecad_load",
+                            options={"num_workers": num_workers}))
+        # Also from a cold Excel cache, otherwise it would time the parquet reads of the cache.
+        plan.insert(7, dict(name=f"inspire_load_{num_workers}_workers", stage="inspire_load",
+                            options={"num_workers": num_workers, "clear_excel_cache": True}))
+
+    return plan
+
+
+def print_report(results: List[Dict], baseline: Optional[List[Dict]] = None):
+    baseline_by_name = {result["name"]: result for result in (baseline or [])}
+
+    header = (f"{'stage':<32}{'wall time [s]':>15}{'peak RSS [MB]':>15}{'stage RSS [MB]':>16}{'workers RSS [MB]':>18}"
+              f"{'result [MB]':>13}")
+    if len(baseline_by_name) > 0:
+        header += f"{'speedup':>10}"
+    print(header)
+    for result in results:
+        line = (f"{result['name']:<32}{result['wall_time_s']:>15.3f}{result['peak_rss_mb']:>15.1f}"
+                f"{result['stage_peak_rss_mb']:>16.1f}{result['workers_peak_rss_mb']:>18.1f}")
+        # Reports of previous runs have no result size.
+        line += "-".rjust(13) if result.get("result_mb") is None else f"{result['result_mb']:>13.1f}"
+        if result["name"] in baseline_by_name:
+            line += f"{baseline_by_name[result['name']]['wall_time_s'] / result['wall_time_s']:>9.2f}x"
+        print(line)
+
+
+def main(arguments: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmarks the loaders and models on synthetic data.")
+    parser.add_argument("--stations", type=int, default=50, help="Number of ECAD and NOAA stations.")
+    parser.add_argument("--years", type=int, default=10, help="Years of ECAD data and of the scaled processed files.")
+    parser.add_argument("--cities", type=int, default=16, help="Number of scaled processed files.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Workers of the parallel stages, 1 skips them.")
+    parser.add_argument("--stages", nargs="*", default=None, help="Names of the stages to run, all by default.")
+    parser.add_argument("--data-dir", default=None,
+                        help="Folder for the synthetic data, reused if it has data. A temporary folder by default.")
+    parser.add_argument("--output", default=None, help="Path of the JSON report.")
+    parser.add_argument("--baseline", default=None, help="JSON report of a previous run to compare with.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(arguments)
+
+    repository_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    root = tempfile.mkdtemp(prefix="benchmark-") if args.data_dir is None else os.path.abspath(args.data_dir)
+    try:
+        generated_path = os.path.join(root, "generated.json")
+        if os.path.exists(generated_path):
+            with open(generated_path) as f:
+                generated = json.load(f)
+            print(f"Reusing the synthetic data in {root} ({generated['parameters']}).")
+        else:
+            generated = generate_data(root, args.stations, args.years, args.cities, seed=args.seed)
+            with open(generated_path, "w") as f:
+                json.dump(generated, f)
+
+        # The stages import src from the repository, not from the data folder.
+        os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [repository_path, os.environ.get("PYTHONPATH")]))
+
+        plan = benchmark_plan(generated, generated["parameters"]["years"], args.workers)
+        if args.stages is not None:
+            plan = [step for step in plan if step["name"] in args.stages]
+
+        results = []
+        for step in plan:
+            results.append(run_stage(root, **step))
+            print(f"{step['name']}: {results[-1]['wall_time_s']:.3f} s")
+
+        baseline = None
+        if args.baseline is not None:
+            with open(args.baseline) as f:
+                baseline = json.load(f)["results"]
+        print_report(results, baseline)
+
+        if args.output is not None:
+            report = {"parameters": {**generated["parameters"], "workers": args.workers},
+                      "platform": {"python": sys.version.split()[0], "cpu_count": os.cpu_count()},
+                      "results": results}
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        if args.data_dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src.InsPireDataset import InsPireDataset
+from src.NOAA2010Dataset import NOAA2010Dataset
+
+
+HOURS_IN_YEAR = 8760
+
+_HEAT_DEMAND_COLUMNS = ["DHW_cons", "SH_cons", "SFH_bldg_tot", "MFH_bldg_tot", "%SH_y", "%DHW_y", "Gas_price_ind",
+                        "Gas_price_res", "El_price_ind", "El_price_res", "WH_price", "CO2_gas"]
+
+# Workbooks shared by the cities of a dataset, with the name of their value column.
+_PROFILE_WORKBOOKS = {"dhw_random_profile.xlsx": "DHW Profile",
+                      "sh_random_profile.xlsx": "SH Profile",
+                      "sc_random_profile.xlsx": "SC Profile",
+                      "carbon_emissions_hourly.xlsx": "carbon_factor_el"}
+
+_NOAA_STATION_IDS = {NOAA2010Dataset.MIAMI_FL: "USW00012839",
+                     NOAA2010Dataset.FRESNO_CA: "USW00093193",
+                     NOAA2010Dataset.OLYMPIA_WA: "USW00024227",
+                     NOAA2010Dataset.ROCHESTER_NY: "USW00014768"}
+
+_INSPIRE_WORKBOOKS = {InsPireDataset.LONDON_UK: "London.xls",
+                      InsPireDataset.MADRID_SPA: "Madrid.xls",
+                      InsPireDataset.ROME_IT: "Rome.xls",
+                      InsPireDataset.STUTTGART_GER: "Stuttgart.xls"}
+
+_PROCESSED_FILENAMES = {InsPireDataset.LONDON_UK: "london_uk_data",
+                        InsPireDataset.MADRID_SPA: "madrid_spa_data",
+                        InsPireDataset.ROME_IT: "rome_it_data",
+                        InsPireDataset.STUTTGART_GER: "stuttgart_ger_data",
+                        NOAA2010Dataset.MIAMI_FL: "miami_fl_data",
+                        NOAA2010Dataset.FRESNO_CA: "fresno_ca_data",
+                        NOAA2010Dataset.OLYMPIA_WA: "olympia_wa_data",
+                        NOAA2010Dataset.ROCHESTER_NY: "rochester_ny_data"}
+
+# Number of extra float columns of a processed file, besides the named ones. Real processed files have ~80 columns.
+_NUM_EXTRA_PROCESSED_COLUMNS = 50
+
+
+def _seasonal_temperatures(rng: np.random.RandomState, times: np.ndarray, period: float) -> np.ndarray:
+    mean = rng.uniform(5, 20)
+    amplitude = rng.uniform(5, 15)
+    phase = rng.uniform(0, 2 * np.pi)
+    return mean + amplitude * np.sin(2 * np.pi * times / period + phase) + rng.normal(0, 3, len(times))
+
+
+def write_shared_workbooks(folder: str, city_keys: List[str], seed: int = 0):
+    """
+    Writes the heat demand and hour-of-day profile workbooks that InsPire and NOAA read along the city data.
+    """
+    rng = np.random.RandomState(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    heat_demand = pd.DataFrame({"city": [city_key.split("_")[0].title() for city_key in city_keys],
+                                "city_key": city_keys,
+                                **{column: rng.uniform(0, 1, len(city_keys)) for column in _HEAT_DEMAND_COLUMNS}})
+    heat_demand.to_excel(os.path.join(folder, "heat_demand.xlsx"), index=False)
+
+    for filename, column in _PROFILE_WORKBOOKS.items():
+        profile = pd.DataFrame({"Hour": np.arange(1, 25), column: rng.uniform(0, 1, 24)})
+        profile.to_excel(os.path.join(folder, filename), index=False)
+
+
+def write_inspire_dataset(root: str, seed: int = 0) -> str:
+    """
+    Writes the InsPire workbooks (one hourly air temperature workbook per city, 8761 hours as the original ones)
+    under root/data/insPire.
+
+    :return: The folder of the dataset.
+    """
+    rng = np.random.RandomState(seed)
+    folder = os.path.join(root, "data", "insPire")
+    write_shared_workbooks(folder, list(_INSPIRE_WORKBOOKS) + list(_NOAA_STATION_IDS), seed=seed)
+
+    hours = np.arange(1, HOURS_IN_YEAR + 2)
+    for filename in _INSPIRE_WORKBOOKS.values():
+        city = pd.DataFrame({"Hour": hours, "Temperature": _seasonal_temperatures(rng, hours, HOURS_IN_YEAR)})
+        # The content is xlsx even if the extension is .xls, readers detect the format from the content.
+        city.to_excel(os.path.join(folder, filename), index=False, engine="openpyxl")
+
+    # Typical heating and cooling load of each month in MW, the thermal load that replaces the demand of the cities.
+    thermal_load = pd.DataFrame({"month": np.arange(1, 13),
+                                 "heating_profile": rng.uniform(0, 10, 12),
+                                 "cooling_profile": rng.uniform(0, 5, 12)})
+    thermal_load.to_excel(os.path.join(folder, "thermal_demand_monthly.xlsx"), index=False)
+
+    return folder
+
+
+def write_noaa_dataset(root: str, num_stations: int = 4, seed: int = 0) -> str:
+    """
+    Writes the NOAA hourly normals export (data.csv) under root/data/NOAA2010Dataset. Besides the four stations used by
+    NOAA2010Dataset, num_stations - 4 extra stations are written, which the loader reads and discards, like a larger
+    multi-station export would be.
+
+    :return: The folder of the dataset.
+    """
+    rng = np.random.RandomState(seed)
+    folder = os.path.join(root, "data", "NOAA2010Dataset")
+    write_shared_workbooks(folder, list(_NOAA_STATION_IDS) + list(_INSPIRE_WORKBOOKS), seed=seed)
+
+    station_ids = list(_NOAA_STATION_IDS.values())
+    station_ids += [f"USW{90000 + i:08d}" for i in range(max(num_stations - len(station_ids), 0))]
+
+    # The export has no first hour of the year and no year in the timestamps.
+    timestamps = pd.date_range("2010-01-01 01:00", "2010-12-31 23:00", freq="H").strftime("%m-%dT%H:%M:%S")
+    hours = np.arange(len(timestamps))
+
+    with open(os.path.join(folder, "data.csv"), "w") as f:
+        f.write("STATION,NAME,LATITUDE,LONGITUDE,ELEVATION,DATE,HLY-CLDH-NORMAL,HLY-CLDH-NORMAL_ATTRIBUTES,"
+                "HLY-DEWP-NORMAL,HLY-DEWP-NORMAL_ATTRIBUTES,HLY-HIDX-NORMAL,HLY-HIDX-NORMAL_ATTRIBUTES,"
+                "HLY-HTDH-NORMAL,HLY-HTDH-NORMAL_ATTRIBUTES,HLY-TEMP-NORMAL,HLY-TEMP-NORMAL_ATTRIBUTES,"
+                "HLY-WCHL-NORMAL,HLY-WCHL-NORMAL_ATTRIBUTES\n")
+        for station_id in station_ids:
+            prefix = f"{station_id},SYNTHETIC {station_id} US,25.7906,-80.3164,8.8,"
+            temperatures = np.round(_seasonal_temperatures(rng, hours, len(hours)) * 9 / 5 + 32, 1)
+            f.writelines(f"{prefix}{timestamp},0.0,C,60.2,C,72.0,C,0.0,C,{temperature},C,72.0,C\n"
+                         for timestamp, temperature in zip(timestamps, temperatures))
+
+    return folder
+
+
+def write_ecad_dataset(root: str, num_stations: int, num_years: int, seed: int = 0) -> str:
+    """
+    Writes an extracted ECA&D blended mean temperature dataset under root/data/ECADMeanTemperatureDataset: the
+    stations metadata and one TG_STAIDXXXXXX.txt file per station with num_years of daily values. About 5% of the
+    values have the quality code 9 (missing).
+
+    :return: The folder of the dataset.
+    """
+    rng = np.random.RandomState(seed)
+    folder = os.path.join(root, "data", "ECADMeanTemperatureDataset")
+    os.makedirs(folder, exist_ok=True)
+
+    country_codes = ["DE", "ES", "FR", "IT", "NL", "SE"]
+    with open(os.path.join(folder, "stations.txt"), "w") as f:
+        f.writelines(f"Synthetic ECA&D station list, line {i + 1}\n" for i in range(17))
+        f.write("STAID,STANAME                                 ,CN,      LAT,       LON,  HGHT\n")
+        f.writelines(f"{station_id:6d},{f'SYNTHETIC {station_id}':40s},{country_codes[station_id % 6]},"
+                     f"+48:00:00,+009:00:00,{station_id % 1000:5d}\n"
+                     for station_id in range(1, num_stations + 1))
+
+    dates = pd.date_range(f"{2020 - num_years}-01-01", periods=num_years * 365, freq="D").strftime("%Y%m%d")
+    days = np.arange(len(dates))
+    for station_id in range(1, num_stations + 1):
+        temperatures = np.round(_seasonal_temperatures(rng, days, 365.25) * 10).astype(np.int64)
+        quality_codes = np.where(rng.uniform(size=len(days)) < 0.05, 9, 0)
+        temperatures[quality_codes == 9] = -9999
+
+        with open(os.path.join(folder, f"TG_STAID{station_id:06d}.txt"), "w") as f:
+            f.writelines(f"Synthetic ECA&D mean temperature file, line {i + 1}\n" for i in range(20))
+            f.write("STAID, SOUID,    DATE,   TG, Q_TG\n")
+            f.writelines(f"{station_id:6d},{100000 + station_id:6d},{date},{temperature:5d},{quality_code:5d}\n"
+                         for date, temperature, quality_code in zip(dates, temperatures, quality_codes))
+
+    return folder
+
+
+def synthetic_processed_frame(num_years: int, seed: int = 0, city_key: str = "synthetic") -> pd.DataFrame:
+    """
+    :return: A processed city frame with the columns read by the visualization notebook (plus filler float
+    columns), num_years of hourly rows and the loads in kW, as saved by the processing notebook.
+    """
+    rng = np.random.RandomState(seed)
+    index = pd.date_range("2017-01-01", periods=num_years * HOURS_IN_YEAR, freq="H", name="timestamp")
+    num_hours = len(index)
+    hours = np.arange(num_hours)
+
+    air_temp = _seasonal_temperatures(rng, hours, HOURS_IN_YEAR)
+    seasons = np.array(["winter", "spring", "summer", "fall"])[((index.month.to_numpy() % 12) // 3)]
+    data = pd.DataFrame({"air_temp": air_temp,
+                         "air_temp_fit": air_temp - rng.normal(0, 3, num_hours),
+                         "ground_temp": np.full(num_hours, 12.0),
+                         "aquifer_temp": np.full(num_hours, 14.0),
+                         "net_temp": rng.uniform(10, 20, num_hours),
+                         "source1_temp": rng.uniform(20, 40, num_hours),
+                         "source2_temp": rng.uniform(20, 40, num_hours),
+                         "source1_cap": rng.uniform(0, 1, num_hours),
+                         "source2_cap": rng.uniform(0, 1, num_hours),
+                         "COP": rng.uniform(3, 6, num_hours),
+                         "E_loss_tot": rng.uniform(0, 100, num_hours),
+                         "heat_source1": rng.uniform(0, 1000, num_hours),
+                         "heat_source2": rng.uniform(0, 1000, num_hours),
+                         "heat_aquifer": rng.uniform(0, 1000, num_hours),
+                         "E_el": rng.uniform(0, 500, num_hours),
+                         "Total_consumption": np.maximum(0, 18 - air_temp) * 100,
+                         "Total_consumption_fit": np.maximum(0, 18 - air_temp) * 100,
+                         "city_key": city_key,
+                         "season": pd.Categorical(seasons),
+                         "date": index.date,
+                         "month": index.month,
+                         "dayofweek": index.dayofweek,
+                         "hour": index.hour,
+                         "hourofyear": (index.dayofyear - 1) * 24 + index.hour + 1},
+                        index=index)
+    filler = pd.DataFrame(rng.normal(size=(num_hours, _NUM_EXTRA_PROCESSED_COLUMNS)),
+                          index=index,
+                          columns=[f"extra_{i}" for i in range(_NUM_EXTRA_PROCESSED_COLUMNS)])
+
+    return pd.concat([data, filler], axis=1)
+
+
+def write_processed_dataset(root: str, num_years: int = 1, seed: int = 0) -> Dict[str, str]:
+    """
+    Writes processed parquet files for the InsPire and NOAA cities, in the paths used by load_processed_data.
+
+    :return: A dictionary with the path (without extension) of the processed file of each city.
+    """
+    paths = dict()
+    for i, (city_key, filename) in enumerate(_PROCESSED_FILENAMES.items()):
+        dataset_folder = "insPire" if city_key in _INSPIRE_WORKBOOKS else "NOAA2010Dataset"
+        folder = os.path.join(root, "data", dataset_folder, "processed")
+        os.makedirs(folder, exist_ok=True)
+
+        paths[city_key] = os.path.join(folder, filename)
+        synthetic_processed_frame(num_years, seed=seed + i, city_key=city_key).to_parquet(f"{paths[city_key]}.parquet")
+
+    return paths
+
+
+def write_processed_cities(root: str, num_cities: int, num_years: int, seed: int = 0) -> Dict[str, str]:
+    """
+    Writes num_cities processed parquet files under root/data/synthetic/processed, for scaling the processed readers
+    beyond the eight cities of the datasets.
+
+    :return: A dictionary with the path (without extension) of the processed file of each city.
+    """
+    folder = os.path.join(root, "data", "synthetic", "processed")
+    os.makedirs(folder, exist_ok=True)
+
+    paths = dict()
+    for i in range(num_cities):
+        city_key = f"city_{i:04d}"
+        paths[city_key] = os.path.join(folder, f"{city_key}_data")
+        synthetic_processed_frame(num_years, seed=seed + i, city_key=city_key).to_parquet(f"{paths[city_key]}.parquet")
+
+    return paths
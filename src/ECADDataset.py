@@ -1,41 +1,658 @@
 import io
+import json
 import zipfile
+import zlib
 import requests
 import os
 import re
-from typing import Optional, List, Union
+from collections import deque
+from itertools import groupby
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, Optional, List, Tuple, Union
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.functions import DAYS_IN_YEAR, fit_sinusoids
+from src.instrumentation import LoaderStats, ProgressHook, rate_limited_progress
+
+
+# Each TG_STAIDXXXXXX.txt file has 20 lines of description and one line of column names before the measurements.
+_MEAN_TEMPERATURE_FILE_HEADER_LINES = 21
+
+# Roughly ten years of daily measurements per row group, which lets date filters skip whole row groups.
+_STORE_ROW_GROUP_SIZE = 3660
+
+_DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+_MEAN_TEMPERATURE_FILENAME_REGEX = re.compile(r'^TG_STAID(\d{6}).txt$')
+
+# Store files of a station: the base file (TG_STAIDXXXXXX.parquet) and the rows appended by each refresh, named after
+# their first date (TG_STAIDXXXXXX.YYYYMMDD.parquet).
+_STORE_FILENAME_REGEX = re.compile(r'^TG_STAID(\d{6})(?:\.(\d{8}))?\.parquet$')
+
+_MANIFEST_FILENAME = "manifest.json"
+
+REFRESH_ACTIONS = ("added", "appended", "rewritten", "removed")
+
+# Columns of the statistics table of stream_mean_temperature_climatology, temperatures in °C.
+CLIMATOLOGY_STATISTICS = ["first_date", "last_date", "num_days", "num_years", "mean_temperature", "d_shift_min",
+                          "d_shift_max", "heating_degree_days", "cooling_degree_days"]
+
+ANNUAL_CLIMATOLOGY_COLUMNS = ["num_days", "mean_temperature", "heating_degree_days", "cooling_degree_days"]
+
+_DAYS_IN_LEAP_YEAR = 366
+
+# 29 February is the 60th day (position 59) of a leap year. The days of the year of the climatology follow the leap-year
+# calendar, so 29 February has its own bin and every other date falls in the same bin in every year.
+_LEAP_DAY_POSITION = 59
+
+
+# Days of the compact date_offset column are counted from this date.
+MEAN_TEMPERATURE_DATE_ORIGIN = np.datetime64("1970-01-01", "D")
+
+_MEAN_TEMPERATURE_DTYPES = {"station_id": np.int32,
+                            "source_id": np.int32,
+                            "date": "datetime64[ns]",
+                            "mean_temperature": np.int32,
+                            "quality_code": np.int8}
+
+# Mean temperatures are given in 0.1 °C, so they fit in 16 bits, as well as the station IDs.
+_COMPACT_MEAN_TEMPERATURE_DTYPES = {"station_id": np.uint16,
+                                    "source_id": np.uint32,
+                                    "date_offset": np.int32,
+                                    "mean_temperature": np.int16,
+                                    "quality_code": np.int8}
+
+_QUALITY_CODE_DTYPE = pd.CategoricalDtype(categories=[0, 1, 9])
+
+
+def _compact_mean_temperatures(data: pd.DataFrame) -> pd.DataFrame:
+    for column in ["station_id", "source_id", "mean_temperature"]:
+        if data.shape[0] > 0 and data[column].max() > np.iinfo(_COMPACT_MEAN_TEMPERATURE_DTYPES[column]).max:
+            raise ValueError(f"Values of '{column}' do not fit in the compact representation.")
+
+    date_offset = (data["date"].to_numpy().astype("datetime64[D]") - MEAN_TEMPERATURE_DATE_ORIGIN).astype(np.int32)
+
+    return pd.DataFrame({"station_id": data["station_id"].to_numpy().astype(np.uint16),
+                         "source_id": data["source_id"].to_numpy().astype(np.uint32),
+                         "date_offset": date_offset,
+                         "mean_temperature": data["mean_temperature"].to_numpy().astype(np.int16),
+                         "quality_code": data["quality_code"].to_numpy()})
+
+
+def _read_mean_temperature_file(full_filename_path: Union[str, io.BytesIO],
+                                compact: bool = False,
+                                has_header: bool = True) -> pd.DataFrame:
+    data = pd.read_csv(full_filename_path,
+                       sep=",",
+                       skiprows=20 if has_header else None,
+                       header=0 if has_header else None,
+                       parse_dates=["date"],
+                       infer_datetime_format=True,
+                       names=["station_id",
+                              "source_id",
+                              "date",
+                              "mean_temperature",
+                              "quality_code"],
+                       dtype={"station_id": np.int32,
+                              "source_id": np.int32,
+                              "mean_temperature": np.int32,
+                              "quality_code": np.int8})
+
+    # By the data docs, invalid measures have the quality_code on 9.
+    data = data[data.quality_code != 9]
+
+    return _compact_mean_temperatures(data) if compact else data
+
+
+def _read_mean_temperature_files_batch(full_filename_paths: List[str], compact: bool) -> Dict[str, np.ndarray]:
+    data = pd.concat([_read_mean_temperature_file(full_filename_path, compact=compact)
+                      for full_filename_path in full_filename_paths])
+
+    return {column: data[column].to_numpy() for column in data.columns}
+
+
+def _mean_temperatures_frame(batches: Iterator[Dict[str, np.ndarray]], dtypes: Dict) -> pd.DataFrame:
+    """
+    Builds the frame of the columns of the batches. The columns are wrapped (not copied) as chunks of an Arrow table,
+    which is converted to pandas one column at a time, freeing the chunks of each column once it is converted. So the
+    peak memory is the size of the frame plus one of its columns, whereas pd.concat or pd.DataFrame (which
+    consolidates the columns of the same dtype) copy every column while its chunks are still alive.
+    """
+    chunks = {column: [] for column in dtypes}
+    for batch_columns in batches:
+        for column, values in batch_columns.items():
+            chunks[column].append(pa.array(values))
+
+    table = pa.table({column: pa.chunked_array(chunks.pop(column), type=pa.from_numpy_dtype(np.dtype(dtype)))
+                      for column, dtype in dtypes.items()})
+    return table.to_pandas(split_blocks=True, self_destruct=True, use_threads=False)
+
+
+def _manifest_entry(filename: str, content: bytes) -> Dict:
+    """
+    :return: The manifest entry of an extracted file: its size and CRC-32 (as in the zip directory). Entries of mean
+    temperature files also have the offset, size and CRC-32 of the measurements (the lines after the header), their
+    number of lines and the last date.
+    """
+    if _MEAN_TEMPERATURE_FILENAME_REGEX.match(filename) is None:
+        return {"size": len(content), "crc32": zlib.crc32(content)}
+
+    data_offset = 0
+    for _ in range(_MEAN_TEMPERATURE_FILE_HEADER_LINES):
+        data_offset = content.find(b"\n", data_offset) + 1
+        if data_offset == 0:
+            data_offset = len(content)
+            break
+
+    data = content[data_offset:]
+    lines = data.rstrip().rsplit(b"\n", 1)
+    last_date = None
+    if len(lines[-1]) > 0:
+        last_date = datetime.strptime(lines[-1].split(b",")[2].strip().decode("ascii"), "%Y%m%d").strftime("%Y-%m-%d")
+
+    return {"size": len(content),
+            "crc32": zlib.crc32(content),
+            "data_offset": data_offset,
+            "data_size": len(data),
+            "data_crc32": zlib.crc32(data),
+            "num_lines": data.count(b"\n"),
+            "last_date": last_date}
+
+
+def _appended_measurements(content: bytes, entry: Dict, new_entry: Dict) -> Optional[bytes]:
+    """
+    :return: The measurements added to the end of a file whose previous version had the given manifest entry, or None
+    if the previous measurements changed (or did not end with a complete line), i.e., the file was rewritten.
+    """
+    data = content[new_entry["data_offset"]:]
+    if (new_entry["data_size"] < entry["data_size"]
+            or zlib.crc32(data[:entry["data_size"]]) != entry["data_crc32"]
+            or (entry["data_size"] > 0 and data[entry["data_size"] - 1:entry["data_size"]] != b"\n")):
+        return None
+
+    return data[entry["data_size"]:]
+
+
+def _write_mean_temperatures_to_store(data: pd.DataFrame, store_filename_path: str):
+    # Files are written first to a temporary path, so an interrupted build never leaves half-written partitions.
+    os.makedirs(os.path.dirname(store_filename_path), exist_ok=True)
+    data.to_parquet(path=f"{store_filename_path}.tmp",
+                    engine="pyarrow",
+                    index=False,
+                    row_group_size=_STORE_ROW_GROUP_SIZE)
+    os.replace(f"{store_filename_path}.tmp", store_filename_path)
+
+
+def _write_mean_temperature_file_to_store(full_filename_path: str, store_filename_path: str) -> int:
+    data = _read_mean_temperature_file(full_filename_path)
+    _write_mean_temperatures_to_store(data, store_filename_path)
+
+    return data.shape[0]
+
+
+def _dates_from_integers(dates: np.ndarray) -> np.ndarray:
+    """
+    :param dates: Dates as YYYYMMDD integers, as written in the mean temperature files.
+    :return: The dates as datetime64[D], without parsing strings.
+    """
+    dates = dates.astype(np.int64)
+    months = (dates // 10000 - 1970) * 12 + dates // 100 % 100 - 1
+    return months.astype("datetime64[M]") + (dates % 100 - 1).astype("timedelta64[D]")
+
+
+def _mean_temperature_file_chunks(full_filename_path: str,
+                                  chunk_size: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    :return: The dates (datetime64[D]) and mean temperatures (0.1 °C) of the valid measurements of a file, parsing at
+    most chunk_size lines at a time.
+    """
+    reader = pd.read_csv(full_filename_path,
+                         sep=",",
+                         skiprows=20,
+                         header=0,
+                         names=["station_id", "source_id", "date", "mean_temperature", "quality_code"],
+                         usecols=["date", "mean_temperature", "quality_code"],
+                         dtype={"date": np.int32, "mean_temperature": np.int32, "quality_code": np.int8},
+                         chunksize=chunk_size)
+    for chunk in reader:
+        valid = chunk["quality_code"].to_numpy() != 9
+        yield _dates_from_integers(chunk["date"].to_numpy()[valid]), chunk["mean_temperature"].to_numpy()[valid]
+
+
+def _store_file_chunks(store_filename_path: str) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    :return: The dates (datetime64[D]) and mean temperatures (0.1 °C) of the valid measurements of a store file, one
+    row group at a time.
+    """
+    parquet_file = pq.ParquetFile(store_filename_path)
+    for row_group in range(parquet_file.num_row_groups):
+        chunk = parquet_file.read_row_group(row_group, columns=["date", "mean_temperature", "quality_code"])
+        chunk = chunk.to_pandas()
+        valid = chunk["quality_code"].to_numpy() != 9
+        yield (chunk["date"].to_numpy()[valid].astype("datetime64[D]"),
+               chunk["mean_temperature"].to_numpy()[valid])
+
+
+class _StationClimatology(object):
+    """
+    Running sums of the valid mean temperatures of one station by day of the year and by year. Its size does not
+    depend on the number of measurements.
+    """
+
+    def __init__(self, heating_base_temperature: float, cooling_base_temperature: float):
+        self.heating_base_temperature = heating_base_temperature
+        self.cooling_base_temperature = cooling_base_temperature
+
+        self.day_of_year_sums = np.zeros(_DAYS_IN_LEAP_YEAR)
+        self.day_of_year_counts = np.zeros(_DAYS_IN_LEAP_YEAR, dtype=np.int64)
+        # Number of days, and sums of the temperatures and the heating and cooling degrees of each year.
+        self.annual_sums: Dict[int, np.ndarray] = dict()
+        self.first_date: Optional[np.datetime64] = None
+        self.last_date: Optional[np.datetime64] = None
+
+    def update(self, dates: np.ndarray, mean_temperatures: np.ndarray):
+        if dates.shape[0] == 0:
+            return
+
+        # Mean temperatures are given in 0.1 °C.
+        temperatures = mean_temperatures / 10
+        years = dates.astype("datetime64[Y]")
+        days_of_year = (dates - years).astype(np.int64)
+        calendar_years = years.astype(np.int64) + 1970
+        is_leap_year = (calendar_years % 4 == 0) & ((calendar_years % 100 != 0) | (calendar_years % 400 == 0))
+        # From 1 March on, the dates of common years move one bin forward to match the leap-year calendar.
+        days_of_year += (~is_leap_year & (days_of_year >= _LEAP_DAY_POSITION)).astype(np.int64)
+        self.day_of_year_sums += np.bincount(days_of_year, weights=temperatures, minlength=_DAYS_IN_LEAP_YEAR)
+        self.day_of_year_counts += np.bincount(days_of_year, minlength=_DAYS_IN_LEAP_YEAR)
+
+        unique_years, year_positions = np.unique(calendar_years, return_inverse=True)
+        annual_sums = np.stack([np.bincount(year_positions, minlength=unique_years.shape[0]),
+                                np.bincount(year_positions, weights=temperatures),
+                                np.bincount(year_positions,
+                                            weights=np.maximum(self.heating_base_temperature - temperatures, 0)),
+                                np.bincount(year_positions,
+                                            weights=np.maximum(temperatures - self.cooling_base_temperature, 0))],
+                               axis=1)
+        for year, year_sums in zip(unique_years.tolist(), annual_sums):
+            self.annual_sums[year] = self.annual_sums.get(year, 0) + year_sums
+
+        first_date, last_date = dates.min(), dates.max()
+        self.first_date = first_date if self.first_date is None else min(self.first_date, first_date)
+        self.last_date = last_date if self.last_date is None else max(self.last_date, last_date)
+
+    def statistics(self) -> Dict:
+        num_days = int(self.day_of_year_counts.sum())
+        annual_sums = (np.sum(list(self.annual_sums.values()), axis=0)
+                       if len(self.annual_sums) > 0
+                       else np.zeros(4))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            day_of_year_means = self.day_of_year_sums / self.day_of_year_counts
+
+        has_days = num_days > 0
+        return {"first_date": self.first_date,
+                "last_date": self.last_date,
+                "num_days": num_days,
+                "num_years": len(self.annual_sums),
+                "mean_temperature": annual_sums[1] / num_days if has_days else np.nan,
+                "d_shift_min": int(np.nanargmin(day_of_year_means)) + 1 if has_days else -1,
+                "d_shift_max": int(np.nanargmax(day_of_year_means)) + 1 if has_days else -1,
+                "heating_degree_days": annual_sums[2] / num_days * DAYS_IN_YEAR if has_days else np.nan,
+                "cooling_degree_days": annual_sums[3] / num_days * DAYS_IN_YEAR if has_days else np.nan}
+
+    def day_of_year_means(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (self.day_of_year_sums / self.day_of_year_counts).astype(np.float32)
+
+    def annual_rows(self) -> List[Tuple]:
+        return [(year, int(num_days), year_sum / num_days, heating_degrees, cooling_degrees)
+                for year, (num_days, year_sum, heating_degrees, cooling_degrees) in sorted(self.annual_sums.items())]
 
 
 class ECADMeanTemperatureDataset(object):
-    def __init__(self):
-        self._dataset_url = "https://knmi-ecad-assets-prd.s3.amazonaws.com/download/ECA_blend_tg.zip"
+    def __init__(self, dataset_url: Optional[str] = None, compact: bool = False):
+        """
+
+        :param dataset_url: URL of the dataset zip. By default, the ECA&D blended mean temperatures.
+        :param compact: If True, then mean_temperatures uses narrow integer types for the IDs and the temperatures,
+        and replaces the date column by date_offset, the number of days since MEAN_TEMPERATURE_DATE_ORIGIN.
+        """
+        self._dataset_url = ("https://knmi-ecad-assets-prd.s3.amazonaws.com/download/ECA_blend_tg.zip"
+                             if dataset_url is None
+                             else dataset_url)
+        self._dataset_local_zip_path = os.path.join(".", "data", "ECA_blend_tg.zip")
         self._dataset_local_extract_path = os.path.join(".", "data", "ECADMeanTemperatureDataset")
 
         self._dataset_stations_path = os.path.join(self._dataset_local_extract_path, "stations.txt")
         self._dataset_elements_path = os.path.join(self._dataset_local_extract_path, "elements.txt")
         self._dataset_sources_path = os.path.join(self._dataset_local_extract_path, "sources.txt")
 
+        # Columnar copy of the mean temperature files: one parquet file per station, partitioned by country code
+        # (country_code=XX/TG_STAIDXXXXXX.parquet).
+        self._dataset_store_path = os.path.join(self._dataset_local_extract_path, "columnar_store")
+        self._dataset_store_success_path = os.path.join(self._dataset_store_path, "_SUCCESS")
+
+        # Size, checksums and last date of each extracted file, plus the validators of the downloaded zip, so
+        # refresh_dataset only updates what changed.
+        self._dataset_manifest_path = os.path.join(self._dataset_local_extract_path, _MANIFEST_FILENAME)
+
         self.stations: Optional[pd.DataFrame] = None
         self.elements: Optional[pd.DataFrame] = None
         self.sources: Optional[pd.DataFrame] = None
         self.mean_temperatures: Optional[pd.DataFrame] = None
 
+        self.compact = compact
+        self.stats = LoaderStats(type(self).__name__)
+
         self.dataset_exists_locally = (os.path.exists(self._dataset_local_extract_path)
                                        and os.path.isdir(self._dataset_local_extract_path))
 
-    def _save_dataset_on_local_disk(self):
-        dataset_zip_content = requests.get(self._dataset_url, stream=True).content
-        with zipfile.ZipFile(file=io.BytesIO(dataset_zip_content), mode="r") as zip_dataset:
-            zip_dataset.extractall(self._dataset_local_extract_path)
+    @property
+    def columnar_store_exists(self) -> bool:
+        return os.path.exists(self._dataset_store_success_path)
+
+    def _download_dataset_zip(self):
+        """
+        Streams the dataset zip to disk in chunks. The download is written to a .part file first, if it gets
+        interrupted, then the next call resumes it with an HTTP range request. The range is conditional (If-Range) on
+        the validators of the interrupted download, so a zip that changed in the meantime is downloaded again from the
+        beginning, as are the downloads from servers that ignore the range.
+        """
+        if os.path.exists(self._dataset_local_zip_path):
+            return
+
+        partial_zip_path = f"{self._dataset_local_zip_path}.part"
+        partial_source_path = f"{partial_zip_path}.json"
+        num_downloaded_bytes = os.path.getsize(partial_zip_path) if os.path.exists(partial_zip_path) else 0
+        source = None
+        if num_downloaded_bytes > 0 and os.path.exists(partial_source_path):
+            with open(partial_source_path, "r") as f:
+                source = json.load(f)
+
+        headers = None
+        if num_downloaded_bytes > 0:
+            headers = {"Range": f"bytes={num_downloaded_bytes}-"}
+            validator = None if source is None else (source.get("etag") or source.get("last_modified"))
+            if validator is not None:
+                headers["If-Range"] = validator
+
+        os.makedirs(os.path.dirname(self._dataset_local_zip_path), exist_ok=True)
+        with requests.get(self._dataset_url, stream=True, headers=headers, timeout=60) as response:
+            # The server cannot serve bytes past the end of the file, i.e., the previous download was complete.
+            if response.status_code != 416:
+                response.raise_for_status()
+
+                if response.status_code != 206:
+                    num_downloaded_bytes = 0
+                    source = {"url": self._dataset_url,
+                              "etag": response.headers.get("ETag"),
+                              "last_modified": response.headers.get("Last-Modified")}
+                    with open(partial_source_path, "w") as f:
+                        json.dump(source, f)
+
+                with open(partial_zip_path, "ab" if response.status_code == 206 else "wb") as f:
+                    for chunk in response.iter_content(chunk_size=_DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+
+        if not zipfile.is_zipfile(partial_zip_path):
+            os.remove(partial_zip_path)
+            if os.path.exists(partial_source_path):
+                os.remove(partial_source_path)
+            # A resumed download may be corrupt (e.g., the zip shrank and the range was past its end), the next
+            # download starts from the beginning.
+            if num_downloaded_bytes > 0:
+                return self._download_dataset_zip()
+            raise zipfile.BadZipFile(f"The file downloaded from {self._dataset_url} is not a zip.")
+
+        os.replace(partial_zip_path, self._dataset_local_zip_path)
+        if os.path.exists(partial_source_path):
+            os.remove(partial_source_path)
+
+        # The validators let the first refresh_dataset skip the download if the zip did not change.
+        if source is not None and not os.path.exists(self._dataset_manifest_path):
+            os.makedirs(self._dataset_local_extract_path, exist_ok=True)
+            self._write_manifest({"source": source, "files": dict()})
+
+    def _download_dataset_zip_if_modified(self, source: Dict) -> Optional[Dict]:
+        """
+        Downloads the dataset zip again only if it changed since the download described by source, using a conditional
+        request with its ETag and Last-Modified validators.
+
+        :param source: The source of the manifest: the URL and validators of the previous download.
+        :return: The source of the new download, or None if the server answered that the zip did not change.
+        """
+        headers = dict()
+        if os.path.exists(self._dataset_local_zip_path) and source.get("url") == self._dataset_url:
+            if source.get("etag") is not None:
+                headers["If-None-Match"] = source["etag"]
+            if source.get("last_modified") is not None:
+                headers["If-Modified-Since"] = source["last_modified"]
+
+        partial_zip_path = f"{self._dataset_local_zip_path}.part"
+        os.makedirs(os.path.dirname(self._dataset_local_zip_path), exist_ok=True)
+        with requests.get(self._dataset_url, stream=True, headers=headers, timeout=60) as response:
+            if response.status_code == 304:
+                return None
+
+            response.raise_for_status()
+            with open(partial_zip_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=_DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+
+            new_source = {"url": self._dataset_url,
+                          "etag": response.headers.get("ETag"),
+                          "last_modified": response.headers.get("Last-Modified")}
+
+        os.replace(partial_zip_path, self._dataset_local_zip_path)
+
+        return new_source
+
+    def _read_manifest(self) -> Dict:
+        if not os.path.exists(self._dataset_manifest_path):
+            return {"source": dict(), "files": dict()}
+
+        with open(self._dataset_manifest_path, "r") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict):
+        with open(f"{self._dataset_manifest_path}.tmp", "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(f"{self._dataset_manifest_path}.tmp", self._dataset_manifest_path)
+
+    def _store_station_filename_paths(self, station_id: int) -> List[str]:
+        """
+        :return: The base and appended store files of a station, in any partition.
+        """
+        if not os.path.isdir(self._dataset_store_path):
+            return []
+
+        station_filename_paths = []
+        for partition in os.listdir(self._dataset_store_path):
+            partition_path = os.path.join(self._dataset_store_path, partition)
+            if not os.path.isdir(partition_path):
+                continue
 
+            for filename in os.listdir(partition_path):
+                match = _STORE_FILENAME_REGEX.match(filename)
+                if match is not None and int(match.group(1)) == station_id:
+                    station_filename_paths.append(os.path.join(partition_path, filename))
+
+        return station_filename_paths
+
+    def refresh_dataset(self, station_ids: Optional[List[int]] = None) -> pd.DataFrame:
+        """
+        Updates the local copy of the dataset incrementally. The zip is downloaded again only if the server reports a
+        change (conditional request). Then, only the files whose size or CRC-32 in the zip directory differ from the
+        manifest are extracted. If the columnar store exists, then the new measurements of a station are appended to
+        it as a new file, and only stations whose previous measurements changed are converted again.
+
+        :param station_ids: A list of positive integers with the station IDs to keep up to date. None updates every
+        station of the zip and removes the local files of stations that are not in it anymore.
+        :return: A DataFrame with one row per updated file: the filename, the action (see REFRESH_ACTIONS) and the
+        number of measurement lines parsed, i.e., only the appended lines of appended files. Unchanged files are not
+        included.
+        """
+        manifest = self._read_manifest()
+        # If the zip did not change, then its directory is still compared with the manifest, in case a previous
+        # refresh only updated some stations. Unchanged members are not decompressed.
+        source = self._download_dataset_zip_if_modified(manifest["source"])
+
+        os.makedirs(self._dataset_local_extract_path, exist_ok=True)
         self.dataset_exists_locally = True
 
-    def load_all_stations(self):
+        metadata_filenames = {os.path.basename(self._dataset_stations_path),
+                              os.path.basename(self._dataset_elements_path),
+                              os.path.basename(self._dataset_sources_path)}
+        requested_filenames = (None
+                               if station_ids is None
+                               else {f"TG_STAID{str(station_id).zfill(6)}.txt" for station_id in station_ids})
+
+        changes = []
+        appended_measurements = dict()
+        with self.stats.stage("refresh_dataset") as record, \
+                zipfile.ZipFile(file=self._dataset_local_zip_path, mode="r") as zip_dataset:
+            members = [info
+                       for info in zip_dataset.infolist()
+                       if (info.filename in metadata_filenames
+                           or (_MEAN_TEMPERATURE_FILENAME_REGEX.match(info.filename) is not None
+                               and (requested_filenames is None or info.filename in requested_filenames)))]
+
+            for info in members:
+                full_filename_path = os.path.join(self._dataset_local_extract_path, info.filename)
+                entry = manifest["files"].get(info.filename)
+                if entry is None and os.path.exists(full_filename_path):
+                    # Files extracted before the manifest existed.
+                    with open(full_filename_path, "rb") as f:
+                        entry = _manifest_entry(info.filename, f.read())
+
+                if (entry is not None
+                        and entry["size"] == info.file_size
+                        and entry["crc32"] == info.CRC
+                        and os.path.exists(full_filename_path)):
+                    manifest["files"][info.filename] = entry
+                    continue
+
+                content = zip_dataset.read(info)
+                new_entry = _manifest_entry(info.filename, content)
+                with open(f"{full_filename_path}.tmp", "wb") as f:
+                    f.write(content)
+                os.replace(f"{full_filename_path}.tmp", full_filename_path)
+                manifest["files"][info.filename] = new_entry
+
+                if info.filename in metadata_filenames:
+                    changes.append((info.filename, "added" if entry is None else "rewritten", 0))
+                    continue
+
+                appended = None if entry is None else _appended_measurements(content, entry, new_entry)
+                if appended is None:
+                    changes.append((info.filename, "added" if entry is None else "rewritten", new_entry["num_lines"]))
+                else:
+                    appended_measurements[info.filename] = appended
+                    changes.append((info.filename, "appended", new_entry["num_lines"] - entry["num_lines"]))
+
+            if station_ids is None:
+                local_filenames = set(manifest["files"]).union(os.listdir(self._dataset_local_extract_path))
+                for filename in sorted(local_filenames.difference(info.filename for info in members)):
+                    if _MEAN_TEMPERATURE_FILENAME_REGEX.match(filename) is None:
+                        continue
+                    full_filename_path = os.path.join(self._dataset_local_extract_path, filename)
+                    if os.path.exists(full_filename_path):
+                        os.remove(full_filename_path)
+                    manifest["files"].pop(filename, None)
+                    changes.append((filename, "removed", 0))
+
+            if self.columnar_store_exists:
+                self._refresh_columnar_store(changes, appended_measurements)
+
+            record.num_rows = sum(num_new_lines for _, _, num_new_lines in changes)
+
+        if source is not None:
+            manifest["source"] = source
+        self._write_manifest(manifest)
+
+        if any(filename in metadata_filenames for filename, _, _ in changes):
+            self.stations = None
+            self.elements = None
+            self.sources = None
+
+        return pd.DataFrame(changes, columns=["filename", "action", "num_new_lines"])
+
+    def _refresh_columnar_store(self, changes: List, appended_measurements: Dict[str, bytes]):
+        """
+        Applies the changes of refresh_dataset to the columnar store. Appended measurements are parsed and written as a
+        new file of the station, added and rewritten stations are converted again and removed stations are deleted.
+        """
+        self.load_all_stations()
+        country_code_by_station_id = dict(zip(self.stations.station_id,
+                                              self.stations.country_code.str.strip()))
+
+        for filename, action, _ in changes:
+            match = _MEAN_TEMPERATURE_FILENAME_REGEX.match(filename)
+            if match is None:
+                continue
+
+            station_id = int(match.group(1))
+            country_code = country_code_by_station_id.get(station_id, "--")
+            if action == "appended":
+                appended = appended_measurements[filename]
+                if len(appended.strip()) == 0:
+                    continue
+
+                data = _read_mean_temperature_file(io.BytesIO(appended), has_header=False)
+                first_date = appended.split(b",", 3)[2].strip().decode("ascii")
+                _write_mean_temperatures_to_store(data,
+                                                  self._store_filename_path(station_id, country_code, first_date))
+                continue
+
+            for station_filename_path in self._store_station_filename_paths(station_id):
+                os.remove(station_filename_path)
+
+            if action in ("added", "rewritten"):
+                _write_mean_temperature_file_to_store(os.path.join(self._dataset_local_extract_path, filename),
+                                                      self._store_filename_path(station_id, country_code))
+
+    def _extract_dataset_members(self, station_ids: Optional[List[int]] = None):
+        """
+        Extracts the members of the dataset zip that are not on disk yet.
+
+        :param station_ids: A list of positive integers with the station IDs whose mean temperature files are
+        extracted along the metadata files (stations, elements and sources). None extracts all the files.
+        """
+        with zipfile.ZipFile(file=self._dataset_local_zip_path, mode="r") as zip_dataset:
+            members = zip_dataset.namelist()
+            if station_ids is not None:
+                requested_members = {os.path.basename(self._dataset_stations_path),
+                                     os.path.basename(self._dataset_elements_path),
+                                     os.path.basename(self._dataset_sources_path)}
+                requested_members.update(f"TG_STAID{str(station_id).zfill(6)}.txt" for station_id in station_ids)
+
+                members = [member for member in members if member in requested_members]
+
+            members = [member
+                       for member in members
+                       if not os.path.exists(os.path.join(self._dataset_local_extract_path, member))]
+            if len(members) > 0:
+                zip_dataset.extractall(self._dataset_local_extract_path, members=members)
+
+    def _save_dataset_on_local_disk(self, station_ids: Optional[List[int]] = None):
+        self._download_dataset_zip()
+        self._extract_dataset_members(station_ids)
+
+        self.dataset_exists_locally = True
+
+    def _ensure_dataset_on_local_disk(self, station_ids: Optional[List[int]] = None):
         if not self.dataset_exists_locally:
-            self._save_dataset_on_local_disk()
+            self._save_dataset_on_local_disk(station_ids)
+        elif os.path.exists(self._dataset_local_zip_path):
+            # Previous calls may have extracted only some stations.
+            self._extract_dataset_members(station_ids)
+
+    def load_all_stations(self):
+        self._ensure_dataset_on_local_disk(station_ids=[])
 
         self.stations = pd.read_csv(self._dataset_stations_path,
                                     sep=",",
@@ -51,8 +668,7 @@ class ECADMeanTemperatureDataset(object):
                                            "height": np.int32})
 
     def load_all_elements(self):
-        if not self.dataset_exists_locally:
-            self._save_dataset_on_local_disk()
+        self._ensure_dataset_on_local_disk(station_ids=[])
 
         self.elements = pd.read_csv(self._dataset_elements_path,
                                     sep=",",
@@ -66,8 +682,7 @@ class ECADMeanTemperatureDataset(object):
                                            "unit": "object"})
 
     def load_all_sources(self):
-        if not self.dataset_exists_locally:
-            self._save_dataset_on_local_disk()
+        self._ensure_dataset_on_local_disk(station_ids=[])
 
         self.sources = pd.read_csv(self._dataset_sources_path,
                                    sep=",",
@@ -102,43 +717,81 @@ class ECADMeanTemperatureDataset(object):
                                           # It is an integer, but sometimes this value is not present.
                                           "participant_name": "object"})
 
-    def load_mean_temperature_files_by_station_id(self, station_ids: Union[List[int], int]):
+    def _load_mean_temperature_files_in_parallel(self,
+                                                 full_filename_paths: List[str],
+                                                 num_workers: int,
+                                                 batch_size: int,
+                                                 progress: ProgressHook) -> pd.DataFrame:
+        """
+        Parses the mean temperature files using a pool of num_workers processes. Each worker parses batch_size files
+        at a time and sends back their (already filtered) columns, see _mean_temperatures_frame for how they are put
+        together. At most num_workers batches are in flight at any time, so the peak memory is about the size of the
+        resulting frame plus one of its columns and num_workers batches. Progress is reported after each batch.
+        """
+        batches = [full_filename_paths[i:i + batch_size]
+                   for i in range(0, len(full_filename_paths), batch_size)]
+
+        def parsed_batches(executor: ProcessPoolExecutor) -> Iterator[Dict[str, np.ndarray]]:
+            pending_batches = deque()
+            next_batch = 0
+            num_processed_files = 0
+            for batch in batches:
+                while next_batch < len(batches) and len(pending_batches) < num_workers:
+                    pending_batches.append(executor.submit(_read_mean_temperature_files_batch,
+                                                           batches[next_batch],
+                                                           self.compact))
+                    next_batch += 1
+
+                # Batches are consumed in submission order so the rows keep the order of the filenames.
+                yield pending_batches.popleft().result()
+
+                num_processed_files += len(batch)
+                progress(num_processed_files, len(full_filename_paths), batch[-1])
+
+        dtypes = _COMPACT_MEAN_TEMPERATURE_DTYPES if self.compact else _MEAN_TEMPERATURE_DTYPES
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            return _mean_temperatures_frame(parsed_batches(executor), dtypes)
+
+    def load_mean_temperature_files_by_station_id(self,
+                                                  station_ids: Union[List[int], int],
+                                                  num_workers: int = 1,
+                                                  batch_size: int = 32,
+                                                  progress: Optional[ProgressHook] = None):
         """
 
         :param station_ids: A list of positive integers representing the station IDs to read the data. If you wish to
         read the data from all stations, then set this argument as -1.
+        :param num_workers: Number of processes used to parse the temperature files. If it is 1, then the files are
+        parsed sequentially in the current process.
+        :param batch_size: Number of temperature files that each worker parses at a time. Only used when num_workers
+        is greater than 1.
+        :param progress: Called with the number of parsed files, the number of files to parse and the last parsed
+        file. None logs the progress through the src.instrumentation logger at most once every five seconds.
         :return: Nothing. The method loads the requested mean temperature data inside the mean_temperature_measurements
         attribute.
         """
 
         def files_to_pandas(filenames_to_load: List[str]):
             # Iterate over match objects instead of filenames
-            for filename in filenames_to_load:
+            for num_processed_files, filename in enumerate(filenames_to_load, start=1):
                 full_filename_path = os.path.join(self._dataset_local_extract_path, filename)
-                print(f"Processing filename: {full_filename_path}")
-                yield (pd.read_csv(full_filename_path,
-                                   sep=",",
-                                   skiprows=20,
-                                   header=0,
-                                   parse_dates=["date"],
-                                   infer_datetime_format=True,
-                                   names=["station_id",
-                                          "source_id",
-                                          "date",
-                                          "mean_temperature",
-                                          "quality_code"],
-                                   dtype={"station_id": np.int32,
-                                          "source_id": np.int32,
-                                          "mean_temperature": np.int32,
-                                          "quality_code": "category"})
-                       )
+                yield _read_mean_temperature_file(full_filename_path, compact=self.compact)
+                progress(num_processed_files, len(filenames_to_load), full_filename_path)
 
-        if not self.dataset_exists_locally:
-            self._save_dataset_on_local_disk()
+        if num_workers < 1 or batch_size < 1:
+            raise ValueError("Values of 'num_workers' and 'batch_size' must be positive integers.")
+
+        if not (station_ids == -1
+                or (isinstance(station_ids, list) and all(map(lambda station_id: station_id > 0, station_ids)))):
+            raise ValueError("Value of 'station_ids' is invalid. Pass -1 to read all temperature files or a list of "
+                             "positive integers to filter them.")
+
+        self._ensure_dataset_on_local_disk(station_ids=None if station_ids == -1 else station_ids)
 
         all_files = os.listdir(self._dataset_local_extract_path)
         if station_ids == -1:
-            print("Warning: Loading all temperature files uses more than 4GiB of RAM and takes a lot of time to load.")
+            print("Warning: Loading all temperature files uses more than 4GiB of RAM and takes a lot of time to load. "
+                  "Use stream_mean_temperature_climatology for per-station statistics.")
 
             # Matches Mean Temperature files having the name TG_STAIDXXXXXX.txt
             # where XXXXXX represents 6 digits.
@@ -147,21 +800,316 @@ class ECADMeanTemperatureDataset(object):
             # Filter out filenames not matching with the expected name
             filenames = sorted(filter(regex.match, all_files), reverse=False)
 
-        elif isinstance(station_ids, list) and all(map(lambda station_id: station_id > 0, station_ids)):
+        else:
             station_ids_filenames = [f"TG_STAID{str(station_id).zfill(6)}.txt"
                                      for station_id in station_ids]
 
             filenames = sorted(set(station_ids_filenames).intersection(all_files))
+
+        if progress is None:
+            progress = rate_limited_progress(f"{type(self).__name__} mean temperature files")
+
+        with self.stats.stage("read_mean_temperature_files") as record:
+            if num_workers > 1 and len(filenames) > 0:
+                self.mean_temperatures = self._load_mean_temperature_files_in_parallel(
+                    [os.path.join(self._dataset_local_extract_path, filename) for filename in filenames],
+                    num_workers=num_workers,
+                    batch_size=batch_size,
+                    progress=progress)
+            else:
+                self.mean_temperatures = pd.concat(files_to_pandas(filenames), ignore_index=True)
+            record.num_rows = self.mean_temperatures.shape[0]
+
+        self.mean_temperatures["quality_code"] = self.mean_temperatures["quality_code"].astype(_QUALITY_CODE_DTYPE)
+
+    def _store_filename_path(self, station_id: int, country_code: str, first_date: Optional[str] = None) -> str:
+        """
+        :param first_date: First date (YYYYMMDD) of the measurements appended by refresh_dataset. None returns the base
+        file of the station.
+        """
+        suffix = "" if first_date is None else f".{first_date}"
+        return os.path.join(self._dataset_store_path,
+                            f"country_code={country_code}",
+                            f"TG_STAID{str(station_id).zfill(6)}{suffix}.parquet")
+
+    def build_columnar_store(self, num_workers: int = 1):
+        """
+        Converts every mean temperature file into a parquet file partitioned by the country code of its station. The
+        store is built once, later calls to load_mean_temperatures only read the partitions they need.
+
+        :param num_workers: Number of processes used to convert the temperature files.
+        :return: Nothing.
+        """
+        self._ensure_dataset_on_local_disk()
+
+        if self.stations is None:
+            self.load_all_stations()
+
+        country_code_by_station_id = dict(zip(self.stations.station_id,
+                                              self.stations.country_code.str.strip()))
+
+        regex = re.compile(r'^TG_STAID(\d{6}).txt$')
+        full_filename_paths = []
+        store_filename_paths = []
+        for filename in sorted(os.listdir(self._dataset_local_extract_path)):
+            match = regex.match(filename)
+            if match is None:
+                continue
+
+            station_id = int(match.group(1))
+            full_filename_paths.append(os.path.join(self._dataset_local_extract_path, filename))
+            store_filename_paths.append(self._store_filename_path(station_id,
+                                                                  country_code_by_station_id.get(station_id, "--")))
+
+        with self.stats.stage("build_columnar_store") as record:
+            if num_workers > 1:
+                with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                    record.num_rows = sum(executor.map(_write_mean_temperature_file_to_store,
+                                                       full_filename_paths,
+                                                       store_filename_paths,
+                                                       chunksize=32))
+            else:
+                record.num_rows = sum(_write_mean_temperature_file_to_store(full_filename_path, store_filename_path)
+                                      for full_filename_path, store_filename_path in zip(full_filename_paths,
+                                                                                         store_filename_paths))
+
+        with open(self._dataset_store_success_path, "w") as f:
+            f.write(f"{len(full_filename_paths)}\n")
+
+    def _store_filename_paths(self,
+                              station_ids: Optional[List[int]] = None,
+                              country_codes: Optional[List[str]] = None) -> List[Tuple[int, str]]:
+        """
+        :return: The station ID and path of the store files of the requested stations and countries, grouped by
+        station. Each station has its base file followed by the files appended by refresh_dataset, in order.
+        """
+        if country_codes is None:
+            partitions = sorted(partition
+                                for partition in os.listdir(self._dataset_store_path)
+                                if partition.startswith("country_code="))
         else:
-            raise ValueError("Value of 'station_ids' is invalid. Pass -1 to read all temperature files or a list of "
-                             "positive integers to filter them.")
+            partitions = sorted(f"country_code={country_code}" for country_code in set(country_codes))
+
+        requested_station_ids = None if station_ids is None else set(station_ids)
+
+        store_filename_paths = []
+        for partition in partitions:
+            partition_path = os.path.join(self._dataset_store_path, partition)
+            if not os.path.isdir(partition_path):
+                continue
+
+            store_files = []
+            for filename in os.listdir(partition_path):
+                match = _STORE_FILENAME_REGEX.match(filename)
+                if match is None:
+                    continue
+                station_id = int(match.group(1))
+                if requested_station_ids is None or station_id in requested_station_ids:
+                    store_files.append((station_id, match.group(2) or "", filename))
+
+            store_filename_paths.extend((station_id, os.path.join(partition_path, filename))
+                                        for station_id, _, filename in sorted(store_files))
+
+        return store_filename_paths
+
+    def load_mean_temperatures(self,
+                               station_ids: Optional[List[int]] = None,
+                               country_codes: Optional[List[str]] = None,
+                               start_date: Optional[Union[str, datetime]] = None,
+                               end_date: Optional[Union[str, datetime]] = None,
+                               num_workers: int = 1):
+        """
+        Loads the mean temperatures from the columnar store, building it the first time. Only the partitions of the
+        requested countries and the files of the requested stations are opened, and the date range is pushed down to
+        the parquet row groups.
+
+        :param station_ids: A list of positive integers with the station IDs to read. None reads all stations.
+        :param country_codes: A list of two-letter country codes (as in stations.txt) to read. None reads all
+        countries.
+        :param start_date: First date (inclusive) to read. None does not limit the start of the range.
+        :param end_date: Last date (inclusive) to read. None does not limit the end of the range.
+        :param num_workers: Number of processes used to build the columnar store, if it does not exist.
+        :return: Nothing. The method loads the requested mean temperature data inside the mean_temperatures
+        attribute.
+        """
+        if not self.columnar_store_exists:
+            self.build_columnar_store(num_workers=num_workers)
+
+        store_filename_paths = [store_filename_path
+                                for _, store_filename_path in self._store_filename_paths(station_ids, country_codes)]
+
+        filters = []
+        if start_date is not None:
+            filters.append(("date", ">=", pd.Timestamp(start_date)))
+        if end_date is not None:
+            filters.append(("date", "<=", pd.Timestamp(end_date)))
 
-        self.mean_temperatures = pd.concat(files_to_pandas(filenames))
+        if len(store_filename_paths) == 0:
+            raise ValueError("No mean temperature files match the requested station IDs and country codes.")
 
-        # By the data docs, invalid measures have the quality_code on 9.
-        self.mean_temperatures = self.mean_temperatures[self.mean_temperatures.quality_code != 9]
+        def store_files_to_pandas(store_filename_paths_to_load: List[str]):
+            for store_filename_path in store_filename_paths_to_load:
+                data = pd.read_parquet(path=store_filename_path,
+                                       engine="pyarrow",
+                                       filters=filters if len(filters) > 0 else None)
+                yield _compact_mean_temperatures(data) if self.compact else data
 
+        with self.stats.stage("read_columnar_store") as record:
+            self.mean_temperatures = pd.concat(store_files_to_pandas(store_filename_paths), ignore_index=True)
+            record.num_rows = self.mean_temperatures.shape[0]
 
+        self.mean_temperatures["quality_code"] = self.mean_temperatures["quality_code"].astype(_QUALITY_CODE_DTYPE)
 
+    def stream_mean_temperature_climatology(self,
+                                            station_ids: Optional[List[int]] = None,
+                                            heating_base_temperature: float = 15.0,
+                                            cooling_base_temperature: float = 17.0,
+                                            chunk_size: int = 100000,
+                                            use_columnar_store: Optional[bool] = None,
+                                            progress: Optional[ProgressHook] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Computes per-station climate statistics without loading mean_temperatures. The stations are read one at a
+        time, in chunks, their measurements with the quality code 9 are dropped, and each chunk updates running sums
+        of the station. Memory use depends on the chunk size and the size of the results, not on the number of
+        measurements.
+
+        :param station_ids: A list of positive integers with the station IDs to read. None reads all stations.
+        :param heating_base_temperature: Base temperature (°C) of the heating degree days.
+        :param cooling_base_temperature: Base temperature (°C) of the cooling degree days.
+        :param chunk_size: Number of lines of a temperature file parsed at a time. The columnar store is read one row
+        group at a time.
+        :param use_columnar_store: If True, then the stations are read from the columnar store (built if it does not
+        exist). If False, from the temperature files. None uses the store only if it exists.
+        :param progress: Called with the number of processed stations, the number of stations and the last one. None
+        logs the progress through the src.instrumentation logger at most once every five seconds.
+        :return: A dictionary with three DataFrames indexed by station ID: "statistics", with the
+        CLIMATOLOGY_STATISTICS (the degree days are the mean of a year, d_shift_min and d_shift_max are the days of
+        the year with the lowest and highest mean temperature), "day_of_year", with the mean temperature of each day
+        of the year (1 to 366) across years, and "annual", indexed by station ID and year, with the
+        ANNUAL_CLIMATOLOGY_COLUMNS (degree days summed over the year). The days of the year follow the leap-year
+        calendar in every year: 29 February is day 60 (only measured in leap years) and 1 March is always day 61.
+        """
+        if chunk_size < 1:
+            raise ValueError("Value of 'chunk_size' must be a positive integer.")
+
+        if use_columnar_store is None:
+            use_columnar_store = self.columnar_store_exists
+        if use_columnar_store and not self.columnar_store_exists:
+            self.build_columnar_store()
+
+        if use_columnar_store:
+            station_chunks = [(station_id, [store_filename_path for _, store_filename_path in station_files])
+                              for station_id, station_files in groupby(self._store_filename_paths(station_ids),
+                                                                        key=lambda station_file: station_file[0])]
+        else:
+            self._ensure_dataset_on_local_disk(station_ids=station_ids)
+            requested_station_ids = None if station_ids is None else set(station_ids)
+            station_chunks = []
+            for filename in sorted(os.listdir(self._dataset_local_extract_path)):
+                match = _MEAN_TEMPERATURE_FILENAME_REGEX.match(filename)
+                if match is not None and (requested_station_ids is None
+                                          or int(match.group(1)) in requested_station_ids):
+                    station_chunks.append((int(match.group(1)),
+                                           [os.path.join(self._dataset_local_extract_path, filename)]))
+
+        if progress is None:
+            progress = rate_limited_progress(f"{type(self).__name__} climatology stations")
+
+        statistics = []
+        day_of_year_means = np.full((len(station_chunks), _DAYS_IN_LEAP_YEAR), np.nan, dtype=np.float32)
+        annual_rows = []
+        with self.stats.stage("stream_climatology") as record:
+            record.num_rows = 0
+            for position, (station_id, filename_paths) in enumerate(station_chunks):
+                climatology = _StationClimatology(heating_base_temperature, cooling_base_temperature)
+                for filename_path in filename_paths:
+                    chunks = (_store_file_chunks(filename_path)
+                              if use_columnar_store
+                              else _mean_temperature_file_chunks(filename_path, chunk_size))
+                    for dates, mean_temperatures in chunks:
+                        climatology.update(dates, mean_temperatures)
+                        record.num_rows += dates.shape[0]
+
+                statistics.append(climatology.statistics())
+                day_of_year_means[position] = climatology.day_of_year_means()
+                annual_rows.extend((station_id, *row) for row in climatology.annual_rows())
+                progress(position + 1, len(station_chunks), str(station_id))
+
+        station_index = pd.Index([station_id for station_id, _ in station_chunks], name="station_id")
+        statistics = pd.DataFrame(statistics, index=station_index, columns=CLIMATOLOGY_STATISTICS)
+        for column in ["first_date", "last_date"]:
+            statistics[column] = pd.to_datetime(statistics[column])
+
+        annual = pd.DataFrame(annual_rows, columns=["station_id", "year", *ANNUAL_CLIMATOLOGY_COLUMNS])
+        annual = annual.astype({"station_id": np.int32,
+                                "year": np.int16,
+                                "num_days": np.int16,
+                                "mean_temperature": np.float32,
+                                "heating_degree_days": np.float32,
+                                "cooling_degree_days": np.float32}).set_index(["station_id", "year"])
+
+        return {"statistics": statistics,
+                "day_of_year": pd.DataFrame(day_of_year_means,
+                                            index=station_index,
+                                            columns=pd.RangeIndex(1, _DAYS_IN_LEAP_YEAR + 1, name="dayofyear")),
+                "annual": annual}
+
+    def mean_temperature_dates(self) -> pd.Series:
+        """
+        Returns the dates of the loaded mean temperatures, decoding the date_offset column in the compact
+        representation.
+        """
+        if not self.compact:
+            return self.mean_temperatures["date"]
+
+        return pd.Series((MEAN_TEMPERATURE_DATE_ORIGIN + self.mean_temperatures["date_offset"].to_numpy())
+                         .astype("datetime64[ns]"),
+                         index=self.mean_temperatures.index,
+                         name="date")
+
+    def fit_mean_temperature_seasonality(self) -> pd.DataFrame:
+        """
+        Fits the yearly sinusoid of the loaded mean temperatures of every station at once (see fit_sinusoids), using
+        the day of the year as time. The fit gives the inputs of the ground temperature models for each station.
+
+        :return: A DataFrame indexed by station ID with the SINUSOID_FIT_COLUMNS columns (in °C and days) and the
+        ground temperature inputs: Tg_und, DT_y, and the days of the year with the min (dd_min) and the max (dd_max)
+        temperature.
+        """
+        if self.mean_temperatures is None:
+            raise ValueError("There are no mean temperatures loaded. Load them before fitting their seasonality.")
+
+        # Mean temperatures are given in 0.1 °C.
+        fit = fit_sinusoids(self.mean_temperature_dates().dt.dayofyear.to_numpy(),
+                            self.mean_temperatures["mean_temperature"].to_numpy() / 10,
+                            groups=self.mean_temperatures["station_id"].to_numpy(),
+                            period=DAYS_IN_YEAR)
+        fit.index.name = "station_id"
+
+        fit["Tg_und"] = fit["disp"]
+        fit["DT_y"] = fit["amp"]
+        # t_min and t_max are in [0, 365), day 0 is the last day of the previous year.
+        fit["dd_min"] = (np.round(fit["t_min"]) - 1) % DAYS_IN_YEAR + 1
+        fit["dd_max"] = (np.round(fit["t_max"]) - 1) % DAYS_IN_YEAR + 1
+
+        return fit
+
+    def memory_usage(self) -> pd.DataFrame:
+        """
+        Reports the memory held by each loaded table of the dataset.
+
+        :return: A DataFrame indexed by table name with the number of rows, the bytes used (including the contents
+        of object columns) and the bytes used per row.
+        """
+        tables = {"stations": self.stations,
+                  "elements": self.elements,
+                  "sources": self.sources,
+                  "mean_temperatures": self.mean_temperatures}
 
+        report = pd.DataFrame([(name, table.shape[0], table.memory_usage(index=True, deep=True).sum())
+                               for name, table in tables.items()
+                               if table is not None],
+                              columns=["table", "num_rows", "bytes"]).set_index("table")
+        report["bytes_per_row"] = report["bytes"] / report["num_rows"].clip(lower=1)
 
+        return report
@@ -1,11 +1,19 @@
 import os
-from typing import Dict, Optional
+import threading
+from functools import partial
+from typing import Dict, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
+from src.LazyCityData import CITY_WORKBOOK_OPTIONS, LazyCityData, cache_city_workbook
+from src.cache import read_excel_cached
+from src.features import CALENDAR_COLUMNS, build_calendar_features, build_hourly_features
+from src.instrumentation import LoaderStats
+from src.processed_data import ProcessedCitiesMixin
 
-class InsPireDataset(object):
+
+class InsPireDataset(ProcessedCitiesMixin):
     """
     This dataset contains hourly measurements of different attributes like air temperature, dewp, and more.
     """
@@ -15,6 +23,12 @@ class InsPireDataset(object):
     ROME_IT: str = "rome_italy"
     STUTTGART_GER: str = "stuttgart_germany"
 
+    # Season boundaries are the dates of the equinoxes and solstices in Central European Time.
+    UTC_OFFSET_HOURS: float = 1.0
+    # The processed files of 2017 end spring on June 20, the solstice was on June 21.
+    SEASON_BOUNDARIES: Dict[int, Tuple[str, str, str, str]] = {2017: ("2017-03-20", "2017-06-20", "2017-09-22",
+                                                                      "2017-12-21")}
+
     def __init__(self):
         self._dataset_local_extract_path = os.path.join(".", "data", "insPire")
 
@@ -29,6 +43,11 @@ class InsPireDataset(object):
         self._rome_dataset_path = os.path.join(self._dataset_local_extract_path, "Rome.xls")
         self._stuttgart_dataset_path = os.path.join(self._dataset_local_extract_path, "Stuttgart.xls")
 
+        self._keys_with_paths = [(self.LONDON_UK, self._london_dataset_path),
+                                 (self.MADRID_SPA, self._madrid_dataset_path),
+                                 (self.ROME_IT, self._rome_dataset_path),
+                                 (self.STUTTGART_GER, self._stuttgart_dataset_path)]
+
         self.processed_london_uk_dataset_path = os.path.join(self._dataset_local_extract_path,
                                                              "processed",
                                                              "london_uk_data")
@@ -47,138 +66,109 @@ class InsPireDataset(object):
         self._sh_profile: Optional[pd.Series] = None
         self._sc_profile: Optional[pd.Series] = None
         self._carbon_emissions: Optional[pd.Series] = None
+        self._shared_data_lock = threading.Lock()
 
+        self.stats = LoaderStats(type(self).__name__)
+        self.city_data = LazyCityData([k for k, _ in self._keys_with_paths],
+                                      self._load_city_data,
+                                      prepare_city=partial(cache_city_workbook, dict(self._keys_with_paths)))
         self.data: Dict = dict()
         self.processed_data: Dict = dict()
 
-    def _load_all_data(self):
-        def calculate_season(data: pd.DataFrame):
-            winter_ends = "2017-03-20"
-            spring_ends = "2017-06-20"
-            summer_ends = "2017-09-22"
-            fall_ends = "2017-12-21"
-
-            data["season"] = "-"
-
-            winter_mask = (data.index >= fall_ends) | (data.index < winter_ends)
-            spring_mask = (data.index >= winter_ends) & (data.index < spring_ends)
-            summer_mask = (data.index >= spring_ends) & (data.index < summer_ends)
-            fall_mask = (data.index >= summer_ends) & (data.index < fall_ends)
-
-            data.loc[winter_mask, "season"] = "winter"
-            data.loc[spring_mask, "season"] = "spring"
-            data.loc[summer_mask, "season"] = "summer"
-            data.loc[fall_mask, "season"] = "fall"
-
-            return data["season"]
-        
-        keys_with_paths = [(self.LONDON_UK, self._london_dataset_path),
-                           (self.MADRID_SPA, self._madrid_dataset_path),
-                           (self.ROME_IT, self._rome_dataset_path),
-                           (self.STUTTGART_GER, self._stuttgart_dataset_path)]
+    def _load_shared_data(self):
+        # Cities loaded concurrently share the heat demand and the profiles, these are read only once.
+        with self._shared_data_lock:
+            if (self._heat_demand is not None
+                    and self._dhw_profile is not None
+                    and self._sh_profile is not None
+                    and self._sc_profile is not None
+                    and self._carbon_emissions is not None):
+                return
+
+            with self.stats.stage("read_shared_workbooks"):
+                self._heat_demand = read_excel_cached(self._heat_demand_path)
+                self._dhw_profile = read_excel_cached(self._dhw_profile_path, index_col="Hour")
+                self._sh_profile = read_excel_cached(self._sh_profile_path, index_col="Hour")
+                self._sc_profile = read_excel_cached(self._sc_profile_path, index_col="Hour")
+                self._carbon_emissions = read_excel_cached(self._carbon_emissions_path, index_col="Hour")
+
+    def _load_city_data(self, k: str) -> pd.DataFrame:
+        self._load_shared_data()
+        file_path = dict(self._keys_with_paths)[k]
+
+        with self.stats.stage("read_city_workbook", key=k) as record:
+            data = read_excel_cached(file_path, **CITY_WORKBOOK_OPTIONS)
+            record.num_rows = data.shape[0]
+
+        data["timestamp"] = pd.date_range("2017-01-01", freq="H", periods=data.shape[0])
+        data = data.set_index("timestamp")
         
-        self._heat_demand = pd.read_excel(self._heat_demand_path)
-        self._dhw_profile = pd.read_excel(self._dhw_profile_path, index_col="Hour")
-        self._sh_profile = pd.read_excel(self._sh_profile_path, index_col="Hour")
-        self._sc_profile = pd.read_excel(self._sc_profile_path, index_col="Hour")
-        self._carbon_emissions = pd.read_excel(self._carbon_emissions_path, index_col="Hour")
-    
-
-        for k, file_path in keys_with_paths:
-            data = pd.read_excel(file_path,
-                                 header=0,
-                                 names=["hourofyear", "air_temp"],
-                                 usecols=["hourofyear", "air_temp"],
-                                 dtype={"hourofyear": np.int32,
-                                        "air_temp": np.float32})
-
-            data["timestamp"] = pd.date_range("2017-01-01", freq="H", periods=data.shape[0])
-            data = data.set_index("timestamp")
-            
-            num_rows_in_processed_data = data.shape[0]
-            num_days = data.index.dayofyear.max()
-
-            # We select the current city (determined by k and matched with the city_key column)
-            # Then we repeat the rows in the dataset for num_rows_in_processed_data times
-            # Third, we reindex the dataframe using the self.processed_data[k] index
-            # Lastly, we concat the heat demand columns into the processed data
-            heat_demand_for_city = self._heat_demand[self._heat_demand["city_key"] == k]
-            heat_demand_for_city = pd.concat([heat_demand_for_city] * num_rows_in_processed_data)
-            heat_demand_for_city = pd.DataFrame(heat_demand_for_city.values,
-                                                columns=heat_demand_for_city.columns,
-                                                index=data.index).astype({"DHW_cons": np.float32,
-                                                                          "SH_cons": np.float32,
-                                                                          "SFH_bldg_tot": np.float32,
-                                                                          "MFH_bldg_tot": np.float32,
-                                                                          "%SH_y": np.float32,
-                                                                          "%DHW_y": np.float32,
-                                                                          "Gas_price_ind": np.float32,
-                                                                          "Gas_price_res": np.float32,
-                                                                          "El_price_ind": np.float32,
-                                                                          "El_price_res": np.float32,
-                                                                          "WH_price": np.float32,
-                                                                          "CO2_gas": np.float32})
-
-            # The DHW profile is constant through the year but changes during the day (however, it keeps the same
-            # values for the same hour in different days). The InsPire dataset contains an extra hour (2018-01-01
-            # 00:00:00). We have to include the first value in the first position too
-            dhw_profile_for_city = pd.concat([self._dhw_profile] * num_days)
-            dhw_profile_for_city = pd.concat([dhw_profile_for_city, dhw_profile_for_city.head(1)])
-            dhw_profile_for_city = pd.DataFrame(dhw_profile_for_city.values,
-                                                columns=dhw_profile_for_city.columns,
-                                                index=data.index).astype({"DHW Profile": np.float32})
-            sh_profile_for_city = pd.concat([self._sh_profile] * num_days)
-            sh_profile_for_city = pd.concat([sh_profile_for_city, sh_profile_for_city.head(1)])
-            sh_profile_for_city = pd.DataFrame(sh_profile_for_city.values,
-                                               columns=sh_profile_for_city.columns,
-                                               index=data.index).astype({"SH Profile": np.float32})
-            sc_profile_for_city = pd.concat([self._sc_profile] * num_days)
-            sc_profile_for_city = pd.concat([sc_profile_for_city, sc_profile_for_city.head(1)])
-            sc_profile_for_city = pd.DataFrame(sc_profile_for_city.values,
-                                               columns=sc_profile_for_city.columns,
-                                               index=data.index).astype({"SC Profile": np.float32})
-            carbon_emissions_profile = pd.concat([self._carbon_emissions] * num_days)
-            carbon_emissions_profile = pd.concat([carbon_emissions_profile, carbon_emissions_profile.head(1)])
-            carbon_emissions_profile = pd.DataFrame(carbon_emissions_profile.values,
-                                               columns=carbon_emissions_profile.columns,
-                                               index=data.index).astype({"carbon_factor_el": np.float32})
-
-            data[heat_demand_for_city.columns] = heat_demand_for_city
-            data["DHW_hourly_consumption_ratio"] = dhw_profile_for_city["DHW Profile"]
-            data["SH_hourly_consumption_ratio"] = sh_profile_for_city["SH Profile"]
-            data["SC_hourly_consumption_ratio"] = sc_profile_for_city["SC Profile"]
-            data["Carbon_emissions_profile"] = carbon_emissions_profile["carbon_factor_el"]
-            data["season"] = calculate_season(data)
-            data["date"] = data.index.date
-            data["month"] = data.index.month
-            data["dayofyear"] = data.index.dayofyear
-            data["dayofweek"] = data.index.dayofweek
-            data["hourofyear"] = (data.index.dayofyear - 1) * 24 + (data.index.hour + 1)
-            data["hour"] = data.index.hour
-
-            self.data[k] = data
-
-    def load_data(self, reload: bool = False) -> Dict:
-        if reload or len(self.data) == 0 or self._heat_demand is None or self._dhw_profile is None:
-            self._load_all_data()
+        # We select the current city (determined by k and matched with the city_key column) and broadcast its
+        # heat demand columns to every hour. The DHW, SH, SC and carbon emissions profiles are constant through
+        # the year but change during the day (however, they keep the same values for the same hour in different
+        # days), so each hour takes the value of the profile for its hour of the day. This also covers the extra
+        # hour of the InsPire dataset (2018-01-01 00:00:00).
+        hour_of_day_profiles = {"DHW_hourly_consumption_ratio": self._dhw_profile["DHW Profile"],
+                                "SH_hourly_consumption_ratio": self._sh_profile["SH Profile"],
+                                "SC_hourly_consumption_ratio": self._sc_profile["SC Profile"],
+                                "Carbon_emissions_profile": self._carbon_emissions["carbon_factor_el"]}
+        with self.stats.stage("hourly_features", key=k, num_rows=data.shape[0]):
+            features = build_hourly_features(data.index,
+                                             self._heat_demand,
+                                             k,
+                                             heat_demand_dtypes={"DHW_cons": np.float32,
+                                                                 "SH_cons": np.float32,
+                                                                 "SFH_bldg_tot": np.float32,
+                                                                 "MFH_bldg_tot": np.float32,
+                                                                 "%SH_y": np.float32,
+                                                                 "%DHW_y": np.float32,
+                                                                 "Gas_price_ind": np.float32,
+                                                                 "Gas_price_res": np.float32,
+                                                                 "El_price_ind": np.float32,
+                                                                 "El_price_res": np.float32,
+                                                                 "WH_price": np.float32,
+                                                                 "CO2_gas": np.float32},
+                                             hour_of_day_profiles=hour_of_day_profiles)
+
+            data = pd.concat([data, features], axis=1)
+
+        with self.stats.stage("calendar_columns", key=k, num_rows=data.shape[0]):
+            calendar = build_calendar_features(data.index,
+                                               utc_offset_hours=self.UTC_OFFSET_HOURS,
+                                               season_overrides=self.SEASON_BOUNDARIES)
+            for column in CALENDAR_COLUMNS:
+                data[column] = calendar[column].array
+
+        return data
+
+    def _load_all_data(self, num_workers: int = 1):
+        self.data = self.city_data.load(num_workers=num_workers)
+
+    def load_data(self, reload: bool = False, lazy: bool = False, num_workers: int = 1) -> Union[Dict, LazyCityData]:
+        """
+
+        :param reload: If True, then the data is read again from the files.
+        :param lazy: If True, then the method returns a mapping that loads each city the first time its key is
+        accessed. Otherwise, all the cities are loaded.
+        :param num_workers: Number of workers used to load the cities concurrently, see LazyCityData.load.
+        :return: A dictionary (or a LazyCityData if lazy is True) with the hourly data of each city.
+        """
+        if reload:
+            with self._shared_data_lock:
+                self._heat_demand = None
+            self.city_data.clear()
+            self.data = dict()
+
+        if lazy:
+            return self.city_data
+
+        if len(self.data) == 0:
+            self._load_all_data(num_workers=num_workers)
 
         return self.data.copy()
 
-    def _load_all_processed_data(self):
-        keys_with_paths = [(self.LONDON_UK, self.processed_london_uk_dataset_path),
-                           (self.MADRID_SPA, self.processed_madrid_spa_dataset_path),
-                           (self.ROME_IT, self.processed_rome_it_dataset_path),
-                           (self.STUTTGART_GER, self.processed_stuttgart_ger_dataset_path)]
-        columns_from_kw_to_mw = ['heat_source1', 'heat_source2', 'heat_aquifer', "E_el", "Total_consumption", "Total_consumption_fit",]
-        
-        for k, file_path in keys_with_paths:
-            data = pd.read_parquet(path=f"{file_path}.parquet",
-                                   engine="pyarrow")
-            data[columns_from_kw_to_mw] = data[columns_from_kw_to_mw] / 1000
-            self.processed_data[k] = data
-
-    def load_processed_data(self, reload: bool = False):
-        if reload or len(self.processed_data) == 0:
-            self._load_all_processed_data()
-
-        return self.processed_data.copy()
+    def _processed_dataset_paths(self) -> Dict[str, str]:
+        return {self.LONDON_UK: self.processed_london_uk_dataset_path,
+                self.MADRID_SPA: self.processed_madrid_spa_dataset_path,
+                self.ROME_IT: self.processed_rome_it_dataset_path,
+                self.STUTTGART_GER: self.processed_stuttgart_ger_dataset_path}
@@ -0,0 +1,106 @@
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.cache import read_excel_cached
+
+
+# Options of the hourly workbooks of the cities (e.g., Rome.xls), the same for every dataset.
+CITY_WORKBOOK_OPTIONS = dict(header=0,
+                             names=["hourofyear", "air_temp"],
+                             usecols=["hourofyear", "air_temp"],
+                             dtype={"hourofyear": np.int32, "air_temp": np.float32})
+
+
+def cache_city_workbook(paths: Dict[str, str], k: str):
+    """
+    Parses the workbook of a city into the Excel cache, a prepare_city for the datasets that read CITY_WORKBOOK_OPTIONS.
+    Runs in the processes of LazyCityData.load, only the Excel cache entry of the workbook is kept.
+
+    :param paths: A dictionary with the path of the workbook of each city.
+    :param k: Key of the city.
+    """
+    read_excel_cached(paths[k], **CITY_WORKBOOK_OPTIONS)
+
+
+class LazyCityData(Mapping):
+    """
+    Read-only mapping from city keys to their hourly data. The data of a city is loaded the first time its key is
+    accessed and memoized afterwards, so working on a single city does not load the rest.
+    """
+
+    def __init__(self,
+                 keys: List[str],
+                 load_city: Callable[[str], pd.DataFrame],
+                 prepare_city: Optional[Callable[[str], None]] = None):
+        """
+
+        :param keys: Keys of the available cities.
+        :param load_city: A function that receives a city key and returns its data.
+        :param prepare_city: A picklable function that receives a city key and runs the CPU-bound part of its loading
+        whose result is kept on disk, e.g., parsing its workbook into the Excel cache. If given, then load runs it in
+        processes before loading the cities with threads.
+        """
+        self._keys = list(keys)
+        self._load_city = load_city
+        self._prepare_city = prepare_city
+
+        self._data: Dict[str, pd.DataFrame] = dict()
+        self._locks: Dict[str, threading.Lock] = {key: threading.Lock() for key in self._keys}
+
+    def __getitem__(self, key: str) -> pd.DataFrame:
+        if key not in self._locks:
+            raise KeyError(key)
+
+        # Concurrent accesses to the same city wait for the first one instead of loading the city twice.
+        with self._locks[key]:
+            if key not in self._data:
+                self._data[key] = self._load_city(key)
+
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._data
+
+    def load(self, keys: Optional[List[str]] = None, num_workers: int = 1) -> Dict[str, pd.DataFrame]:
+        """
+        Loads several cities at once, concurrently if num_workers is greater than 1. Cities already loaded are not
+        loaded again.
+
+        Parsing a workbook (openpyxl, xlrd) is pure Python and holds the GIL, so threads only speed up loading when
+        the Excel cache is warm. On a cold cache, the cities are first prepared (see prepare_city) in processes.
+
+        :param keys: Keys of the cities to load. None loads all of them.
+        :param num_workers: Number of processes used to prepare the cities and of threads used to load them.
+        :return: A dictionary with the data of the requested cities.
+        """
+        keys = self._keys if keys is None else list(keys)
+
+        keys_to_prepare = [key for key in keys if not self.is_loaded(key)]
+        if num_workers > 1 and self._prepare_city is not None and len(keys_to_prepare) > 1:
+            with ProcessPoolExecutor(max_workers=min(num_workers, len(keys_to_prepare))) as executor:
+                list(executor.map(self._prepare_city, keys_to_prepare))
+
+        if num_workers > 1:
+            with ThreadPoolExecutor(max_workers=num_workers) as executor:
+                return dict(zip(keys, executor.map(self.__getitem__, keys)))
+
+        return {key: self[key] for key in keys}
+
+    def clear(self):
+        """
+        Forgets the loaded cities, the next access loads them again.
+        """
+        for key in self._keys:
+            with self._locks[key]:
+                self._data.pop(key, None)
@@ -1,11 +1,59 @@
 import os
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 
 import numpy as np
 import pandas as pd
-
-
-class NOAA2010Dataset(object):
+import pyarrow as pa
+
+from src.cache import read_excel_cached
+from src.fast_csv import CSV_ENGINES, parse_timestamps, read_csv_columns, split_by_key
+from src.features import CALENDAR_COLUMNS, build_calendar_features, build_hourly_features
+from src.instrumentation import LoaderStats
+from src.processed_data import ProcessedCitiesMixin
+
+
+_CSV_COLUMN_NAMES = ["station_id",
+                     "station_name",
+                     "latitude",
+                     "longitude",
+                     "height",
+                     "timestamp",
+                     "hourly_cldh",
+                     "hourly_cldh_attributes",
+                     "hourly_dewp",
+                     "hourly_dewp_attributes",
+                     "hourly_hidx",
+                     "hourly_hidx_attributes",
+                     "hourly_htdh",
+                     "hourly_htdh_attributes",
+                     "air_temp",
+                     "air_temp_attributes",
+                     "hourly_wchl",
+                     "hourly_wchl_attributes"]
+
+_CSV_DTYPES = {"station_id": "object",
+               "station_name": "object",
+               "latitude": "object",
+               "longitude": "object",
+               "height": np.float32,
+               "timestamp": "object",
+               "hourly_cldh": np.float32,
+               "hourly_cldh_attributes": "category",
+               "hourly_dewp": np.float32,
+               "hourly_dewp_attributes": "category",
+               "hourly_hidx": np.float32,
+               "hourly_hidx_attributes": "category",
+               "hourly_htdh": np.float32,
+               "hourly_htdh_attributes": "category",
+               "air_temp": np.float32,
+               "air_temp_attributes": "category",
+               "hourly_wchl": np.float32,
+               "hourly_wchl_attributes": "category"}
+
+_CSV_USE_COLUMNS = ["station_id", "station_name", "timestamp", "air_temp"]
+
+
+class NOAA2010Dataset(ProcessedCitiesMixin):
     """
     This dataset contains hourly measurements of different attributes like air temperature, dewp, and more.
     """
@@ -15,6 +63,10 @@ class NOAA2010Dataset(object):
     OLYMPIA_WA: str = "olympia_washington"
     ROCHESTER_NY: str = "rochester_newyork"
 
+    # Season boundaries are the dates of the equinoxes and solstices in Eastern Standard Time.
+    UTC_OFFSET_HOURS: float = -5.0
+    SEASON_BOUNDARIES: Dict[int, Tuple[str, str, str, str]] = dict()
+
     def __init__(self):
         self._dataset_local_extract_path = os.path.join(".", "data", "NOAA2010Dataset")
 
@@ -45,151 +97,109 @@ class NOAA2010Dataset(object):
         self._dhw_profile: Optional[pd.Series] = None
         self._all_data: Optional[pd.DataFrame] = None
 
+        self.stats = LoaderStats(type(self).__name__)
         self.data: Dict = dict()
         self.processed_data: Dict = dict()
 
-    def _load_all_data(self):
-        def calculate_season(data: pd.DataFrame):
-            winter_ends = "2010-03-20"
-            spring_ends = "2010-06-21"
-            summer_ends = "2010-09-22"
-            fall_ends = "2010-12-21"
-
-            data["season"] = "-"
-
-            winter_mask = (data.index >= fall_ends) | (data.index < winter_ends)
-            spring_mask = (data.index >= winter_ends) & (data.index < spring_ends)
-            summer_mask = (data.index >= spring_ends) & (data.index < summer_ends)
-            fall_mask = (data.index >= summer_ends) & (data.index < fall_ends)
-
-            data.loc[winter_mask, "season"] = "winter"
-            data.loc[spring_mask, "season"] = "spring"
-            data.loc[summer_mask, "season"] = "summer"
-            data.loc[fall_mask, "season"] = "fall"
-
-            return data["season"]
+    def _read_csv(self, engine: str):
+        if engine == "pyarrow":
+            self._all_data = read_csv_columns(self._dataset_path,
+                                              column_names=_CSV_COLUMN_NAMES,
+                                              columns=_CSV_USE_COLUMNS,
+                                              column_types={"station_id": pa.dictionary(pa.int32(), pa.string()),
+                                                            "station_name": pa.dictionary(pa.int32(), pa.string()),
+                                                            "timestamp": pa.dictionary(pa.int32(), pa.string()),
+                                                            "air_temp": pa.float32()},
+                                              skip_invalid_rows=True)
+        else:
+            self._all_data = pd.read_csv(self._dataset_path,
+                                         sep=",",
+                                         header=0,
+                                         error_bad_lines=False,
+                                         warn_bad_lines=True,
+                                         names=_CSV_COLUMN_NAMES,
+                                         dtype=_CSV_DTYPES,
+                                         usecols=_CSV_USE_COLUMNS)
+
+    def _load_all_data(self, engine: str = "pandas"):
+        with self.stats.stage("read_shared_workbooks"):
+            self._heat_demand = read_excel_cached(self._heat_demand_path)
+            self._dhw_profile = read_excel_cached(self._dhw_profile_path, index_col="Hour")
+
+        with self.stats.stage(f"read_csv_{engine}") as record:
+            self._read_csv(engine)
+            record.num_rows = self._all_data.shape[0]
+
+        # The file has no year, every timestamp is moved to 2010.
+        with self.stats.stage("parse_timestamps", num_rows=self._all_data.shape[0]):
+            self._all_data["timestamp"] = parse_timestamps(self._all_data["timestamp"],
+                                                           timestamp_format="%m-%dT%H:%M:%S",
+                                                           year=2010)
+
+            self._all_data = self._all_data.set_index("timestamp")
+
+        station_ids = {self.MIAMI_FL: self.miami_fl_station_id,
+                       self.FRESNO_CA: self.fresno_ca_station_id,
+                       self.OLYMPIA_WA: self.olympia_wa_station_id,
+                       self.ROCHESTER_NY: self.rochester_ny_station_id}
+        with self.stats.stage("split_by_station", num_rows=self._all_data.shape[0]):
+            stations = split_by_key(self._all_data, "station_id", list(station_ids.values()))
+            self.data = {city_key: stations[station_id] for city_key, station_id in station_ids.items()}
+            if engine == "pyarrow":
+                # Same dtypes as the pandas engine.
+                self.data = {city_key: dataset.astype({"station_id": object, "station_name": object})
+                             for city_key, dataset in self.data.items()}
+
+        for city_key, dataset in list(self.data.items()):
         
-        self._heat_demand = pd.read_excel(self._heat_demand_path)
-        self._dhw_profile = pd.read_excel(self._dhw_profile_path, index_col="Hour")
-        self._all_data = pd.read_csv(self._dataset_path,
-                                     sep=",",
-                                     header=0,
-                                     error_bad_lines=False,
-                                     warn_bad_lines=True,
-                                     names=["station_id",
-                                       "station_name",
-                                       "latitude",
-                                       "longitude",
-                                       "height",
-                                       "timestamp",
-                                       "hourly_cldh",
-                                       "hourly_cldh_attributes",
-                                       "hourly_dewp",
-                                       "hourly_dewp_attributes",
-                                       "hourly_hidx",
-                                       "hourly_hidx_attributes",
-                                       "hourly_htdh",
-                                       "hourly_htdh_attributes",
-                                       "air_temp",
-                                       "air_temp_attributes",
-                                       "hourly_wchl",
-                                       "hourly_wchl_attributes"],
-                                     dtype={"station_id": "object",
-                                       "station_name": "object",
-                                       "latitude": "object",
-                                       "longitude": "object",
-                                       "height": np.float32,
-                                       "timestamp": "object",
-                                       "hourly_cldh": np.float32,
-                                       "hourly_cldh_attributes": "category",
-                                       "hourly_dewp": np.float32,
-                                       "hourly_dewp_attributes": "category",
-                                       "hourly_hidx": np.float32,
-                                       "hourly_hidx_attributes": "category",
-                                       "hourly_htdh": np.float32,
-                                       "hourly_htdh_attributes": "category",
-                                       "air_temp": np.float32,
-                                       "air_temp_attributes": "category",
-                                       "hourly_wchl": np.float32,
-                                       "hourly_wchl_attributes": "category"},
-                                     usecols=["station_id", "station_name", "timestamp", "air_temp"])
-
-        self._all_data["timestamp"] = (pd.to_datetime(self._all_data["timestamp"],
-                                                      errors="raise",
-                                                      dayfirst=False,
-                                                      yearfirst=False,
-                                                      utc=None,
-                                                      format="%m-%dT%H:%M:%S")
-                                       .apply(lambda date: date.replace(year=2010)))
-
-        self._all_data = self._all_data.set_index("timestamp")
-
-        self.data = {self.MIAMI_FL: self._all_data[self._all_data.station_id == self.miami_fl_station_id].copy(),
-                     self.FRESNO_CA: self._all_data[self._all_data.station_id == self.fresno_ca_station_id].copy(),
-                     self.OLYMPIA_WA: self._all_data[self._all_data.station_id == self.olympia_wa_station_id].copy(),
-                     self.ROCHESTER_NY: self._all_data[self._all_data.station_id == self.rochester_ny_station_id].copy()}
-        
-        for city_key, dataset in self.data.items():
-        
-            num_rows_in_processed_data = dataset.shape[0]
-            num_days = dataset.index.dayofyear.max()
-
-            # We select the current city (determined by k and matched with the city_key column)
-            # Then we repeat the rows in the dataset for num_rows_in_processed_data times
-            # Third, we reindex the dataframe using the self.processed_data[k] index
-            # Lastly, we concat the heat demand columns into the processed data
-            heat_demand_for_city = self._heat_demand[self._heat_demand["city_key"] == city_key]
-            heat_demand_for_city = pd.concat([heat_demand_for_city] * num_rows_in_processed_data)
-            heat_demand_for_city = pd.DataFrame(heat_demand_for_city.values,
-                                                columns=heat_demand_for_city.columns,
-                                                index=dataset.index).astype({"DHW_cons": np.float32,
-                                                                             "SH_cons": np.float32,
-                                                                             "SFH_bldg_tot": np.float32,
-                                                                             "MFH_bldg_tot": np.float32,
-                                                                             "%SH_y": np.float32,
-                                                                             "%DHW_y": np.float32})
-
-            # The DHW profile is constant through the year but changes during the day (however, it keeps the same
-            # values for the same hour in different days). The NOAA2010 dataset does not contain the first hour (
-            # 2010-01-01 00:00:00). As such, we remove the first hour too (with [1:]) to make the DFs match.
-            dhw_profile_for_city = pd.concat([self._dhw_profile] * num_days)[1:]
-            dhw_profile_for_city = pd.DataFrame(dhw_profile_for_city.values,
-                                                columns=dhw_profile_for_city.columns,
-                                                index=dataset.index).astype({"DHW Profile": np.float32})
-
-            dataset[heat_demand_for_city.columns] = heat_demand_for_city
-            dataset["DHW_hourly_consumption_ratio"] = dhw_profile_for_city["DHW Profile"]
-            dataset["season"] = calculate_season(dataset)
-            dataset["date"] = dataset.index.date
-            dataset["month"] = dataset.index.month
-            dataset["dayofyear"] = dataset.index.dayofyear
-            dataset["dayofweek"] = dataset.index.dayofweek
-            dataset["hourofyear"] = (dataset.index.dayofyear - 1) * 24 + (dataset.index.hour + 1)
-            dataset["hour"] = dataset.index.hour
-
-            dataset = dataset
+            # We select the current city (determined by city_key and matched with the city_key column) and broadcast
+            # its heat demand columns to every hour. The DHW profile is constant through the year but changes during
+            # the day (however, it keeps the same values for the same hour in different days), so each hour takes the
+            # value of the profile for its hour of the day. This also covers the missing first hour of the NOAA2010
+            # dataset (2010-01-01 00:00:00).
+            with self.stats.stage("hourly_features", key=city_key, num_rows=dataset.shape[0]):
+                features = build_hourly_features(dataset.index,
+                                                 self._heat_demand,
+                                                 city_key,
+                                                 heat_demand_dtypes={"DHW_cons": np.float32,
+                                                                     "SH_cons": np.float32,
+                                                                     "SFH_bldg_tot": np.float32,
+                                                                     "MFH_bldg_tot": np.float32,
+                                                                     "%SH_y": np.float32,
+                                                                     "%DHW_y": np.float32},
+                                                 hour_of_day_profiles={
+                                                     "DHW_hourly_consumption_ratio": self._dhw_profile["DHW Profile"]
+                                                 })
+
+                dataset = pd.concat([dataset, features], axis=1)
+
+            with self.stats.stage("calendar_columns", key=city_key, num_rows=dataset.shape[0]):
+                calendar = build_calendar_features(dataset.index,
+                                                   utc_offset_hours=self.UTC_OFFSET_HOURS,
+                                                   season_overrides=self.SEASON_BOUNDARIES)
+                for column in CALENDAR_COLUMNS:
+                    dataset[column] = calendar[column].array
+
+            self.data[city_key] = dataset
             
-    def load_data(self, reload: bool = False) -> Dict:
-        if reload or len(self.data) == 0:
-            self._load_all_data()
+    def load_data(self, reload: bool = False, engine: str = "pandas") -> Dict:
+        """
 
-        return self.data.copy()
+        :param reload: If True, then the data is read again from the files.
+        :param engine: Either "pandas" or "pyarrow". The pyarrow engine reads the CSV file with a multithreaded
+        columnar reader, it is meant for large multi-station exports.
+        :return: A dictionary with the hourly data of each city.
+        """
+        if engine not in CSV_ENGINES:
+            raise ValueError(f"Value of 'engine' is invalid. Valid values are {CSV_ENGINES}.")
 
-    def _load_all_processed_data(self):
-        keys_with_paths = [(self.MIAMI_FL, self.processed_miami_fl_dataset_path),
-                           (self.FRESNO_CA, self.processed_fresno_ca_dataset_path),
-                           (self.OLYMPIA_WA, self.processed_olympia_wa_dataset_path),
-                           (self.ROCHESTER_NY, self.processed_rochester_ny_dataset_path)]
-        columns_from_kw_to_mw = ['heat_source1', 'heat_source2', 'heat_aquifer', "E_el", "Total_consumption", "Total_consumption_fit",]
-        
-        for k, file_path in keys_with_paths:
-            data = pd.read_parquet(path=f"{file_path}.parquet",
-                                   engine="pyarrow")
-            data[columns_from_kw_to_mw] = data[columns_from_kw_to_mw] / 1000
-            self.processed_data[k] = data
+        if reload or len(self.data) == 0:
+            self._load_all_data(engine=engine)
 
-    def load_processed_data(self, reload: bool = False):
-        if reload or len(self.processed_data) == 0 or self._heat_demand is None or self._dhw_profile is None:
-            self._load_all_processed_data()
+        return self.data.copy()
 
-        return self.processed_data.copy()
+    def _processed_dataset_paths(self) -> Dict[str, str]:
+        return {self.MIAMI_FL: self.processed_miami_fl_dataset_path,
+                self.FRESNO_CA: self.processed_fresno_ca_dataset_path,
+                self.OLYMPIA_WA: self.processed_olympia_wa_dataset_path,
+                self.ROCHESTER_NY: self.processed_rochester_ny_dataset_path}
@@ -1,8 +1,12 @@
 import os
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 
-from typing import Optional
+from typing import List, Optional
+
+from src.fast_csv import CSV_ENGINES, parse_timestamps, read_csv_columns
+from src.instrumentation import LoaderStats
 
 
 class OspitalettoDataset(object):
@@ -16,22 +20,53 @@ class OspitalettoDataset(object):
                                                    "processed",
                                                    "data.csv")
 
+        self.stats = LoaderStats(type(self).__name__)
         self.data: Optional[pd.DataFrame] = None
         self.processed_data: Optional[pd.DataFrame] = None
 
-    def load_all_data(self):
-        self.data = pd.read_csv(self._dataset_path,
-                                names=["fist", "timestamp", "air_temp"],
-                                usecols=["timestamp", "air_temp"],
-                                index_col=0,
-                                header=0,
-                                parse_dates=True,
-                                infer_datetime_format=True)
+    def load_all_data(self, engine: str = "pandas", timestamp_format: Optional[str] = None):
+        """
+
+        :param engine: Either "pandas" or "pyarrow". The pyarrow engine reads the CSV file with a multithreaded
+        columnar reader.
+        :param timestamp_format: strftime format of the timestamps. If None, then the format is inferred.
+        :return: A dictionary with the sensor measurements.
+        """
+        if engine not in CSV_ENGINES:
+            raise ValueError(f"Value of 'engine' is invalid. Valid values are {CSV_ENGINES}.")
+
+        with self.stats.stage(f"read_csv_{engine}") as record:
+            if engine == "pyarrow":
+                self.data = read_csv_columns(self._dataset_path,
+                                             column_names=["fist", "timestamp", "air_temp"],
+                                             columns=["timestamp", "air_temp"],
+                                             column_types={"timestamp": pa.dictionary(pa.int32(), pa.string()),
+                                                           "air_temp": pa.float64()})
+                self.data["timestamp"] = parse_timestamps(self.data["timestamp"], timestamp_format=timestamp_format)
+                self.data = self.data.set_index("timestamp")
+            elif timestamp_format is not None:
+                self.data = pd.read_csv(self._dataset_path,
+                                        names=["fist", "timestamp", "air_temp"],
+                                        usecols=["timestamp", "air_temp"],
+                                        index_col=0,
+                                        header=0)
+                self.data.index = pd.to_datetime(self.data.index, format=timestamp_format)
+            else:
+                self.data = pd.read_csv(self._dataset_path,
+                                        names=["fist", "timestamp", "air_temp"],
+                                        usecols=["timestamp", "air_temp"],
+                                        index_col=0,
+                                        header=0,
+                                        parse_dates=True,
+                                        infer_datetime_format=True)
+            record.num_rows = self.data.shape[0]
+
         # Remove invalid values
         # Another option is to set these values to 15 using: df.loc[df['Temp'] == -999, 'Temp'] = 15
         # Or using the mean: df.loc[df['Temp'] == -999, 'Temp'] = df['Temp'].mean()
-        self.data = self.data[(self.data.air_temp != 999.0)
-                              & (self.data.air_temp != -999.0)]
+        with self.stats.stage("remove_invalid_values", num_rows=self.data.shape[0]):
+            self.data = self.data[(self.data.air_temp != 999.0)
+                                  & (self.data.air_temp != -999.0)]
 
         return {self.OSPITALETTO: self.data.copy()}
 
@@ -41,18 +76,43 @@ class OspitalettoDataset(object):
 
         return self.data['air_temp'].resample('H').mean().to_frame()
 
-    def load_processed_data(self, reload: bool = False):
-        if reload or self.processed_data is None:
-            self.processed_data = pd.read_csv(self.processed_dataset_path,
-                                              index_col=0,
-                                              header=0,
-                                              parse_dates=True,
-                                              infer_datetime_format=True,
-                                              dtype={"air_temp": np.float32,
-                                                     "dayofyear": np.int32,
-                                                     "hourofyear": np.int32,
-                                                     "air_temp_fit": np.float32})
+    def _read_processed_data(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        usecols = None
+        if columns is not None:
+            # The index is the first column of the file.
+            index_column = pd.read_csv(self.processed_dataset_path, nrows=0).columns[0]
+            usecols = [index_column, *columns]
 
-        return {self.OSPITALETTO: self.processed_data.copy()}
+        with self.stats.stage("read_processed_files") as record:
+            processed_data = pd.read_csv(self.processed_dataset_path,
+                                         index_col=0,
+                                         header=0,
+                                         usecols=usecols,
+                                         parse_dates=True,
+                                         infer_datetime_format=True,
+                                         dtype={"air_temp": np.float32,
+                                                "dayofyear": np.int32,
+                                                "hourofyear": np.int32,
+                                                "air_temp_fit": np.float32})
+            record.num_rows = processed_data.shape[0]
 
+        return processed_data
 
+    def load_processed_data(self, reload: bool = False, columns: Optional[List[str]] = None):
+        """
+
+        :param reload: If True, then the data is read again from the file.
+        :param columns: Columns to load (the index is always loaded). None loads all of them. Only the requested
+        columns are parsed, and they are not kept in processed_data.
+        :return: A dictionary with the processed data.
+        """
+        if columns is not None:
+            if not reload and self.processed_data is not None:
+                return {self.OSPITALETTO: self.processed_data[columns].copy()}
+
+            return {self.OSPITALETTO: self._read_processed_data(columns=columns)}
+
+        if reload or self.processed_data is None:
+            self.processed_data = self._read_processed_data()
+
+        return {self.OSPITALETTO: self.processed_data.copy()}
@@ -0,0 +1,154 @@
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.cache import atomic_write_path, file_content_hash, options_hash
+from src.processed_data import read_processed_parquet
+
+
+CUBE_DIMENSIONS = ["city_key", "season", "dayofweek", "hour", "month"]
+
+CUBE_STATISTICS = ["count", "sum", "sum_sq", "min", "max"]
+
+# Statistics that summarize_cube derives from CUBE_STATISTICS.
+SUMMARY_STATISTICS = ["count", "sum", "mean", "std", "min", "max"]
+
+# Folder of the cached cubes, one subfolder per dataset.
+AGGREGATION_CACHE_DIR: str = os.path.join(".", "data", ".aggregation_cache")
+
+DEFAULT_CUBE_MEASURES = ["E_el", "Total_consumption", "Total_consumption_fit", "heat_source1", "heat_source2",
+                         "heat_aquifer", "air_temp"]
+
+
+def build_aggregation_cube(data: Dict[str, pd.DataFrame], measures: Sequence[str]) -> pd.DataFrame:
+    """
+    Aggregates the hourly data of several cities by season, day of the week, hour and month. The cube keeps additive
+    statistics (count, sum, sum of squares, min and max), so any coarser grouping can be derived from it exactly, see
+    summarize_cube.
+
+    :param data: A dictionary with the hourly data of each city, with the season, dayofweek, hour and month columns.
+    :param measures: Columns to aggregate.
+    :return: A tidy DataFrame with the CUBE_DIMENSIONS columns, a measure column and the CUBE_STATISTICS columns, with
+    one row for each measure and combination of dimensions that appears in the data.
+    """
+    measures = list(measures)
+    dimensions = CUBE_DIMENSIONS[1:]
+
+    cubes = []
+    for city_key, city_data in data.items():
+        values = city_data[measures].astype(np.float64)
+        keys = [city_data[dimension].astype(str) if dimension == "season" else city_data[dimension]
+                for dimension in dimensions]
+
+        statistics = pd.concat([values, values.pow(2).add_suffix("__sq")], axis=1).groupby(keys, sort=True)
+        sums = statistics.sum(min_count=1)
+        city_cube = pd.concat({"count": statistics.count()[measures],
+                               "sum": sums[measures],
+                               "sum_sq": sums[[f"{measure}__sq" for measure in measures]].set_axis(measures, axis=1),
+                               "min": statistics.min()[measures],
+                               "max": statistics.max()[measures]},
+                              axis=1)
+        # One row per measure instead of one column per (statistic, measure) pair.
+        city_cube = city_cube.stack(level=1).rename_axis(index=[*dimensions, "measure"]).reset_index()
+        city_cube.insert(0, "city_key", city_key)
+        cubes.append(city_cube)
+
+    cube = pd.concat(cubes, ignore_index=True)
+    cube["count"] = cube["count"].astype(np.int64)
+    for column in ["city_key", "season", "measure"]:
+        cube[column] = cube[column].astype("category")
+
+    return cube[[*CUBE_DIMENSIONS, "measure", *CUBE_STATISTICS]]
+
+
+def summarize_cube(cube: pd.DataFrame,
+                   by: List[str],
+                   measure: str,
+                   statistics: Sequence[str] = ("mean",)) -> pd.DataFrame:
+    """
+    Rolls the cube up to the requested dimensions. For instance, the mean electricity use for each city, season and
+    day of the week is summarize_cube(cube, ["city_key", "season", "dayofweek"], "E_el")["mean"].
+
+    :param cube: A cube as returned by build_aggregation_cube.
+    :param by: Dimensions to keep, a subset of CUBE_DIMENSIONS.
+    :param measure: Measure to summarize.
+    :param statistics: Statistics to compute, a subset of SUMMARY_STATISTICS.
+    :return: A DataFrame indexed by the by dimensions with one column per statistic.
+    """
+    invalid_dimensions = set(by) - set(CUBE_DIMENSIONS)
+    if len(invalid_dimensions) > 0:
+        raise ValueError(f"Dimensions {sorted(invalid_dimensions)} are invalid. Valid values are {CUBE_DIMENSIONS}.")
+    invalid_statistics = set(statistics) - set(SUMMARY_STATISTICS)
+    if len(invalid_statistics) > 0:
+        raise ValueError(f"Statistics {sorted(invalid_statistics)} are invalid. "
+                         f"Valid values are {SUMMARY_STATISTICS}.")
+
+    rows = cube[cube["measure"] == measure]
+    grouped = rows.groupby(by, sort=True, observed=True)
+    totals = grouped[["count", "sum", "sum_sq"]].sum()
+
+    summary = pd.DataFrame(index=totals.index)
+    for statistic in statistics:
+        if statistic in ("count", "sum"):
+            summary[statistic] = totals[statistic]
+        elif statistic == "mean":
+            summary[statistic] = totals["sum"] / totals["count"].where(totals["count"] > 0)
+        elif statistic == "std":
+            count = totals["count"].where(totals["count"] > 1)
+            variance = (totals["sum_sq"] - totals["sum"] ** 2 / count) / (count - 1)
+            summary[statistic] = np.sqrt(variance.clip(lower=0))
+        else:
+            summary[statistic] = getattr(grouped[statistic], statistic)()
+
+    return summary
+
+
+def load_aggregation_cube(paths: Dict[str, str],
+                          cache_dir: str,
+                          measures: Sequence[str] = DEFAULT_CUBE_MEASURES,
+                          reload: bool = False) -> pd.DataFrame:
+    """
+    Builds the aggregation cube of the processed files of several cities, or reads it from cache_dir. The cache entry
+    is keyed by the cities and the measures, and by the content of the processed files, so it is rebuilt whenever a
+    processed file changes. When a new entry is written, only the entries of previous contents of the same cities
+    and measures are removed. Only the dimensions and the measures are read from the processed files.
+
+    :param paths: A dictionary with the path (without extension) of the processed file of each city.
+    :param cache_dir: Folder of the cache entries, e.g., a subfolder of AGGREGATION_CACHE_DIR.
+    :param measures: Columns to aggregate.
+    :param reload: If True, then the cube is rebuilt even if it is cached.
+    :return: The aggregation cube, see build_aggregation_cube.
+    """
+    measures = list(measures)
+    prefix = f"aggregation_cube-{options_hash({'cities': sorted(paths), 'measures': measures})[:16]}-"
+    content_key = options_hash({city_key: file_content_hash(f"{path}.parquet") for city_key, path in paths.items()})
+    cache_path = os.path.join(cache_dir, f"{prefix}{content_key[:32]}.parquet")
+
+    if not reload and os.path.exists(cache_path):
+        return pd.read_parquet(path=cache_path, engine="pyarrow")
+
+    columns = [dimension for dimension in CUBE_DIMENSIONS[1:]] + measures
+    cube = build_aggregation_cube({city_key: read_processed_parquet(f"{path}.parquet", columns=columns)
+                                   for city_key, path in paths.items()},
+                                  measures)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with atomic_write_path(cache_path) as temporary_path:
+        cube.to_parquet(path=temporary_path, engine="pyarrow")
+    for filename in os.listdir(cache_dir):
+        if filename.startswith(prefix) and filename.endswith(".parquet") and filename != os.path.basename(cache_path):
+            os.remove(os.path.join(cache_dir, filename))
+
+    return cube
+
+
+def cube_lookup(summary: pd.Series, keys: Sequence[Optional[object]]) -> pd.Series:
+    """
+    :param summary: A statistic as returned by summarize_cube, e.g., summarize_cube(...)["mean"].
+    :param keys: Keys of the rows to look up, missing keys get NaN.
+    :return: The values of the statistic for the keys, in order.
+    """
+    index = pd.MultiIndex.from_tuples(keys) if isinstance(summary.index, pd.MultiIndex) else pd.Index(keys)
+    return summary.reindex(index)
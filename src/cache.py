@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import pandas as pd
+
+
+EXCEL_CACHE_DIR: str = os.path.join(".", "data", ".excel_cache")
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_content_hash(path: str) -> str:
+    """
+    :return: The sha256 hex digest of the content of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def options_hash(options: dict) -> str:
+    """
+    :return: A sha256 hex digest of the options, independent of their order. Values without a JSON representation
+    (like numpy dtypes) are hashed through their string representation.
+    """
+    return hashlib.sha256(json.dumps(options, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def atomic_write_path(path: str) -> Iterator[str]:
+    """
+    Yields the path of a new temporary file in the folder of path, which replaces path when the block ends without
+    errors and is removed otherwise. Each writer gets its own temporary file, so processes filling the same cache
+    entry at once do not truncate each other's file, the last one to finish replaces the entry.
+
+    :param path: Path of the file to write.
+    :return: The path of the temporary file.
+    """
+    folder = os.path.dirname(path) or "."
+    # The leading dot keeps the temporary files out of the prefixes of the cache entries, so they are not evicted.
+    handle, temporary_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=folder)
+    os.close(handle)
+    try:
+        yield temporary_path
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def read_excel_cached(path: str, cache_dir: Optional[str] = EXCEL_CACHE_DIR, **read_options) -> pd.DataFrame:
+    """
+    Reads an Excel file through a parquet cache. The cache entry is keyed by the content of the file and the read
+    options, so changing the workbook or the options invalidates it automatically. When a new entry is written, the
+    entries of previous contents of the workbook read with the same options are removed. Entries of other options
+    are kept, so callers reading the same workbook with different options do not evict each other.
+
+    :param path: Path of the Excel file.
+    :param cache_dir: Folder of the cache entries. If None, then the file is read without the cache.
+    :param read_options: Options passed to pd.read_excel.
+    :return: The same DataFrame as pd.read_excel(path, **read_options).
+    """
+    if cache_dir is None:
+        return pd.read_excel(path, **read_options)
+
+    content_key = file_content_hash(path)[:32]
+    # Workbooks with the same name in different folders (e.g., Rome.xls) must not share entries.
+    path_key = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+    prefix = f"{os.path.basename(path)}-{path_key}-{options_hash(read_options)[:16]}-"
+    cache_path = os.path.join(cache_dir, f"{prefix}{content_key}.parquet")
+
+    if os.path.exists(cache_path):
+        return pd.read_parquet(path=cache_path, engine="pyarrow")
+
+    data = pd.read_excel(path, **read_options)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        with atomic_write_path(cache_path) as temporary_path:
+            data.to_parquet(path=temporary_path, engine="pyarrow")
+    except (TypeError, ValueError, NotImplementedError, ImportError):
+        # Some workbooks (e.g., columns with mixed types) cannot be stored as parquet, these are not cached.
+        return data
+
+    for filename in os.listdir(cache_dir):
+        if filename.startswith(prefix) and filename.endswith(".parquet") and filename != os.path.basename(cache_path):
+            os.remove(os.path.join(cache_dir, filename))
+
+    return data
@@ -0,0 +1,99 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.functions import ArrayLike
+
+
+DEGREE_DAY_KINDS = ("heating", "cooling")
+
+
+def day_codes(index: pd.DatetimeIndex) -> Tuple[np.ndarray, pd.DatetimeIndex]:
+    """
+    :param index: Hourly (or finer) timestamps.
+    :return: The position of the day of each timestamp and the days, in order of appearance.
+    """
+    codes, days = pd.factorize(pd.DatetimeIndex(index).normalize())
+    return codes.astype(np.int32), pd.DatetimeIndex(days)
+
+
+def daily_means(values: ArrayLike, codes: ArrayLike, num_days: int) -> np.ndarray:
+    """
+    :param values: A (series x hours) matrix, e.g., air temperatures.
+    :param codes: Position of the day of each hour, as returned by day_codes.
+    :param num_days: Number of days.
+    :return: A (series x days) matrix with the mean of the hours of each day, NaN values are ignored. Days without
+    values are NaN.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    codes = np.asarray(codes)
+    valid = ~np.isnan(values)
+
+    # A single bincount over all the series: the days of series i are shifted by i * num_days.
+    flat_codes = (codes[np.newaxis, :] + num_days * np.arange(values.shape[0])[:, np.newaxis]).ravel()
+    sums = np.bincount(flat_codes, weights=np.where(valid, values, 0).ravel(), minlength=values.shape[0] * num_days)
+    counts = np.bincount(flat_codes, weights=valid.ravel(), minlength=values.shape[0] * num_days)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums / counts).reshape(values.shape[0], num_days)
+
+
+def degree_values(temperatures: ArrayLike, base_temperatures: ArrayLike, kind: str = "heating") -> np.ndarray:
+    """
+    :param temperatures: A (series x days) or (series x hours) matrix of outdoor temperatures.
+    :param base_temperatures: One or more base temperatures.
+    :param kind: heating (base - T) or cooling (T - base).
+    :return: A (bases x series x periods) array with the degrees below (heating) or above (cooling) each base
+    temperature, 0 when the temperature does not reach the base or is NaN, as max(0, base - T) in Python.
+    """
+    if kind not in DEGREE_DAY_KINDS:
+        raise ValueError(f"Value of 'kind' is invalid. Valid values are {DEGREE_DAY_KINDS}.")
+
+    temperatures = np.atleast_2d(np.asarray(temperatures, dtype=np.float64))[np.newaxis]
+    base_temperatures = np.atleast_1d(np.asarray(base_temperatures, dtype=np.float64))[:, np.newaxis, np.newaxis]
+    degrees = base_temperatures - temperatures if kind == "heating" else temperatures - base_temperatures
+    return np.where(degrees > 0, degrees, 0)
+
+
+def normalized_degree_days(daily_temperatures: ArrayLike,
+                           base_temperatures: ArrayLike,
+                           kind: str = "heating") -> np.ndarray:
+    """
+    :param daily_temperatures: A (series x days) matrix of daily mean outdoor temperatures.
+    :param base_temperatures: One or more base temperatures.
+    :param kind: heating or cooling.
+    :return: A (bases x series x days) array with the share of the degree days of each series on each day. Series
+    without degree days for a base temperature are NaN, as the distribution is undefined.
+    """
+    degrees = degree_values(daily_temperatures, base_temperatures, kind)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return degrees / degrees.sum(axis=-1, keepdims=True)
+
+
+def degree_day_weights(temperatures: ArrayLike,
+                       index: pd.DatetimeIndex,
+                       base_temperatures: ArrayLike,
+                       kind: str = "heating") -> np.ndarray:
+    """
+    Distributes a yearly demand over the days according to the degree days, as the processing notebook does for the
+    space heating and cooling demand, for many series and base temperatures at once. Each hour gets the weight of its
+    day, i.e., the weights of the hours of a day sum to 24 times the weight of the day.
+
+    :param temperatures: A (series x hours) matrix of outdoor temperatures on index, or a (series x days) matrix of
+    daily mean temperatures on the days of index.
+    :param index: Hourly timestamps of the result.
+    :param base_temperatures: One or more base temperatures.
+    :param kind: heating or cooling.
+    :return: A (bases x series x hours) array with the normalized degree days of the day of each hour.
+    """
+    temperatures = np.atleast_2d(np.asarray(temperatures, dtype=np.float64))
+    codes, days = day_codes(index)
+    if temperatures.shape[1] == len(index):
+        daily_temperatures = daily_means(temperatures, codes, len(days))
+    elif temperatures.shape[1] == len(days):
+        daily_temperatures = temperatures
+    else:
+        raise ValueError(f"The temperatures have {temperatures.shape[1]} values per series, but the index has "
+                         f"{len(index)} hours and {len(days)} days.")
+
+    return normalized_degree_days(daily_temperatures, base_temperatures, kind)[..., codes]
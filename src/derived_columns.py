@@ -0,0 +1,321 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from src.degree_days import daily_means, day_codes
+from src.dispatch import (HEAT_SUPPLY_COLUMNS, calculate_chiller_el, calculate_cooltower, calculate_cop,
+                          calculate_eer_cool, calculate_heatsupply, calculate_tnet, heat_losses)
+from src.sweep import (AMBIENT_FIT_SCALARS, COOL_TOWER_EL_RATIO, climatic_curve, fit_ambient_temperature,
+                       ground_and_aquifer_temperatures, hourly_demand, users_temperature)
+
+
+# Receives the values of the inputs (hourly arrays or scalars), the parameters and the index of the data, and returns
+# the values of the outputs.
+DerivationFunction = Callable[[Dict[str, Any], Dict[str, Any], pd.DatetimeIndex], Dict[str, Any]]
+
+
+class Derivation(object):
+    """
+    Computes one or more derived values (hourly columns or scalars, e.g., the ambient fit) from input values and
+    parameters.
+    """
+
+    def __init__(self, outputs: List[str], function: DerivationFunction, inputs: List[str], parameters: List[str]):
+        """
+
+        :param outputs: Names of the values it computes.
+        :param function: Computes the outputs, see DerivationFunction.
+        :param inputs: Names of the columns (of the data or derived) and scalars it reads.
+        :param parameters: Names of the parameters it reads, e.g., DT_evap.
+        """
+        self.outputs = outputs
+        self.function = function
+        self.inputs = inputs
+        self.parameters = parameters
+
+
+def _single(output: str, function: Callable[..., Any], inputs: List[str], parameters: List[str]) -> Derivation:
+    # A derivation of one output, whose function receives the inputs and then the parameters as positional arguments.
+    def compute(values: Dict[str, Any], parameters_values: Dict[str, Any], index: pd.DatetimeIndex) -> Dict[str, Any]:
+        return {output: function(*[values[name] for name in inputs],
+                                 *[parameters_values[name] for name in parameters])}
+
+    return Derivation([output], compute, inputs, parameters)
+
+
+def _ambient_fit(values: Dict[str, Any], parameters: Dict[str, Any], index: pd.DatetimeIndex) -> Dict[str, Any]:
+    return fit_ambient_temperature(index, values["air_temp"], values["hourofyear"])
+
+
+def _hourly_demand(values: Dict[str, Any], parameters: Dict[str, Any], index: pd.DatetimeIndex) -> Dict[str, Any]:
+    inputs = dict(values)
+    inputs["day_code"], days = day_codes(index)
+    inputs["daily_air_temp"] = daily_means(values["air_temp"], inputs["day_code"], len(days))[0]
+    return hourly_demand(inputs, parameters)
+
+
+def _ground_temperatures(values: Dict[str, Any],
+                         parameters: Dict[str, Any],
+                         index: pd.DatetimeIndex) -> Dict[str, Any]:
+    return ground_and_aquifer_temperatures(values, parameters)
+
+
+def _scheduled(scale: str, schedule: str) -> Callable[[Dict[str, Any], Dict[str, Any], pd.DatetimeIndex], Any]:
+    # The scale (e.g., Ts1 or cap_source1) in the hours of the week in which the schedule is on.
+    def compute(values: Dict[str, Any], parameters: Dict[str, Any], index: pd.DatetimeIndex) -> np.ndarray:
+        return parameters[scale] * np.asarray(parameters[schedule])[index.hour, index.dayofweek]
+
+    return compute
+
+
+def _heat_losses(values: Dict[str, Any], parameters: Dict[str, Any], index: pd.DatetimeIndex) -> Dict[str, Any]:
+    losses = heat_losses(values["net_temp"], values["ground_temp"], parameters["DT_evap"])
+    return {column: losses[column].to_numpy() for column in losses.columns}
+
+
+def _heat_supply(values: Dict[str, Any], parameters: Dict[str, Any], index: pd.DatetimeIndex) -> Dict[str, Any]:
+    heat_supply = calculate_heatsupply(values["source1_cap"], values["source2_cap"], values["ground_source_cap"],
+                                       values["source1_temp"], values["source2_temp"], values["Q_net"])
+    return {column: heat_supply[column].to_numpy() for column in HEAT_SUPPLY_COLUMNS}
+
+
+def _hourly(function: Callable[[Dict[str, Any], Dict[str, Any], pd.DatetimeIndex], Any],
+            output: str,
+            inputs: List[str],
+            parameters: List[str]) -> Derivation:
+    def compute(values: Dict[str, Any], parameters_values: Dict[str, Any], index: pd.DatetimeIndex) -> Dict[str, Any]:
+        return {output: function(values, parameters_values, index)}
+
+    return Derivation([output], compute, inputs, parameters)
+
+
+# The derived hourly columns of the processed files, from the demand to the hourly costs and emissions, as computed
+# by the processing notebook (and simulate_dispatch).
+PROCESSED_DERIVATIONS: List[Derivation] = [
+    Derivation(["air_temp_fit", *AMBIENT_FIT_SCALARS], _ambient_fit, ["air_temp", "hourofyear"], []),
+    Derivation(["SH_dist", "DHW_dist", "Thermal_consumption", "SC_consumption"],
+               _hourly_demand,
+               ["air_temp", "%SH_y", "%DHW_y", "SH_hourly_consumption_ratio", "DHW_hourly_consumption_ratio",
+                "SC_hourly_consumption_ratio"],
+               ["T_base_heat_degree", "T_base_cool_degree", "Heat_year", "Cool_year"]),
+    _single("space_heating_temp", climatic_curve, ["air_temp"], ["Tmin_i", "Tmax_i"]),
+    _single("user_temp", users_temperature, ["SH_dist", "DHW_dist", "Thermal_consumption", "space_heating_temp"],
+            ["Tdhw"]),
+    Derivation(["ground_temp", "aquifer_temp"],
+               _ground_temperatures,
+               ["hourofyear", "Tg_und", "DT_y", "dd_min"],
+               ["depth_aquifer"]),
+    _hourly(_scheduled("Ts1", "s1_schedule"), "source1_temp", [], ["Ts1", "s1_schedule"]),
+    _hourly(_scheduled("Ts2", "s2_schedule"), "source2_temp", [], ["Ts2", "s2_schedule"]),
+    _single("net_temp", calculate_tnet, ["source1_temp", "source2_temp", "aquifer_temp"], []),
+    _single("COP", calculate_cop, ["user_temp", "net_temp"], ["DT_evap"]),
+    _single("EER_cool", calculate_eer_cool, ["net_temp"], []),
+    Derivation(["E_loss_s", "E_loss_r", "E_loss_tot"], _heat_losses, ["net_temp", "ground_temp"], ["DT_evap"]),
+    _single("Q_evap", lambda thermal_consumption, cop: thermal_consumption * (1 - 1 / cop),
+            ["Thermal_consumption", "COP"], []),
+    _single("Q_cond", lambda sc_consumption, eer_cool: sc_consumption * (1 + 1 / eer_cool),
+            ["SC_consumption", "EER_cool"], []),
+    _single("Q_net", lambda q_evap, e_loss_tot, q_cond: q_evap + e_loss_tot - q_cond,
+            ["Q_evap", "E_loss_tot", "Q_cond"], []),
+    _hourly(_scheduled("cap_source1", "s1_schedule"), "source1_cap", [], ["cap_source1", "s1_schedule"]),
+    _hourly(_scheduled("cap_source2", "s2_schedule"), "source2_cap", [], ["cap_source2", "s2_schedule"]),
+    _hourly(lambda values, parameters, index: np.full(len(index), parameters["cap_ground"], dtype=np.float64),
+            "ground_source_cap", [], ["cap_ground"]),
+    Derivation(HEAT_SUPPLY_COLUMNS,
+               _heat_supply,
+               ["source1_cap", "source2_cap", "ground_source_cap", "source1_temp", "source2_temp", "Q_net"],
+               []),
+    _single("E_el_chiller", calculate_chiller_el, ["air_temp", "net_temp", "cool_aux"], []),
+    _single("Q_cool_tower", calculate_cooltower, ["air_temp", "net_temp", "cool_aux", "E_el_chiller"], []),
+    _single("E_el_h", lambda thermal_consumption, cop: thermal_consumption / cop, ["Thermal_consumption", "COP"], []),
+    _single("E_el_c", lambda sc_consumption, eer_cool: sc_consumption / eer_cool, ["SC_consumption", "EER_cool"], []),
+    _single("E_el_total", lambda e_el_h, e_el_c: e_el_h + e_el_c, ["E_el_h", "E_el_c"], []),
+    _single("HP_el_cost", lambda e_el_total, price: e_el_total * price * 1000, ["E_el_total", "El_price_ind"], []),
+    _single("HP_el_CO2", lambda e_el_total, carbon: e_el_total * carbon / 1000,
+            ["E_el_total", "Carbon_emissions_profile"], []),
+    _single("Chiller_CO2", lambda e_el_chiller, carbon: e_el_chiller * carbon / 1000,
+            ["E_el_chiller", "Carbon_emissions_profile"], []),
+    _single("Cool_tower_CO2", lambda q_cool_tower, carbon: q_cool_tower * COOL_TOWER_EL_RATIO * carbon / 1000,
+            ["Q_cool_tower", "Carbon_emissions_profile"], []),
+    _single("Aux_heater_CO2", lambda heat_aux_heater, co2_gas: heat_aux_heater * co2_gas / 1000,
+            ["heat_aux_heater", "CO2_gas"], []),
+    _single("cost_source1", lambda heat_source1, price: heat_source1 * price, ["heat_source1", "WH_price"], []),
+    _single("cost_source2", lambda heat_source2, price: heat_source2 * price, ["heat_source2", "WH_price"], []),
+]
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    # Parameters may be schedules (nested lists or arrays).
+    if isinstance(a, (list, tuple, np.ndarray)) or isinstance(b, (list, tuple, np.ndarray)):
+        return np.array_equal(np.asarray(a), np.asarray(b))
+    return a == b
+
+
+class DerivedFrame(object):
+    """
+    Hourly data of a city whose derived columns are declared with their inputs and parameters (see Derivation) and
+    computed lazily, the first time they are accessed:
+
+        frame = DerivedFrame(dataset, simulation_values)
+        frame["Q_net"]  # Computes only the columns Q_net depends on.
+        frame.set_parameters(DT_evap=5)
+        frame["Q_net"]  # Recomputes COP, the heat losses and the Q columns, not the demand or the ground.
+
+    Changing a parameter (or replacing a column of the data) invalidates only the values that depend on it, directly
+    or through other derived values. Columns of the data that a derivation produces (e.g., COP in a processed file)
+    are derived again instead of read.
+    """
+
+    def __init__(self,
+                 data: pd.DataFrame,
+                 parameters: Dict[str, Any],
+                 derivations: Optional[List[Derivation]] = None):
+        """
+
+        :param data: Hourly data of a city, e.g., as returned by the datasets or read from a processed file.
+        :param parameters: Simulation values, with the same keys as simulation_values.json.
+        :param derivations: Derived values, every output produced by one derivation. PROCESSED_DERIVATIONS by default.
+        """
+        derivations = PROCESSED_DERIVATIONS if derivations is None else derivations
+
+        self._derivations: Dict[str, Derivation] = dict()
+        for derivation in derivations:
+            for output in derivation.outputs:
+                if output in self._derivations:
+                    raise ValueError(f"Value '{output}' is produced by more than one derivation.")
+                self._derivations[output] = derivation
+
+        self.data = data.drop(columns=[column for column in data.columns if column in self._derivations])
+        self.parameters = dict(parameters)
+        self.num_evaluations = 0
+
+        self._values: Dict[str, Any] = dict()
+        # Derived values that read each value or parameter.
+        self._dependents: Dict[str, Set[str]] = dict()
+        for output, derivation in self._derivations.items():
+            for name in [*derivation.inputs, *derivation.parameters]:
+                self._dependents.setdefault(name, set()).add(output)
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return self.data.index
+
+    @property
+    def derived_names(self) -> List[str]:
+        return list(self._derivations)
+
+    def is_computed(self, name: str) -> bool:
+        return name in self._values
+
+    def is_available(self, name: str) -> bool:
+        """
+        :return: True if name is a column of the data or a derived value whose inputs are available.
+        """
+        if name in self.data.columns:
+            return True
+        if name not in self._derivations:
+            return False
+
+        return all(self.is_available(input_name) for input_name in self._derivations[name].inputs)
+
+    def _value(self, name: str) -> Any:
+        if name in self.data.columns:
+            # As the simulation, e.g., the hour of the year (int16) times 3600 would overflow.
+            return self.data[name].to_numpy(dtype=np.float64)
+        if name not in self._derivations:
+            raise KeyError(name)
+        if name in self._values:
+            return self._values[name]
+
+        derivation = self._derivations[name]
+        missing_parameters = [parameter for parameter in derivation.parameters if parameter not in self.parameters]
+        if len(missing_parameters) > 0:
+            raise ValueError(f"Parameters {missing_parameters} needed by {derivation.outputs} are not set.")
+
+        inputs = {input_name: self._value(input_name) for input_name in derivation.inputs}
+        outputs = derivation.function(inputs,
+                                      {parameter: self.parameters[parameter] for parameter in derivation.parameters},
+                                      self.index)
+        self.num_evaluations += 1
+        for output in derivation.outputs:
+            self._values[output] = outputs[output]
+
+        return self._values[name]
+
+    def __getitem__(self, name: str) -> Any:
+        """
+        :return: A Series with the hourly values of a column, or the value of a derived scalar (e.g., Tg_und).
+        """
+        if name in self.data.columns:
+            return self.data[name]
+
+        value = self._value(name)
+        if np.ndim(value) == 0:
+            return value
+
+        return pd.Series(value, index=self.index, name=name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.data.columns or name in self._derivations
+
+    def invalidate(self, names: Iterable[str]) -> List[str]:
+        """
+        Discards the computed values that depend on the given values or parameters, directly or transitively.
+
+        :return: The names of the discarded values.
+        """
+        pending = list(names)
+        invalidated: Set[str] = set()
+        while len(pending) > 0:
+            for dependent in self._dependents.get(pending.pop(), ()):
+                if dependent not in invalidated:
+                    invalidated.add(dependent)
+                    pending.append(dependent)
+
+        discarded = [name for name in invalidated if name in self._values]
+        for name in discarded:
+            del self._values[name]
+
+        return discarded
+
+    def set_parameters(self, **parameters) -> List[str]:
+        """
+        Changes some parameters and invalidates the values that depend on the ones that changed.
+
+        :return: The names of the discarded values.
+        """
+        changed = [name for name, value in parameters.items()
+                   if name not in self.parameters or not _same_value(self.parameters[name], value)]
+        self.parameters.update(parameters)
+        return self.invalidate(changed)
+
+    def set_column(self, name: str, values: Any) -> List[str]:
+        """
+        Replaces (or adds) a column of the data, e.g., the air temperature of a what-if scenario, and invalidates the
+        values that depend on it.
+
+        :return: The names of the discarded values.
+        """
+        if name in self._derivations:
+            raise ValueError(f"Column '{name}' is derived, change its inputs or parameters instead.")
+
+        self.data = self.data.assign(**{name: values})
+        return self.invalidate([name])
+
+    def to_frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        :param columns: Columns to include, computing the derived ones if needed. None includes the columns of the
+        data and every available derived column.
+        :return: A DataFrame with the requested hourly columns.
+        """
+        if columns is None:
+            columns = [*self.data.columns,
+                       *[name for name in self._derivations
+                         if name not in AMBIENT_FIT_SCALARS and self.is_available(name)]]
+
+        result = pd.DataFrame(index=self.index)
+        for column in columns:
+            result[column] = self.data[column] if column in self.data.columns else self._value(column)
+
+        return result
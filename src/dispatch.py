@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+from src.functions import ArrayLike
+
+
+# Average heat loss of pre-insulated pipes along a network of 2km [MW/K]
+PIPES_HEAT_LOSS_COEFFICIENT: float = 13.9 / 1000
+
+HEAT_SUPPLY_COLUMNS = ["heat_source1", "heat_source2", "heat_aquifer", "heat_aux_heater", "cool_aux"]
+
+DISPATCH_COLUMNS = ["source1_temp", "source2_temp", "net_temp", "COP", "EER_cool", "E_loss_s", "E_loss_r",
+                    "E_loss_tot", "Q_evap", "Q_cond", "Q_net", "source1_cap", "source2_cap", "ground_source_cap",
+                    *HEAT_SUPPLY_COLUMNS, "E_el_chiller", "Q_cool_tower"]
+
+
+def calculate_tnet(temp_s1: ArrayLike, temp_s2: ArrayLike, temp_aq: ArrayLike) -> np.ndarray:
+    """
+    The network takes the lowest temperature among the sources that are working. If none of them is, then it takes
+    the aquifer temperature.
+    """
+    temp_s1 = np.asarray(temp_s1)
+    temp_s2 = np.asarray(temp_s2)
+    temp_aq = np.asarray(temp_aq)
+
+    return np.where((temp_s1 == 0.0) & (temp_s2 == 0.0),
+                    temp_aq,
+                    np.where(temp_s1 == 0.0,
+                             temp_s2,
+                             np.where(temp_s2 == 0.0,
+                                      temp_s1,
+                                      np.minimum(temp_s1, temp_s2))))
+
+
+def calculate_cop(user_temp: ArrayLike, net_temp: ArrayLike, DT_evap: float, DT_hx: float = 2.5,
+                  n_HP: float = 0.49) -> np.ndarray:
+    Tc_heat = np.asarray(user_temp) + DT_hx  # Heating temperature level required on the building side
+    Te_heat = np.asarray(net_temp) - DT_evap - DT_hx
+
+    return n_HP * (Tc_heat + 273.15) / (Tc_heat - Te_heat) - n_HP + 1
+
+
+def calculate_eer_cool(net_temp: ArrayLike, DT_hx: float = 2.5, n_HP: float = 0.49, Te_o_cool: float = 10,
+                       DT_cond: float = 10) -> np.ndarray:
+    Te_cool = Te_o_cool - DT_hx  # Cooling temperature level required on the building side
+    Tc_cool = np.asarray(net_temp) + DT_cond + DT_hx
+
+    return (1 - n_HP + n_HP * (Tc_cool + 273.15) / (Tc_cool - Te_cool)) - 1
+
+
+def heat_losses(T_net: ArrayLike, T_gr: ArrayLike, DT_evap: float,
+                U: float = PIPES_HEAT_LOSS_COEFFICIENT) -> pd.DataFrame:
+    T_net = np.asarray(T_net)
+    T_gr = np.asarray(T_gr)
+
+    T_ret = T_net - DT_evap
+    HL_s = (T_net - T_gr) * U  # Heat losses supply pipe [MW]
+    HL_r = (T_ret - T_gr) * U  # Heat losses return pipe [MW]
+
+    return pd.DataFrame({"E_loss_s": HL_s, "E_loss_r": HL_r, "E_loss_tot": HL_s + HL_r})
+
+
+def calculate_heatsupply(source1_cap: ArrayLike,
+                         source2_cap: ArrayLike,
+                         ground_source_cap: ArrayLike,
+                         source1_temp: ArrayLike,
+                         source2_temp: ArrayLike,
+                         Q_net: ArrayLike) -> pd.DataFrame:
+    """
+    Splits the network load among the sources following their merit order. In heating mode, the working waste heat
+    source with the highest temperature provides heat until its max capacity is reached, then the other waste heat
+    source, then the aquifer, and the auxiliary heater covers the remaining load. In cooling mode, the aquifer
+    absorbs the load until its capacity is reached and the auxiliary cooling system rejects the rest.
+    """
+    source1_cap = np.asarray(source1_cap)
+    source2_cap = np.asarray(source2_cap)
+    ground_source_cap = np.broadcast_to(np.asarray(ground_source_cap), np.shape(Q_net))
+    source1_temp = np.asarray(source1_temp)
+    source2_temp = np.asarray(source2_temp)
+    Q_net = np.asarray(Q_net)
+
+    # If only one waste heat source is working, it goes first. If both are, then the one with the highest
+    # temperature goes first, source 2 on ties.
+    source1_first = (source1_cap != 0.0) & ((source2_cap == 0.0) | (source1_temp > source2_temp))
+    first_cap = np.where(source1_first, source1_cap, source2_cap)
+    second_cap = np.where(source1_first, source2_cap, source1_cap)
+    waste_heat_cap = first_cap + second_cap
+    total_cap = waste_heat_cap + ground_source_cap
+
+    heat_first = np.where(Q_net <= first_cap, Q_net, first_cap)
+    heat_second = np.where(Q_net <= first_cap,
+                           0.0,
+                           np.where(Q_net <= waste_heat_cap, Q_net - first_cap, second_cap))
+    heat_aquifer_heating = np.where(Q_net <= waste_heat_cap,
+                                    0.0,
+                                    np.where(Q_net <= total_cap, Q_net - waste_heat_cap, ground_source_cap))
+    heat_aux_heater = np.where(Q_net <= total_cap, 0.0, Q_net - total_cap)
+
+    # The aquifer absorbs the load while it can, the cooling auxiliary system rejects the excess energy that the
+    # ground can't hold.
+    ground_absorbs_load = -Q_net <= ground_source_cap
+    heat_aquifer_cooling = np.where(ground_absorbs_load, Q_net, -ground_source_cap)
+    cool_aux = np.where(ground_absorbs_load, 0.0, -Q_net - ground_source_cap)
+
+    heating = Q_net > 0
+    return pd.DataFrame({"heat_source1": np.where(heating, np.where(source1_first, heat_first, heat_second), 0.0),
+                         "heat_source2": np.where(heating, np.where(source1_first, heat_second, heat_first), 0.0),
+                         "heat_aquifer": np.where(heating, heat_aquifer_heating, heat_aquifer_cooling),
+                         "heat_aux_heater": np.where(heating, heat_aux_heater, 0.0),
+                         "cool_aux": np.where(heating, 0.0, cool_aux)})
+
+
+def calculate_chiller_el(air_temp: ArrayLike, net_temp: ArrayLike, cool_aux: ArrayLike) -> np.ndarray:
+    # Electricity consumed by the chiller when ambient temperature is above network temperature
+    return np.where(np.asarray(air_temp) + 5 >= np.asarray(net_temp), np.asarray(cool_aux) / 10, 0)
+
+
+def calculate_cooltower(air_temp: ArrayLike, net_temp: ArrayLike, cool_aux: ArrayLike,
+                        E_el_chiller: ArrayLike) -> np.ndarray:
+    cool_aux = np.asarray(cool_aux)
+
+    # The cooling tower operates alone (without central chiller) when the ambient temperature is low enough.
+    return np.where(np.asarray(air_temp) + 5 <= np.asarray(net_temp),
+                    cool_aux,
+                    cool_aux + np.asarray(E_el_chiller))
+
+
+def simulate_dispatch(dataset: pd.DataFrame,
+                      s1_schedule: np.ndarray,
+                      s2_schedule: np.ndarray,
+                      Ts1: float,
+                      Ts2: float,
+                      cap_source1: float,
+                      cap_source2: float,
+                      cap_ground: float,
+                      DT_evap: float,
+                      DT_hx: float = 2.5,
+                      n_HP: float = 0.49,
+                      Te_o_cool: float = 10,
+                      DT_cond: float = 10) -> pd.DataFrame:
+    """
+    Simulates the hourly operation of the network for the whole dataset at once. The results are the same as
+    applying the per-hour functions of the processing notebook row by row.
+
+    :param dataset: Hourly data indexed by timestamp with the air_temp, user_temp, ground_temp, aquifer_temp,
+    Thermal_consumption and SC_consumption columns.
+    :param s1_schedule: A boolean matrix of 24 x 7 with the working hours of source 1.
+    :param s2_schedule: A boolean matrix of 24 x 7 with the working hours of source 2.
+    :return: A DataFrame with the same index as dataset and the DISPATCH_COLUMNS columns.
+    """
+    hours = dataset.index.hour
+    dayofweeks = dataset.index.dayofweek
+
+    result = pd.DataFrame(index=dataset.index)
+    result["source1_temp"] = Ts1 * np.asarray(s1_schedule)[hours, dayofweeks]
+    result["source2_temp"] = Ts2 * np.asarray(s2_schedule)[hours, dayofweeks]
+    result["net_temp"] = calculate_tnet(result.source1_temp, result.source2_temp, dataset.aquifer_temp)
+
+    result["COP"] = calculate_cop(dataset.user_temp, result.net_temp, DT_evap, DT_hx=DT_hx, n_HP=n_HP)
+    result["EER_cool"] = calculate_eer_cool(result.net_temp, DT_hx=DT_hx, n_HP=n_HP, Te_o_cool=Te_o_cool,
+                                            DT_cond=DT_cond)
+
+    losses = heat_losses(result.net_temp, dataset.ground_temp, DT_evap)
+    for column in losses.columns:
+        result[column] = losses[column].to_numpy()
+
+    result["Q_evap"] = dataset.Thermal_consumption * (1 - 1 / result.COP)
+    result["Q_cond"] = dataset.SC_consumption * (1 + 1 / result.EER_cool)
+    result["Q_net"] = result.Q_evap + result.E_loss_tot - result.Q_cond
+
+    # Values in MW to match the thermal demand calculations
+    result["source1_cap"] = cap_source1 * np.asarray(s1_schedule)[hours, dayofweeks]
+    result["source2_cap"] = cap_source2 * np.asarray(s2_schedule)[hours, dayofweeks]
+    result["ground_source_cap"] = cap_ground
+
+    heat_supply = calculate_heatsupply(result.source1_cap, result.source2_cap, result.ground_source_cap,
+                                       result.source1_temp, result.source2_temp, result.Q_net)
+    for column in HEAT_SUPPLY_COLUMNS:
+        result[column] = heat_supply[column].to_numpy()
+
+    result["E_el_chiller"] = calculate_chiller_el(dataset.air_temp, result.net_temp, result.cool_aux)
+    result["Q_cool_tower"] = calculate_cooltower(dataset.air_temp, result.net_temp, result.cool_aux,
+                                                 result.E_el_chiller)
+
+    return result
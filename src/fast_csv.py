@@ -0,0 +1,108 @@
+import warnings
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv
+
+
+CSV_ENGINES = ("pandas", "pyarrow")
+
+_CSV_BLOCK_SIZE = 1 << 24
+
+
+def _skip_invalid_row(row) -> str:
+    warnings.warn(f"Skipping line {row.number}: expected {row.expected_columns} fields, saw {row.actual_columns}.")
+    return "skip"
+
+
+def read_csv_columns(path: str,
+                     column_names: List[str],
+                     columns: List[str],
+                     column_types: Optional[Dict[str, pa.DataType]] = None,
+                     skip_rows: int = 1,
+                     skip_invalid_rows: bool = False) -> pd.DataFrame:
+    """
+    Reads a CSV file with the multithreaded pyarrow reader. Only the requested columns are converted, the rest of the
+    fields are tokenized but never materialized. String columns should be read as dictionaries, so repeated values
+    (like station ids or timestamps) are stored once and arrive to pandas as categoricals.
+
+    :param path: Path of the CSV file.
+    :param column_names: Names of all the columns of the file, in order.
+    :param columns: Names of the columns to read.
+    :param column_types: A dictionary with the arrow types of the columns, the rest of the types are inferred.
+    :param skip_rows: Number of rows to skip at the start of the file, by default the header.
+    :param skip_invalid_rows: If True, then the rows with a wrong number of fields are skipped with a warning.
+    :return: A DataFrame with the requested columns.
+    """
+    read_options = csv.ReadOptions(column_names=column_names,
+                                   skip_rows=skip_rows,
+                                   use_threads=True,
+                                   block_size=_CSV_BLOCK_SIZE)
+    parse_options = (csv.ParseOptions(invalid_row_handler=_skip_invalid_row)
+                     if skip_invalid_rows
+                     else csv.ParseOptions())
+    convert_options = csv.ConvertOptions(include_columns=columns,
+                                         column_types=column_types or dict())
+
+    table = csv.read_csv(path,
+                         read_options=read_options,
+                         parse_options=parse_options,
+                         convert_options=convert_options)
+
+    return table.to_pandas()
+
+
+def parse_timestamps(values: pd.Series, timestamp_format: Optional[str] = None,
+                     year: Optional[int] = None) -> pd.DatetimeIndex:
+    """
+    Parses timestamps that repeat many times (e.g., the same hours for different stations). Each distinct value is
+    parsed once and the results are broadcast back to the rows, so the parse time grows with the number of distinct
+    timestamps instead of the number of rows.
+
+    :param values: Timestamps as strings, either as a categorical or as an object Series.
+    :param timestamp_format: strftime format of the values. If None, then the format is inferred.
+    :param year: If given, then the timestamps are moved to this year. Meant for values without year (e.g.,
+    "%m-%dT%H:%M:%S"), the year is prepended before parsing so leap days are handled.
+    :return: A DatetimeIndex with the parsed timestamps.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        uniques = pd.Index(values.cat.categories.astype(str))
+    else:
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Index(uniques.astype(str))
+
+    # Empty or all missing values, there is nothing to parse.
+    if len(uniques) == 0:
+        return pd.DatetimeIndex(np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[ns]"))
+
+    if year is not None:
+        uniques = f"{year:04d}-" + uniques
+        timestamp_format = None if timestamp_format is None else f"%Y-{timestamp_format}"
+
+    if timestamp_format is None:
+        parsed = pd.to_datetime(uniques, errors="raise")
+    else:
+        parsed = pd.to_datetime(uniques, errors="raise", format=timestamp_format)
+
+    # Missing values have code -1, they become NaT.
+    timestamps = parsed.to_numpy()[codes]
+    timestamps[codes < 0] = np.datetime64("NaT")
+    return pd.DatetimeIndex(timestamps)
+
+
+def split_by_key(data: pd.DataFrame, column: str, keys: Sequence[Hashable]) -> Dict[Hashable, pd.DataFrame]:
+    """
+    Splits the rows of data by the values of a column in a single grouping pass, keeping the order of the rows.
+
+    :param data: DataFrame to split.
+    :param column: Name of the column with the keys.
+    :param keys: Keys of the groups to return. Keys without rows get an empty DataFrame.
+    :return: A dictionary with the rows of each key.
+    """
+    positions = data.groupby(column, sort=False, observed=True).indices
+    empty = np.empty(0, dtype=np.intp)
+
+    return {key: data.take(positions.get(key, empty)) for key in keys}
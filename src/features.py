@@ -0,0 +1,228 @@
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+HOURS_IN_DAY: int = 24
+
+
+def broadcast_city_constants(index: pd.DatetimeIndex,
+                             heat_demand: pd.DataFrame,
+                             city_key: str,
+                             dtypes: Optional[Dict[str, type]] = None) -> pd.DataFrame:
+    """
+    Broadcasts the heat demand constants of a city to every row of the hourly index. The row of the city is converted
+    to the requested dtypes first and then repeated column by column, so no repeated frames nor object columns are
+    created.
+
+    :param index: Hourly index of the city data.
+    :param heat_demand: A DataFrame with one row per city, matched by the city_key column.
+    :param city_key: Key of the city to select.
+    :param dtypes: A dictionary with the dtypes of the constant columns.
+    :return: A DataFrame indexed by index with the heat demand columns.
+    """
+    heat_demand_for_city = heat_demand[heat_demand["city_key"] == city_key]
+    if heat_demand_for_city.shape[0] != 1:
+        raise ValueError(f"Expected one heat demand row for the city '{city_key}', "
+                         f"found {heat_demand_for_city.shape[0]}.")
+
+    if dtypes is not None:
+        heat_demand_for_city = heat_demand_for_city.astype(dtypes)
+
+    return pd.DataFrame({column: np.repeat(heat_demand_for_city[column].to_numpy(), len(index))
+                         for column in heat_demand_for_city.columns},
+                        index=index)
+
+
+def broadcast_hour_of_day_profile(index: pd.DatetimeIndex,
+                                  profile: pd.Series,
+                                  dtype: type = np.float32) -> np.ndarray:
+    """
+    Looks up a daily profile by the hour of the day of each row of the index. The profile keeps the same values for
+    the same hour in different days, so the position of each value in the profile is its hour of the day.
+
+    :param index: Hourly index of the city data.
+    :param profile: A Series with 24 values, one for each hour of the day starting at midnight.
+    :param dtype: dtype of the result.
+    :return: An array with the value of the profile for each row of the index.
+    """
+    values = np.asarray(profile, dtype=dtype)
+    if values.shape[0] != HOURS_IN_DAY:
+        raise ValueError(f"Expected a profile with {HOURS_IN_DAY} hourly values, found {values.shape[0]}.")
+
+    return values[index.hour]
+
+
+def build_hourly_features(index: pd.DatetimeIndex,
+                          heat_demand: pd.DataFrame,
+                          city_key: str,
+                          heat_demand_dtypes: Dict[str, type],
+                          hour_of_day_profiles: Dict[str, pd.Series]) -> pd.DataFrame:
+    """
+    Builds the hourly features shared by the datasets: the heat demand constants of the city and the hour-of-day
+    profiles.
+
+    :param index: Hourly index of the city data.
+    :param heat_demand: A DataFrame with one row per city, matched by the city_key column.
+    :param city_key: Key of the city to select.
+    :param heat_demand_dtypes: A dictionary with the dtypes of the heat demand columns.
+    :param hour_of_day_profiles: A dictionary that maps the name of each profile column to its 24 hourly values.
+    :return: A DataFrame indexed by index with the heat demand columns followed by the profile columns.
+    """
+    features = broadcast_city_constants(index, heat_demand, city_key, dtypes=heat_demand_dtypes)
+    for column, profile in hour_of_day_profiles.items():
+        features[column] = broadcast_hour_of_day_profile(index, profile)
+
+    return features
+
+
+SEASONS = ["winter", "spring", "summer", "fall"]
+
+SEASON_DTYPE = pd.CategoricalDtype(categories=SEASONS)
+
+# Each season ends on the date of the next equinox or solstice.
+SEASON_BOUNDARY_COLUMNS = ["winter_ends", "spring_ends", "summer_ends", "fall_ends"]
+
+CALENDAR_COLUMNS = ["season", "date", "month", "dayofyear", "dayofweek", "hourofyear", "hour"]
+
+_CALENDAR_DTYPES = {"month": np.int8,
+                    "dayofyear": np.int16,
+                    "dayofweek": np.int8,
+                    "hourofyear": np.int16,
+                    "hour": np.int8}
+
+# Mean March equinox, June solstice, September equinox and December solstice (Julian ephemeris days), as polynomials
+# in millennia from 2000. Meeus, Astronomical Algorithms, table 27.B, valid from year 1000 to 3000.
+_MEAN_EQUINOX_SOLSTICE_COEFFICIENTS = np.array([[2451623.80984, 365242.37404, 0.05169, -0.00411, -0.00057],
+                                                [2451716.56767, 365241.62603, 0.00325, 0.00888, -0.00030],
+                                                [2451810.21715, 365242.01767, -0.11575, 0.00337, 0.00078],
+                                                [2451900.05952, 365242.74049, -0.06223, -0.00823, 0.00032]])
+
+# Periodic terms (A, B in degrees, C in degrees per century) of the correction, Meeus table 27.C.
+_EQUINOX_SOLSTICE_PERIODIC_TERMS = np.array([[485, 324.96, 1934.136], [203, 337.23, 32964.467],
+                                             [199, 342.08, 20.186], [182, 27.85, 445267.112],
+                                             [156, 73.14, 45036.886], [136, 171.52, 22518.443],
+                                             [77, 222.54, 65928.934], [74, 296.72, 3034.906],
+                                             [70, 243.58, 9037.513], [58, 119.81, 33718.147],
+                                             [52, 297.17, 150.678], [50, 21.02, 2281.226],
+                                             [45, 247.54, 29929.562], [44, 325.15, 31555.956],
+                                             [29, 60.93, 4443.417], [18, 155.12, 67555.328],
+                                             [17, 288.79, 4562.452], [16, 198.04, 62894.029],
+                                             [14, 199.76, 31436.921], [12, 95.39, 14577.848],
+                                             [12, 287.11, 31931.756], [12, 320.81, 34777.259],
+                                             [9, 227.73, 1222.114], [8, 15.45, 16859.074]])
+
+_UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+_MIN_SEASON_YEAR = 1000
+_MAX_SEASON_YEAR = 3000
+
+
+def equinoxes_and_solstices(years: np.ndarray) -> np.ndarray:
+    """
+    :param years: Years between 1000 and 3000.
+    :return: A (years x 4) datetime64[s] array with the instants (UTC, within a couple of minutes) of the March
+    equinox, June solstice, September equinox and December solstice of each year.
+    """
+    years = np.asarray(years, dtype=np.float64)
+    if np.any(years < _MIN_SEASON_YEAR) or np.any(years > _MAX_SEASON_YEAR):
+        raise ValueError(f"Value of 'years' is invalid. Valid values are between {_MIN_SEASON_YEAR} and "
+                         f"{_MAX_SEASON_YEAR}.")
+
+    millennia = (years[:, np.newaxis] - 2000) / 1000
+    mean_julian_days = np.polynomial.polynomial.polyval(millennia, _MEAN_EQUINOX_SOLSTICE_COEFFICIENTS.T,
+                                                        tensor=False)
+
+    centuries = (mean_julian_days - 2451545.0) / 36525
+    w = np.deg2rad(35999.373 * centuries - 2.47)
+    delta_lambda = 1 + 0.0334 * np.cos(w) + 0.0007 * np.cos(2 * w)
+    amplitudes, phases, frequencies = _EQUINOX_SOLSTICE_PERIODIC_TERMS.T
+    periodic = (amplitudes * np.cos(np.deg2rad(phases + frequencies * centuries[..., np.newaxis]))).sum(axis=-1)
+    julian_days = mean_julian_days + 0.00001 * periodic / delta_lambda
+
+    # Terrestrial time is used as UTC, they differ by about a minute.
+    seconds = np.round((julian_days - _UNIX_EPOCH_JULIAN_DAY) * 86400).astype(np.int64)
+    return seconds.astype("datetime64[s]")
+
+
+def season_boundaries(first_year: int,
+                      last_year: int,
+                      utc_offset_hours: float = 0.0,
+                      overrides: Optional[Dict[int, Sequence[str]]] = None) -> pd.DataFrame:
+    """
+    :param first_year: First year of the table.
+    :param last_year: Last year of the table (inclusive).
+    :param utc_offset_hours: Offset of the local time of the data from UTC. The boundaries are the local dates of the
+    equinoxes and solstices.
+    :param overrides: Boundaries of some years given explicitly, as the four dates of SEASON_BOUNDARY_COLUMNS.
+    :return: A DataFrame indexed by year with the SEASON_BOUNDARY_COLUMNS, the (midnight) dates on which winter,
+    spring, summer and fall end.
+    """
+    years = np.arange(first_year, last_year + 1)
+    instants = equinoxes_and_solstices(years) + np.timedelta64(int(round(utc_offset_hours * 3600)), "s")
+    boundaries = pd.DataFrame(instants.astype("datetime64[D]").astype("datetime64[ns]"),
+                              index=pd.Index(years, name="year"),
+                              columns=SEASON_BOUNDARY_COLUMNS)
+
+    for year, dates in (overrides or dict()).items():
+        if year in boundaries.index:
+            boundaries.loc[year] = pd.to_datetime(list(dates)).to_numpy()
+
+    return boundaries
+
+
+def assign_seasons(index: pd.DatetimeIndex, boundaries: pd.DataFrame) -> pd.Categorical:
+    """
+    Assigns the season of each timestamp by binary search on the boundaries of every year, flattened in order.
+    Timestamps before the first boundary (or after the last one) are in winter.
+
+    :param index: Timestamps to classify, sorted or not.
+    :param boundaries: Season boundaries of every year of the index, as returned by season_boundaries.
+    :return: A categorical with the SEASONS, one value per timestamp.
+    """
+    flat_boundaries = boundaries[SEASON_BOUNDARY_COLUMNS].to_numpy(dtype="datetime64[ns]").ravel()
+    if np.any(np.diff(flat_boundaries) <= np.timedelta64(0, "ns")):
+        raise ValueError("Value of 'boundaries' is invalid. The boundaries must increase within and across years.")
+
+    # The position after the winter end of a year is 1 (spring), ..., after its fall end, 4 = 0 (winter).
+    positions = np.searchsorted(flat_boundaries, index.to_numpy(dtype="datetime64[ns]"), side="right")
+    return pd.Categorical.from_codes((positions % len(SEASONS)).astype(np.int8), dtype=SEASON_DTYPE)
+
+
+def build_calendar_features(index: pd.DatetimeIndex,
+                            utc_offset_hours: float = 0.0,
+                            season_overrides: Optional[Dict[int, Sequence[str]]] = None) -> pd.DataFrame:
+    """
+    Builds the season and calendar columns shared by the datasets for an index spanning any number of years.
+
+    :param index: Hourly index of the city data.
+    :param utc_offset_hours: Offset of the local time of the index from UTC, see season_boundaries.
+    :param season_overrides: Season boundaries of some years given explicitly, see season_boundaries.
+    :return: A DataFrame indexed by index with the CALENDAR_COLUMNS. The season is categorical, the date is the
+    timestamp at midnight (datetime64) and the other columns are narrow integers. The hour of the year starts at 1
+    and is counted within each year.
+    """
+    features = pd.DataFrame(index=index)
+    if len(index) == 0:
+        features["season"] = pd.Categorical([], dtype=SEASON_DTYPE)
+        features["date"] = pd.Series([], index=index, dtype="datetime64[ns]")
+        for column, dtype in _CALENDAR_DTYPES.items():
+            features[column] = np.empty(0, dtype=dtype)
+        return features[CALENDAR_COLUMNS]
+
+    boundaries = season_boundaries(index.year.min(), index.year.max(),
+                                   utc_offset_hours=utc_offset_hours,
+                                   overrides=season_overrides)
+
+    dayofyear = index.dayofyear.to_numpy()
+    hour = index.hour.to_numpy()
+    features["season"] = assign_seasons(index, boundaries)
+    features["date"] = index.normalize().to_numpy()
+    features["month"] = index.month.to_numpy().astype(np.int8)
+    features["dayofyear"] = dayofyear.astype(np.int16)
+    features["dayofweek"] = index.dayofweek.to_numpy().astype(np.int8)
+    features["hourofyear"] = ((dayofyear - 1) * 24 + (hour + 1)).astype(np.int16)
+    features["hour"] = hour.astype(np.int8)
+
+    return features
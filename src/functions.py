@@ -1,41 +1,248 @@
+from typing import Optional, Sequence, Union
+
+import numpy as np
 import pandas as pd
 
 
-def fitting_curve(x):
-    T_ave_fit
-    DT_y_fit
-    T = len(h)
-    omega = 2 * pi / T
-    phi
-    return T_ave_fit + DT_y_fit * np.cos(x * omega - phi)
+SECONDS_IN_YEAR: int = 365 * 24 * 3600
+DAYS_IN_YEAR: int = 365
+
+GROUND_TEMPERATURE_MODELS = ("banks", "kusuda")
+
+SINUSOID_FIT_COLUMNS = ["disp", "amp", "phi", "t_max", "t_min", "r2", "rmse", "num_observations"]
+
+ArrayLike = Union[Sequence[float], np.ndarray, pd.Series]
+
+
+def fitting_curve(hourofyear: ArrayLike, T_ave_fit: float, DT_y_fit: float, T: int, phi: float) -> np.ndarray:
+    omega = 2 * np.pi / T
+    return T_ave_fit + DT_y_fit * np.cos(np.asarray(hourofyear, dtype=np.float64) * omega - phi)
+
+
+def fit_sinusoids(times: ArrayLike,
+                  values: ArrayLike,
+                  groups: Optional[ArrayLike] = None,
+                  period: float = DAYS_IN_YEAR) -> pd.DataFrame:
+    """
+    Fits disp + amp * cos(2 * pi / period * t - phi) to many series at once. As the period is fixed, the model is
+    linear in a constant, a cosine and a sine term, so each series is solved in closed form through its 3 x 3 normal
+    equations. The sums of the normal equations of every series are accumulated in a single pass over the data, which
+    is given in long format (one row per observation) so series of different lengths and with gaps are supported.
+
+    :param times: Time of each observation, in the same unit as the period.
+    :param values: Value of each observation. NaN values are ignored.
+    :param groups: Series of each observation (e.g., a station ID). None fits a single series.
+    :param period: Period of the sinusoid.
+    :return: A DataFrame indexed by group with the SINUSOID_FIT_COLUMNS columns. The amplitude is non-negative, the
+    phase is in [0, 2 * pi), and t_max and t_min are the times in [0, period) of the max and the min of the curve.
+    Series with less than 3 observations (or with all of them at the same phase) get NaN parameters.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if groups is None:
+        codes = np.zeros(times.shape[0], dtype=np.intp)
+        uniques = pd.Index([0])
+    else:
+        codes, uniques = pd.factorize(np.asarray(groups), sort=True)
+        uniques = pd.Index(uniques)
+
+    valid = ~np.isnan(values) & (codes >= 0)
+    codes = codes[valid]
+    times = times[valid]
+    values = values[valid]
+    num_groups = len(uniques)
+
+    def group_sum(weights: Optional[np.ndarray] = None) -> np.ndarray:
+        return np.bincount(codes, weights=weights, minlength=num_groups)
+
+    num_observations = group_sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Values are centered on their mean to keep the sums well conditioned.
+        means = group_sum(values) / num_observations
+    values = values - means[codes]
+
+    angles = 2 * np.pi / period * times
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+    sum_cos = group_sum(cos)
+    sum_sin = group_sum(sin)
+    sum_cos_sin = group_sum(cos * sin)
+    normal_matrices = np.stack([np.stack([num_observations, sum_cos, sum_sin], axis=-1),
+                                np.stack([sum_cos, group_sum(cos * cos), sum_cos_sin], axis=-1),
+                                np.stack([sum_sin, sum_cos_sin, group_sum(sin * sin)], axis=-1)], axis=1)
+    normal_values = np.stack([group_sum(values), group_sum(values * cos), group_sum(values * sin)], axis=-1)
+
+    solvable = num_observations >= 3
+    solvable[solvable] = np.linalg.matrix_rank(normal_matrices[solvable]) == 3
+    coefficients = np.full((num_groups, 3), np.nan)
+    coefficients[solvable] = np.linalg.solve(normal_matrices[solvable],
+                                             normal_values[solvable][..., np.newaxis])[..., 0]
+
+    # At the optimum, the sum of squared errors is y'y - beta'X'y.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sum_squared_errors = np.maximum(group_sum(values * values) - np.sum(coefficients * normal_values, axis=1), 0)
+        r2 = 1 - sum_squared_errors / group_sum(values * values)
+        rmse = np.sqrt(sum_squared_errors / num_observations)
+
+    amp = np.hypot(coefficients[:, 1], coefficients[:, 2])
+    phi = np.mod(np.arctan2(coefficients[:, 2], coefficients[:, 1]), 2 * np.pi)
+    t_max = phi * period / (2 * np.pi)
+
+    return pd.DataFrame({"disp": coefficients[:, 0] + means,
+                         "amp": amp,
+                         "phi": phi,
+                         "t_max": t_max,
+                         "t_min": np.mod(t_max + period / 2, period),
+                         "r2": r2,
+                         "rmse": rmse,
+                         "num_observations": num_observations.astype(np.int64)},
+                        index=uniques)
+
+
+def fit_sinusoids_frame(data: pd.DataFrame,
+                        times: Optional[ArrayLike] = None,
+                        period: Optional[float] = None) -> pd.DataFrame:
+    """
+    Fits a sinusoid to each column of data, see fit_sinusoids.
+
+    :param data: A DataFrame with one series in each column.
+    :param times: Time of each row. None uses the position of the rows (0, 1, ...), as the processing notebook does.
+    :param period: Period of the sinusoid. None uses the number of rows.
+    :return: A DataFrame indexed by the columns of data with the SINUSOID_FIT_COLUMNS columns.
+    """
+    num_rows, num_columns = data.shape
+    times = np.arange(num_rows) if times is None else np.asarray(times)
+    period = num_rows if period is None else period
+
+    fit = fit_sinusoids(np.tile(times, num_columns),
+                        data.to_numpy(dtype=np.float64).T.ravel(),
+                        groups=np.repeat(np.arange(num_columns), num_rows),
+                        period=period)
+
+    fit.index = data.columns
+    return fit
+
+
+def ground_temperature(times: ArrayLike,
+                       depths: ArrayLike,
+                       diffusivities: ArrayLike,
+                       Tg_und: float,
+                       DT_y: float,
+                       d_shift: float,
+                       period: float,
+                       model: str = "kusuda") -> np.ndarray:
+    """
+    Evaluates the Banks or Kusuda ground temperature model for every combination of time, depth and diffusivity at
+    once. The times, the day shift and the period must be given in the same unit, and the diffusivities in m^2 per
+    that unit.
+
+    :param times: Times in which the model is evaluated.
+    :param depths: Depths in meters.
+    :param diffusivities: Ground thermal diffusivities.
+    :param Tg_und: Undisturbed ground temperature.
+    :param DT_y: Amplitude of the air temperature through the year.
+    :param d_shift: Time of the max air temperature for Banks, or of the min air temperature for Kusuda.
+    :param period: Duration of a year.
+    :param model: Either "banks" or "kusuda".
+    :return: An array of shape (len(depths), len(diffusivities), len(times)).
+    """
+    if model not in GROUND_TEMPERATURE_MODELS:
+        raise ValueError(f"Value of 'model' is invalid. Valid values are {GROUND_TEMPERATURE_MODELS}.")
+
+    times = np.asarray(times, dtype=np.float64)[np.newaxis, np.newaxis, :]
+    depths = np.asarray(depths, dtype=np.float64)[:, np.newaxis, np.newaxis]
+    diffusivities = np.asarray(diffusivities, dtype=np.float64)[np.newaxis, :, np.newaxis]
+
+    damping = depths * np.sqrt(np.pi / (diffusivities * period))
+    amplitude = DT_y * np.exp(-damping)
+
+    if model == "banks":
+        # Banks + t_shift
+        return Tg_und + amplitude * np.cos(2 * np.pi / period * (times - d_shift) - damping)
+
+    # Kusuda
+    return Tg_und - amplitude * np.cos(2 * np.pi / period * (times - d_shift
+                                                             - depths / 2 * np.sqrt(period / (np.pi * diffusivities))))
+
+
+def _ground_temperature_frame(temperatures: np.ndarray,
+                              index: ArrayLike,
+                              index_name: str,
+                              depths: ArrayLike,
+                              diffusivities: ArrayLike) -> pd.DataFrame:
+    columns = pd.MultiIndex.from_product([np.asarray(depths), np.asarray(diffusivities)],
+                                         names=["depth", "diffusivity"])
+    num_times = temperatures.shape[-1]
+
+    return pd.DataFrame(temperatures.reshape(-1, num_times).T,
+                        index=pd.Index(np.asarray(index), name=index_name),
+                        columns=columns)
+
+
+def ground_temperature_day(days: ArrayLike,
+                           depths: ArrayLike,
+                           diffusivities: ArrayLike,
+                           Tg_und: float,
+                           DT_y: float,
+                           dd_min: float,
+                           dd_max: float,
+                           t_0: int = DAYS_IN_YEAR,
+                           model: str = "kusuda") -> pd.DataFrame:
+    """
+    :param days: Days of the year, from 1 to 365.
+    :param depths: Depths in meters.
+    :param diffusivities: Ground thermal diffusivities in m^2/day.
+    :return: A DataFrame indexed by day with one column for each (depth, diffusivity) pair.
+    """
+    d_shift = dd_max if model == "banks" else dd_min
+    temperatures = ground_temperature(days, depths, diffusivities, Tg_und, DT_y, d_shift, t_0, model=model)
 
-def ground_temperature_day(t):
-    # t corresponds to the number of day from 1 to 365
-    T_banks = Tg_und + DT_y * exp(-zz * sqrt(pi / (alpha * t_0))) * cos(
-        2 * pi / t_0 * (t - dd_max) - zz * sqrt(pi / (alpha * t_0)))  # Banks + t_shift
+    return _ground_temperature_frame(temperatures, days, "dayofyear", depths, diffusivities)
 
-    T_kusuda = Tg_und - DT_y * exp(-zz * sqrt(pi / (alpha * t_0))) * cos(
-        2 * pi / t_0 * (t - dd_min - zz / 2 * sqrt(t_0 / (pi * alpha))))  # Kusuda
 
-    # return  (pd.Series({'T_banks': T_banks,'T_kusuda': T_kusuda,'T_banks_noshift:': T_banks_noshift}))
-    return (pd.Series({'T_banks': T_banks, 'T_kusuda': T_kusuda}))
+def ground_temperature_month(months: ArrayLike,
+                             depths: ArrayLike,
+                             diffusivities: ArrayLike,
+                             Tg_und: float,
+                             DT_y: float,
+                             dd_min: float,
+                             dd_max: float,
+                             t_0: int = DAYS_IN_YEAR,
+                             model: str = "kusuda") -> pd.DataFrame:
+    """
+    The model is evaluated in the middle day of each month, assuming months of 30 days.
 
+    :param months: Months of the year, from 1 to 12.
+    :param depths: Depths in meters.
+    :param diffusivities: Ground thermal diffusivities in m^2/day.
+    :return: A DataFrame indexed by month with one column for each (depth, diffusivity) pair.
+    """
+    days = 15 + (np.asarray(months, dtype=np.float64) - 1) * 30
+    d_shift = dd_max if model == "banks" else dd_min
+    temperatures = ground_temperature(days, depths, diffusivities, Tg_und, DT_y, d_shift, t_0, model=model)
 
-def ground_temperature_month(month):
-    # t corresponds to the number of month from 1 to 12
-    T_banks = Tg_und + DT_y * exp(-zz * sqrt(pi / (alpha * t_0))) * cos(
-        2 * pi / t_0 * (15 + (month - 1) * 30 - dd_max) - zz * sqrt(pi / (alpha * t_0)))  # Banks + t_shift
+    return _ground_temperature_frame(temperatures, months, "month", depths, diffusivities)
 
-    T_kusuda = Tg_und - DT_y * exp(-zz * sqrt(pi / (alpha * t_0))) * cos(
-        2 * pi / t_0 * (15 + (month - 1) * 30 - dd_min - zz / 2 * sqrt(t_0 / (pi * alpha))))  # Kusuda ->Selva's
-    return (pd.Series({'T_banks': T_banks, 'T_kusuda': T_kusuda}))
 
+def ground_temperature_hour(hours: ArrayLike,
+                            depths: ArrayLike,
+                            diffusivities: ArrayLike,
+                            Tg_und: float,
+                            DT_y: float,
+                            dd_min: float,
+                            dd_max: float,
+                            t_sec: int = SECONDS_IN_YEAR,
+                            model: str = "kusuda") -> pd.DataFrame:
+    """
+    The hours are converted to seconds before evaluating the model.
 
-def ground_temperature_hour(t):
-    # t is time in hours, but the calculation is done is seconds
-    T_banks = Tg_und + DT_y * exp(-zz * sqrt(pi / (alpha_sec * t_sec))) * cos(
-        2 * pi / t_sec * (t - dd_max * 24) * 3600 - zz * sqrt(pi / (alpha_sec * t_sec)))  # Banks + t_shift ->Marco's
+    :param hours: Hours of the year, from 1 to 8760.
+    :param depths: Depths in meters.
+    :param diffusivities: Ground thermal diffusivities in m^2/s.
+    :return: A DataFrame indexed by hour with one column for each (depth, diffusivity) pair.
+    """
+    seconds = np.asarray(hours, dtype=np.float64) * 3600
+    d_shift = (dd_max if model == "banks" else dd_min) * 24 * 3600
+    temperatures = ground_temperature(seconds, depths, diffusivities, Tg_und, DT_y, d_shift, t_sec, model=model)
 
-    T_kusuda = Tg_und - DT_y * exp(-zz * sqrt(pi / (alpha_sec * t_sec))) * cos(
-        2 * pi / t_sec * ((t - dd_min * 24) * 3600 - zz / 2 * sqrt(t_sec / (pi * alpha_sec))))  # Kusuda
-    return (pd.Series({'T_banks': T_banks, 'T_kusuda': T_kusuda}))
+    return _ground_temperature_frame(temperatures, hours, "hourofyear", depths, diffusivities)
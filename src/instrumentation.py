@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+STAGE_RECORD_COLUMNS = ["dataset", "stage", "key", "wall_time_s", "num_rows", "allocated_bytes", "peak_bytes"]
+
+# Called with the number of items processed, the total number of items and the last processed item.
+ProgressHook = Callable[[int, int, str], None]
+
+
+class StageRecord(object):
+    """
+    Measurements of one execution of a stage. The number of rows is set by the stage itself, once it knows them.
+    """
+
+    def __init__(self, dataset: str, stage: str, key: Optional[str] = None):
+        self.dataset = dataset
+        self.stage = stage
+        self.key = key
+        self.wall_time_s: float = 0.0
+        self.num_rows: Optional[int] = None
+        self.allocated_bytes: Optional[int] = None
+        self.peak_bytes: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {column: getattr(self, column) for column in STAGE_RECORD_COLUMNS}
+
+
+class LoaderStats(object):
+    """
+    Opt-in instrumentation of the stages of a dataset loader. While disabled (the default), the stages are not
+    measured and cost a function call. Once enabled, each stage records its wall time, the rows it processed and,
+    if trace_memory is True, the memory it allocated according to tracemalloc.
+
+    The allocated bytes are the traced memory still held at the end of the stage (e.g., the frame it built). The peak
+    bytes are the highest traced memory during the stage above its start, only available on Python 3.9 or newer.
+    Memory tracing is process-wide and slows the allocations down, so the memory of stages that run concurrently
+    (e.g., cities loaded by several threads) is mixed.
+    """
+
+    def __init__(self, dataset: str):
+        """
+
+        :param dataset: Name of the dataset, included in the records and the log messages.
+        """
+        self.dataset = dataset
+        self.enabled = False
+        self.log_level: Optional[int] = None
+        self.trace_memory = False
+
+        self.records: List[StageRecord] = []
+        self._lock = threading.Lock()
+
+    def enable(self, log_level: Optional[int] = logging.INFO, trace_memory: bool = False):
+        """
+
+        :param log_level: Level of the log message emitted after each stage through the src.instrumentation logger.
+        None records the stages without logging them.
+        :param trace_memory: If True, then the memory allocated by each stage is measured. Starts tracemalloc if it
+        is not tracing already.
+        """
+        self.enabled = True
+        self.log_level = log_level
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+
+    @contextmanager
+    def stage(self, stage: str, key: Optional[str] = None, num_rows: Optional[int] = None) -> Iterator[StageRecord]:
+        """
+        Measures the code inside the with block:
+
+            with self.stats.stage("read_csv") as record:
+                data = pd.read_csv(...)
+                record.num_rows = data.shape[0]
+
+        :param stage: Name of the stage.
+        :param key: Key of the city or station processed by the stage, if any.
+        :param num_rows: Number of rows processed, if known beforehand.
+        :return: The record of the stage, filled when the block ends.
+        """
+        record = StageRecord(self.dataset, stage, key)
+        record.num_rows = num_rows
+        if not self.enabled:
+            yield record
+            return
+
+        trace_memory = self.trace_memory and tracemalloc.is_tracing()
+        if trace_memory:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            start_memory, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+
+        yield record
+
+        record.wall_time_s = time.perf_counter() - start
+        if trace_memory:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            record.allocated_bytes = current_memory - start_memory
+            if hasattr(tracemalloc, "reset_peak"):
+                record.peak_bytes = peak_memory - start_memory
+
+        with self._lock:
+            self.records.append(record)
+
+        if self.log_level is not None:
+            logger.log(self.log_level,
+                       "%s %s%s: %.3f s, %s rows%s",
+                       self.dataset,
+                       stage,
+                       "" if key is None else f" [{key}]",
+                       record.wall_time_s,
+                       "-" if record.num_rows is None else record.num_rows,
+                       "" if record.allocated_bytes is None else f", {record.allocated_bytes / 2 ** 20:.1f} MiB")
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: A DataFrame with one row per executed stage, in execution order.
+        """
+        with self._lock:
+            return pd.DataFrame([record.to_dict() for record in self.records], columns=STAGE_RECORD_COLUMNS)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        :return: A DataFrame indexed by stage with the number of executions, the total and max wall time, the total
+        rows and the total allocated and max peak bytes, sorted by total wall time.
+        """
+        records = self.to_frame().astype({"num_rows": np.float64,
+                                          "allocated_bytes": np.float64,
+                                          "peak_bytes": np.float64})
+        stages = records.groupby("stage", sort=False)
+        summary = stages.agg(calls=("wall_time_s", "size"),
+                             wall_time_s=("wall_time_s", "sum"),
+                             max_wall_time_s=("wall_time_s", "max"),
+                             peak_bytes=("peak_bytes", "max"))
+        # Stages that never reported rows or memory keep NaN instead of 0.
+        summary.insert(3, "num_rows", stages["num_rows"].sum(min_count=1))
+        summary.insert(4, "allocated_bytes", stages["allocated_bytes"].sum(min_count=1))
+        return summary.sort_values("wall_time_s", ascending=False)
+
+
+def rate_limited_progress(description: str,
+                          min_interval_s: float = 5.0,
+                          log_level: int = logging.INFO) -> ProgressHook:
+    """
+    :param description: Text that prefixes the progress messages.
+    :param min_interval_s: Minimum number of seconds between two messages. The message of the last item is always
+    emitted.
+    :param log_level: Level of the messages, emitted through the src.instrumentation logger.
+    :return: A progress hook that logs how many items were processed, at most once every min_interval_s seconds.
+    """
+    last_message_time = [float("-inf")]
+    start = time.perf_counter()
+
+    def progress(num_processed: int, num_items: int, item: str):
+        now = time.perf_counter()
+        if num_processed < num_items and now - last_message_time[0] < min_interval_s:
+            return
+
+        last_message_time[0] = now
+        logger.log(log_level, "%s: %d/%d (%.0f%%) in %.1f s, last %s", description, num_processed, num_items,
+                   100 * num_processed / max(num_items, 1), now - start, item)
+
+    return progress
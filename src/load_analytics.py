@@ -0,0 +1,244 @@
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.functions import ArrayLike
+
+
+DURATION_STATISTICS_COLUMNS = ["peak", "peak_position", "minimum", "mean", "total", "load_factor", "num_hours"]
+
+SIGNATURE_FIT_STATISTICS = ["slope", "intercept", "r_value", "std_err", "num_observations"]
+
+SIGNATURE_BRANCHES = ("heating", "cooling")
+
+
+def series_matrix(data: Dict[str, pd.DataFrame], column: str) -> pd.DataFrame:
+    """
+    Stacks a column of the hourly data of several cities into a (cities x hours) matrix, the input of the kernels of
+    this module. Shorter series (e.g., non-leap years) are padded with NaN at the end.
+
+    :param data: A dictionary with the hourly data of each city.
+    :param column: Column to stack, e.g., Total_consumption or air_temp.
+    :return: A DataFrame indexed by city with one column per hour of the series.
+    """
+    num_hours = max((len(city_data) for city_data in data.values()), default=0)
+    matrix = np.full((len(data), num_hours), np.nan)
+    for row, city_data in enumerate(data.values()):
+        matrix[row, :len(city_data)] = city_data[column].to_numpy(dtype=np.float64)
+
+    return pd.DataFrame(matrix, index=pd.Index(list(data), name="city_key"))
+
+
+def load_duration_curves(loads: ArrayLike) -> np.ndarray:
+    """
+    :param loads: A (series x hours) matrix of loads.
+    :return: The loads of each series sorted in descending order, NaN values last.
+    """
+    loads = np.asarray(loads, dtype=np.float64)
+    return -np.sort(-loads, axis=-1)
+
+
+def normalize_curves(curves: ArrayLike, peaks: Optional[ArrayLike] = None) -> np.ndarray:
+    """
+    :param curves: A (series x hours) matrix, e.g., load duration curves.
+    :param peaks: Reference value of each series (or a single value for all of them, e.g., the peak across cities).
+    None uses the maximum of each series.
+    :return: The curves in percentage of their reference value.
+    """
+    curves = np.asarray(curves, dtype=np.float64)
+    peaks = np.nanmax(curves, axis=-1, keepdims=True) if peaks is None else np.asarray(peaks, dtype=np.float64)
+    if peaks.ndim == 1:
+        peaks = peaks[:, np.newaxis]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return curves * 100 / peaks
+
+
+def duration_axis(num_hours: int, normalized: bool = False) -> np.ndarray:
+    """
+    :param num_hours: Number of hours of the curves.
+    :param normalized: If True, then the hours are returned in percentage of num_hours.
+    :return: The hours 1, ..., num_hours of a duration curve.
+    """
+    hours = np.arange(1, num_hours + 1, dtype=np.float64)
+    return hours * 100 / num_hours if normalized else hours
+
+
+def duration_statistics(loads: ArrayLike,
+                        percentiles: Sequence[float] = (50, 90, 95, 99),
+                        index: Optional[Sequence] = None) -> pd.DataFrame:
+    """
+    :param loads: A (series x hours) matrix of loads, NaN values are ignored.
+    :param percentiles: Percentiles of the loads to compute, between 0 and 100.
+    :param index: Keys of the series, used as the index of the result.
+    :return: A DataFrame with one row per series, with the DURATION_STATISTICS_COLUMNS and one p<q> column per
+    percentile. The peak position is the hour (0-based) of the peak in the original series. The load factor is the
+    ratio between the mean and the peak load.
+    """
+    loads = np.atleast_2d(np.asarray(loads, dtype=np.float64))
+    valid = ~np.isnan(loads)
+    num_hours = valid.sum(axis=1)
+    has_values = num_hours > 0
+
+    peaks = np.max(np.where(valid, loads, -np.inf), axis=1)
+    statistics = {"peak": np.where(has_values, peaks, np.nan),
+                  "peak_position": np.where(has_values, np.argmax(np.where(valid, loads, -np.inf), axis=1), -1),
+                  "minimum": np.where(has_values, np.min(np.where(valid, loads, np.inf), axis=1), np.nan),
+                  "total": np.where(valid, loads, 0).sum(axis=1),
+                  "num_hours": num_hours}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        statistics["mean"] = np.where(has_values, statistics["total"] / num_hours, np.nan)
+        statistics["load_factor"] = statistics["mean"] / statistics["peak"]
+
+    result = pd.DataFrame(statistics, index=index)[DURATION_STATISTICS_COLUMNS]
+    if len(percentiles) > 0:
+        values = np.full((len(percentiles), loads.shape[0]), np.nan)
+        if has_values.any():
+            values[:, has_values] = np.nanpercentile(loads[has_values], percentiles, axis=1)
+        for percentile, percentile_values in zip(percentiles, values):
+            result[f"p{percentile:g}"] = percentile_values
+
+    return result
+
+
+def peak_table(loads: ArrayLike, num_peaks: int = 10, index: Optional[Sequence] = None) -> pd.DataFrame:
+    """
+    :param loads: A (series x hours) matrix of loads, NaN values are ignored.
+    :param num_peaks: Number of peaks of each series to return.
+    :param index: Keys of the series.
+    :return: A DataFrame with the rank, the position (hour, 0-based) and the load of the num_peaks highest loads of
+    each series, from highest to lowest. The index is (series, rank).
+    """
+    loads = np.atleast_2d(np.asarray(loads, dtype=np.float64))
+    num_peaks = min(num_peaks, loads.shape[1])
+    filled = np.where(np.isnan(loads), -np.inf, loads)
+
+    # Selects the peaks without sorting the whole series, then sorts only them.
+    candidates = np.argpartition(-filled, num_peaks - 1, axis=1)[:, :num_peaks]
+    order = np.argsort(-np.take_along_axis(filled, candidates, axis=1), axis=1, kind="stable")
+    positions = np.take_along_axis(candidates, order, axis=1)
+    values = np.take_along_axis(loads, positions, axis=1)
+
+    index = pd.RangeIndex(loads.shape[0]) if index is None else pd.Index(index)
+    return pd.DataFrame({"position": positions.ravel(), "load": values.ravel()},
+                        index=pd.MultiIndex.from_product([index, np.arange(1, num_peaks + 1)],
+                                                         names=[index.name or "series", "rank"]))
+
+
+def _branch_mask(temperatures: np.ndarray, branch: str, base_temperature: ArrayLike) -> np.ndarray:
+    """
+    :return: True for the hours at or below (heating) or at or above (cooling) the base temperature of each series.
+    """
+    base_temperature = np.asarray(base_temperature, dtype=np.float64).reshape(-1, 1)
+    if branch == "heating":
+        return temperatures <= base_temperature
+    return temperatures >= base_temperature
+
+
+def _fit_lines(x: np.ndarray, y: np.ndarray, mask: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Fits one least-squares line per row, using only the points where mask is True. Matches scipy.stats.linregress
+    (slope, intercept, r_value and the standard error of the slope).
+    """
+    num_observations = mask.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = np.where(mask, x, 0).sum(axis=1) / num_observations
+        mean_y = np.where(mask, y, 0).sum(axis=1) / num_observations
+        dx = np.where(mask, x - mean_x[:, np.newaxis], 0)
+        dy = np.where(mask, y - mean_y[:, np.newaxis], 0)
+        ss_x = (dx * dx).sum(axis=1)
+        ss_y = (dy * dy).sum(axis=1)
+        ss_xy = (dx * dy).sum(axis=1)
+
+        slope = ss_xy / ss_x
+        intercept = mean_y - slope * mean_x
+        r_value = np.clip(ss_xy / np.sqrt(ss_x * ss_y), -1, 1)
+        std_err = np.sqrt((1 - r_value ** 2) * ss_y / ss_x / (num_observations - 2))
+
+    return {"slope": slope,
+            "intercept": intercept,
+            "r_value": r_value,
+            "std_err": np.where(num_observations > 2, std_err, np.nan),
+            "num_observations": num_observations}
+
+
+def fit_heat_power_signatures(temperatures: ArrayLike,
+                              loads: ArrayLike,
+                              heating_base_temperature: ArrayLike,
+                              cooling_base_temperature: Optional[ArrayLike] = None,
+                              index: Optional[Sequence] = None) -> pd.DataFrame:
+    """
+    Fits piecewise linear power signatures (load as a function of the outdoor temperature) of many series at once:
+    a heating line over the hours at or below the heating base temperature and, optionally, a cooling line over the
+    hours at or above the cooling base temperature. Each line is the linregress fit that the processing notebook
+    computes on the records with heat degree days, e.g., heating_slope and heating_intercept give
+    Total_consumption_fit.
+
+    :param temperatures: A (series x hours) matrix of outdoor temperatures.
+    :param loads: A (series x hours) matrix of loads. Hours where either value is NaN are ignored.
+    :param heating_base_temperature: Base temperature of the heating branch, a single value or one per series.
+    :param cooling_base_temperature: Base temperature of the cooling branch, a single value or one per series. None
+    fits only the heating branch.
+    :param index: Keys of the series.
+    :return: A DataFrame with one row per series and <branch>_<statistic> columns, see SIGNATURE_FIT_STATISTICS.
+    Branches without at least two distinct temperatures get NaN.
+    """
+    temperatures = np.atleast_2d(np.asarray(temperatures, dtype=np.float64))
+    loads = np.atleast_2d(np.asarray(loads, dtype=np.float64))
+    if temperatures.shape != loads.shape:
+        raise ValueError(f"Shapes {temperatures.shape} and {loads.shape} of temperatures and loads must be equal.")
+
+    valid = ~np.isnan(temperatures) & ~np.isnan(loads)
+    base_temperatures = {"heating": heating_base_temperature, "cooling": cooling_base_temperature}
+
+    columns = dict()
+    for branch in SIGNATURE_BRANCHES:
+        if base_temperatures[branch] is None:
+            continue
+        fit = _fit_lines(temperatures, loads, valid & _branch_mask(temperatures, branch, base_temperatures[branch]))
+        columns.update({f"{branch}_{statistic}": fit[statistic] for statistic in SIGNATURE_FIT_STATISTICS})
+
+    return pd.DataFrame(columns, index=index)
+
+
+def heat_power_signature(temperatures: ArrayLike,
+                         signatures: pd.DataFrame,
+                         heating_base_temperature: ArrayLike,
+                         cooling_base_temperature: Optional[ArrayLike] = None) -> np.ndarray:
+    """
+    :param temperatures: A (series x hours) matrix of outdoor temperatures.
+    :param signatures: Fits as returned by fit_heat_power_signatures, one row per series.
+    :param heating_base_temperature: Base temperature of the heating branch used by the fits.
+    :param cooling_base_temperature: Base temperature of the cooling branch used by the fits, if any.
+    :return: The fitted load of each hour of the heating (and cooling) branch, NaN for the hours outside them.
+    """
+    temperatures = np.atleast_2d(np.asarray(temperatures, dtype=np.float64))
+    fitted = np.full(temperatures.shape, np.nan)
+    base_temperatures = {"heating": heating_base_temperature, "cooling": cooling_base_temperature}
+
+    for branch in SIGNATURE_BRANCHES:
+        if base_temperatures[branch] is None or f"{branch}_slope" not in signatures:
+            continue
+        slope = signatures[f"{branch}_slope"].to_numpy()[:, np.newaxis]
+        intercept = signatures[f"{branch}_intercept"].to_numpy()[:, np.newaxis]
+        fitted = np.where(_branch_mask(temperatures, branch, base_temperatures[branch]),
+                          slope * temperatures + intercept,
+                          fitted)
+
+    return fitted
+
+
+def duration_curves_frame(data: Dict[str, pd.DataFrame], column: str = "Total_consumption") -> pd.DataFrame:
+    """
+    :param data: A dictionary with the hourly data of each city.
+    :param column: Column with the loads.
+    :return: A DataFrame with the load duration curve of each city as a column, indexed by the hour of the curve
+    (starting at 1).
+    """
+    loads = series_matrix(data, column)
+    curves = load_duration_curves(loads.to_numpy())
+    return pd.DataFrame(curves.T,
+                        index=pd.Index(duration_axis(curves.shape[1]).astype(np.int64), name="hour"),
+                        columns=loads.index)
+
@@ -0,0 +1,200 @@
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.cache import EXCEL_CACHE_DIR, read_excel_cached
+from src.functions import ArrayLike
+
+
+NET_PROPERTIES_PATH: str = os.path.join(".", "data", "net_properties.xlsx")
+
+# Network composition used by the processing notebook (Jensen, 2016): share of the length and scaling factor of the
+# diameter of each pipe category.
+PIPE_CATEGORIES = ["Cat. 1", "Cat. 2", "Cat. 3", "Cat. 4", "Cat. 5", "Cat. 6"]
+PIPING_SHARE = [0.433, 0.235, 0.184, 0.078, 0.041, 0.0302]
+NET_SCALING_FACTOR = [0.0250, 0.0428, 0.1095, 0.2442, 0.6654, 1]
+
+# Max pipe diameter in the network (mm), typically sized to hold peak-conditions fluid velocity.
+MAX_PIPE_DIAMETER: float = 505.0
+
+NETWORK_COST_COLUMNS = ["network_piping_length", "network_piping_costs", "network_ins_cost", "total_net_cost"]
+
+
+class PipeCatalogue(object):
+    """
+    Pipes of net_properties.xlsx sorted by inner diameter (D_i), so the pipe of many diameters is found by binary
+    search instead of a mask over the whole catalogue per diameter.
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        """
+
+        :param data: A DataFrame with one row per pipe, with the D_i (inner diameter, mm) column and the DN, price and
+        installation price columns.
+        """
+        self.data = data.reset_index(drop=True)
+
+        diameters = self.data["D_i"].to_numpy(dtype=np.float64)
+        order = np.argsort(diameters, kind="stable")
+        self._sorted_diameters = diameters[order]
+        # The notebook takes the first row (in the order of the file) with D_i >= diameter. Among the rows sorted from
+        # position p onwards, that is the minimum original position, i.e., a suffix minimum.
+        self._first_rows = np.minimum.accumulate(order[::-1])[::-1]
+
+    @classmethod
+    def from_excel(cls,
+                   path: str = NET_PROPERTIES_PATH,
+                   cache_dir: Optional[str] = EXCEL_CACHE_DIR) -> "PipeCatalogue":
+        return cls(read_excel_cached(path, cache_dir=cache_dir))
+
+    def column_values(self, column: str) -> np.ndarray:
+        """
+        :param column: Column of the catalogue, e.g., DN, SERIESX_cost or ins_cost_existing_district.
+        :return: The values of the column, in the order of the rows.
+        """
+        if column not in self.data.columns:
+            raise ValueError(f"Value of 'column' is invalid. Valid values are {list(self.data.columns)}.")
+
+        return self.data[column].to_numpy()
+
+    def rows(self, inner_diameters: ArrayLike) -> np.ndarray:
+        """
+        :param inner_diameters: Inner diameters (mm) of any shape.
+        :return: The row of the catalogue of each diameter: the first pipe with D_i greater than or equal to it.
+        """
+        inner_diameters = np.asarray(inner_diameters, dtype=np.float64)
+        positions = np.searchsorted(self._sorted_diameters, inner_diameters, side="left")
+        invalid = (positions >= len(self._sorted_diameters)) | np.isnan(inner_diameters)
+        if np.any(invalid):
+            raise ValueError(f"Value of 'inner_diameters' is invalid. Valid values are up to "
+                             f"{self._sorted_diameters[-1]} mm, got {np.unique(inner_diameters[invalid])}.")
+
+        return self._first_rows[positions]
+
+    def lookup(self, inner_diameters: ArrayLike, column: str) -> np.ndarray:
+        """
+        :param inner_diameters: Inner diameters (mm) of any shape.
+        :param column: Column of the catalogue, e.g., DN, SERIESX_cost or ins_cost_existing_district.
+        :return: The value of the column for the pipe of each diameter, with the shape of inner_diameters.
+        """
+        return self.column_values(column)[self.rows(inner_diameters)]
+
+
+def network_length(building_area: ArrayLike, land_area: ArrayLike) -> np.ndarray:
+    """
+    :param building_area: Total building area (km2), a single value or one per year.
+    :param land_area: Total land area (km2), a single value or one per year.
+    :return: The length of the network (m) according to its heat density, see the processing notebook. Like every
+    length of this module, in metres, so it can be passed to network_costs as is.
+    """
+    building_area = np.asarray(building_area, dtype=np.float64)
+    land_area = np.asarray(land_area, dtype=np.float64)
+    net_width = 61.8 * np.power(building_area / land_area, -0.15)  # m
+    return land_area * 1e6 / net_width
+
+
+def pipe_average_diameters(scaling_factors: ArrayLike, max_diameter: ArrayLike = MAX_PIPE_DIAMETER) -> np.ndarray:
+    """
+    :param scaling_factors: Scaling factors of the pipe categories, of any shape.
+    :param max_diameter: Max pipe diameter (mm) of the network, broadcast against scaling_factors.
+    :return: The average inner diameter (mm) of each pipe category, sqrt(D_SF * D_max^2).
+    """
+    scaling_factors = np.asarray(scaling_factors, dtype=np.float64)
+    return np.sqrt(scaling_factors * np.power(np.asarray(max_diameter, dtype=np.float64), 2))
+
+
+def pipe_category_prices(catalogue: PipeCatalogue,
+                         scaling_factors: ArrayLike = NET_SCALING_FACTOR,
+                         max_diameter: ArrayLike = MAX_PIPE_DIAMETER,
+                         pipe_type: str = "SERIESX_cost",
+                         district_type: str = "ins_cost_existing_district") -> Dict[str, np.ndarray]:
+    """
+    :param catalogue: Pipes to choose from.
+    :param scaling_factors: A (configurations x categories) matrix, or a single configuration, of scaling factors.
+    :param max_diameter: Max pipe diameter (mm) of the network, a single value or one per configuration.
+    :param pipe_type: Column of the catalogue with the price of the pipes (€/m) of a material, e.g., SERIESX_cost.
+    :param district_type: Column of the catalogue with the installation price (€/m) in the kind of district.
+    :return: A dictionary with the (configurations x categories) dpipe_avg, DN_pipe, pipe_price, ins_price and
+    piping_cost_per_m matrices.
+    """
+    scaling_factors = np.atleast_2d(np.asarray(scaling_factors, dtype=np.float64))
+    max_diameter = np.asarray(max_diameter, dtype=np.float64)
+    if max_diameter.ndim == 1:
+        max_diameter = max_diameter[:, np.newaxis]
+
+    diameters = pipe_average_diameters(scaling_factors, max_diameter)
+    rows = catalogue.rows(diameters)
+    pipe_price = catalogue.column_values(pipe_type).astype(np.float64)[rows]
+    ins_price = catalogue.column_values(district_type).astype(np.float64)[rows]
+
+    return {"dpipe_avg": diameters,
+            "DN_pipe": catalogue.column_values("DN")[rows],
+            "pipe_price": pipe_price,
+            "ins_price": ins_price,
+            "piping_cost_per_m": pipe_price + ins_price}
+
+
+def network_costs(catalogue: PipeCatalogue,
+                  network_lengths: ArrayLike,
+                  piping_shares: ArrayLike = PIPING_SHARE,
+                  scaling_factors: ArrayLike = NET_SCALING_FACTOR,
+                  max_diameter: ArrayLike = MAX_PIPE_DIAMETER,
+                  pipe_type: str = "SERIESX_cost",
+                  district_type: str = "ins_cost_existing_district") -> Dict[str, np.ndarray]:
+    """
+    Prices the pipes of many network configurations and lengths at once, as the processing notebook does for one
+    configuration and the initial length.
+
+    :param catalogue: Pipes to choose from.
+    :param network_lengths: Lengths of the network (m), e.g., the initial length and the extension at several years.
+    :param piping_shares: A (configurations x categories) matrix, or a single configuration, with the share of the
+    length of each pipe category.
+    :param scaling_factors: Scaling factors of the diameter of the categories, same shape as piping_shares.
+    :param max_diameter: Max pipe diameter (mm) of the network, a single value or one per configuration.
+    :param pipe_type: Column of the catalogue with the price of the pipes (€/m) of a material, e.g., SERIESX_cost.
+    :param district_type: Column of the catalogue with the installation price (€/m) in the kind of district.
+    :return: The matrices of pipe_category_prices and the (configurations x lengths x categories) NETWORK_COST_COLUMNS
+    arrays. The costs of a network are the sum over the last axis.
+    """
+    piping_shares = np.atleast_2d(np.asarray(piping_shares, dtype=np.float64))
+    scaling_factors = np.atleast_2d(np.asarray(scaling_factors, dtype=np.float64))
+    if piping_shares.shape[-1] != scaling_factors.shape[-1]:
+        raise ValueError(f"The piping shares have {piping_shares.shape[-1]} categories, but the scaling factors have "
+                         f"{scaling_factors.shape[-1]}.")
+    # A single configuration of shares (or scaling factors) is shared by every configuration of the other.
+    piping_shares, scaling_factors = np.broadcast_arrays(piping_shares, scaling_factors)
+
+    prices = pipe_category_prices(catalogue, scaling_factors, max_diameter, pipe_type, district_type)
+    lengths = np.atleast_1d(np.asarray(network_lengths, dtype=np.float64))
+
+    piping_length = lengths[np.newaxis, :, np.newaxis] * piping_shares[:, np.newaxis, :]
+    piping_costs = piping_length * prices["pipe_price"][:, np.newaxis, :]
+    ins_cost = piping_length * prices["ins_price"][:, np.newaxis, :]
+    return {**prices,
+            "network_piping_length": piping_length,
+            "network_piping_costs": piping_costs,
+            "network_ins_cost": ins_cost,
+            "total_net_cost": piping_costs + ins_cost}
+
+
+def network_cost_frame(catalogue: PipeCatalogue,
+                       network_lengths: pd.Series,
+                       configurations: Optional[Sequence[str]] = None,
+                       **cost_options) -> pd.DataFrame:
+    """
+    :param catalogue: Pipes to choose from.
+    :param network_lengths: Lengths of the network (m) indexed by their key, e.g., the network extension year.
+    :param configurations: Keys of the configurations, in the order of the rows of piping_shares.
+    :param cost_options: Options passed to network_costs, e.g., piping_shares and scaling_factors.
+    :return: A DataFrame indexed by (configuration, network length key) with the NETWORK_COST_COLUMNS of the whole
+    network, i.e., summed over the pipe categories.
+    """
+    costs = network_costs(catalogue, network_lengths.to_numpy(), **cost_options)
+    num_configurations = costs["dpipe_avg"].shape[0]
+    configurations = pd.RangeIndex(num_configurations) if configurations is None else pd.Index(configurations)
+
+    index = pd.MultiIndex.from_product([configurations, network_lengths.index],
+                                       names=[configurations.name or "configuration", network_lengths.index.name])
+    return pd.DataFrame({column: costs[column].sum(axis=-1).ravel() for column in NETWORK_COST_COLUMNS}, index=index)
@@ -0,0 +1,516 @@
+"""
+Regenerates the processed files of the cities without the processing notebook:
+
+    python -m src.pipeline --config data/simulation_values.json --cities rome_italy miami_florida --workers 4
+
+Each city runs the stages of the notebook (ambient temperature fit, demand, heat power signature, ground
+temperatures, network dispatch and costing) as far as its columns allow. As in the notebook, the demand is the
+user-defined thermal load of THERMAL_LOAD_PATH (--thermal-load), which replaces the degree-days distribution. The NOAA
+and Ospitaletto cities have no carbon emissions profile, so their costing is skipped. A city with skipped stages is
+only written with --allow-partial, and only the cities of COSTING_PIPELINE_DATASETS run if --cities is not given. The
+output of each stage is cached under data/.pipeline_cache, keyed by its input columns, the simulation values it
+reads and the keys of the stages it depends on, so a rerun only recomputes the stages whose inputs changed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.InsPireDataset import InsPireDataset
+from src.NOAA2010Dataset import NOAA2010Dataset
+from src.OspitalettoDataset import OspitalettoDataset
+from src.cache import atomic_write_path, options_hash
+from src.degree_days import daily_means, day_codes
+from src.dispatch import DISPATCH_COLUMNS
+from src.load_analytics import fit_heat_power_signatures, heat_power_signature
+from src.sweep import (AMBIENT_FIT_SCALARS, COOL_TOWER_EL_RATIO, DEMAND_COLUMNS, SIMULATION_VALUES_PATH,
+                       SWEEP_RESULT_COLUMNS, THERMAL_LOAD_COLUMNS, THERMAL_LOAD_PATH, dispatch_network,
+                       distribute_demand, fit_ambient_temperature, ground_and_aquifer_temperatures,
+                       load_simulation_values, load_technology_costs, load_thermal_load, scenario_metrics)
+
+
+PIPELINE_CACHE_DIR: str = os.path.join(".", "data", ".pipeline_cache")
+
+PIPELINE_DATASETS = ("InsPireDataset", "NOAA2010Dataset", "OspitalettoDataset")
+
+# Datasets whose cities have the input columns of every stage. The NOAA2010 and Ospitaletto cities have no carbon
+# emissions profile, so their costing is skipped, and the Ospitaletto data has no shares of space heating and
+# domestic hot water, so its demand and the stages after it are skipped as well.
+COSTING_PIPELINE_DATASETS = ("InsPireDataset",)
+
+STAGE_STATUSES = ("computed", "cached", "skipped")
+
+COSTING_COLUMNS = ["E_el_h", "E_el_c", "E_el_total", "HP_el_cost", "HP_el_CO2", "Chiller_CO2", "Cool_tower_CO2",
+                   "Aux_heater_CO2", "cost_source1", "cost_source2"]
+
+# Columns and scalars produced by a stage.
+StageOutput = Tuple[Dict[str, np.ndarray], Dict[str, Any]]
+
+
+class Stage(object):
+    """
+    A step of the pipeline of a city. It reads hourly input columns of the city, the columns and scalars of the
+    stages it depends on and some simulation values, and produces hourly columns and scalars.
+    """
+
+    def __init__(self,
+                 name: str,
+                 function: Callable[[pd.DataFrame, Dict[str, Any], Dict[str, Any], Optional[pd.DataFrame]],
+                                    StageOutput],
+                 input_columns: List[str],
+                 value_keys: List[str],
+                 upstream: List[str],
+                 version: int = 1):
+        """
+
+        :param name: Name of the stage.
+        :param function: Receives the hourly data (with the columns of the upstream stages), the scalars of the
+        upstream stages, the simulation values and the technology costs, and returns the output of the stage.
+        :param input_columns: Columns of the city read by the stage. Cities without them skip the stage.
+        :param value_keys: Simulation values read by the stage.
+        :param upstream: Names of the stages whose output the stage reads.
+        :param version: Part of the cache key, increase it when the computation of the stage changes.
+        """
+        self.name = name
+        self.function = function
+        self.input_columns = input_columns
+        self.value_keys = value_keys
+        self.upstream = upstream
+        self.version = version
+
+
+def _simulation_inputs(data: pd.DataFrame, scalars: Dict[str, Any], columns: List[str]) -> Dict[str, Any]:
+    # The sweep functions read the hourly columns, the daily temperatures and the fit scalars from a dictionary.
+    inputs: Dict[str, Any] = {column: data[column].to_numpy(dtype=np.float64) for column in columns}
+    inputs.update(scalars)
+    if "air_temp" in inputs:
+        inputs["day_code"], days = day_codes(data.index)
+        inputs["daily_air_temp"] = daily_means(inputs["air_temp"], inputs["day_code"], len(days))[0]
+
+    return inputs
+
+
+def _fitting_stage(data: pd.DataFrame,
+                   scalars: Dict[str, Any],
+                   values: Dict[str, Any],
+                   technology_costs: Optional[pd.DataFrame]) -> StageOutput:
+    fit = fit_ambient_temperature(data.index, data["air_temp"].to_numpy(), data["hourofyear"].to_numpy())
+    return {"air_temp_fit": fit["air_temp_fit"]}, {key: fit[key] for key in AMBIENT_FIT_SCALARS}
+
+
+def _demand_stage(data: pd.DataFrame,
+                  scalars: Dict[str, Any],
+                  values: Dict[str, Any],
+                  technology_costs: Optional[pd.DataFrame]) -> StageOutput:
+    # The thermal load columns replace the degree-days distribution, see hourly_demand.
+    demand = distribute_demand(_simulation_inputs(data, scalars, STAGES["demand"].input_columns), values)
+    columns = {column: demand[column] for column in DEMAND_COLUMNS}
+    columns["hot_water_temp"] = np.full(data.shape[0], values["Tdhw"], dtype=np.float64)
+    return columns, dict()
+
+
+def _signature_stage(data: pd.DataFrame,
+                     scalars: Dict[str, Any],
+                     values: Dict[str, Any],
+                     technology_costs: Optional[pd.DataFrame]) -> StageOutput:
+    # Heating line of the consumption over the hours with heat degree days, NaN in the other hours. Cities without
+    # heat degree days have no fit, so the column is NaN, as in the processing notebook.
+    fit = fit_heat_power_signatures(data["air_temp"], data["Thermal_consumption"], values["T_base_heat_degree"])
+    fitted = heat_power_signature(data["air_temp"], fit, values["T_base_heat_degree"])[0]
+    return {"Total_consumption_fit": fitted}, dict()
+
+
+def _ground_stage(data: pd.DataFrame,
+                  scalars: Dict[str, Any],
+                  values: Dict[str, Any],
+                  technology_costs: Optional[pd.DataFrame]) -> StageOutput:
+    return ground_and_aquifer_temperatures(_simulation_inputs(data, scalars, ["hourofyear"]), values), dict()
+
+
+def _dispatch_stage(data: pd.DataFrame,
+                    scalars: Dict[str, Any],
+                    values: Dict[str, Any],
+                    technology_costs: Optional[pd.DataFrame]) -> StageOutput:
+    result = dispatch_network(data, values)
+    return {column: result[column].to_numpy() for column in DISPATCH_COLUMNS}, dict()
+
+
+def _costing_stage(data: pd.DataFrame,
+                   scalars: Dict[str, Any],
+                   values: Dict[str, Any],
+                   technology_costs: Optional[pd.DataFrame]) -> StageOutput:
+    inputs = _simulation_inputs(data, scalars, STAGES["costing"].input_columns)
+    metrics = scenario_metrics(inputs, values, data, data, technology_costs)
+
+    # Hourly costs and emissions, see the processing notebook.
+    E_el_h = data.Thermal_consumption / data.COP
+    E_el_c = data.SC_consumption / data.EER_cool
+    E_el_total = E_el_h + E_el_c
+    columns = {"E_el_h": E_el_h,
+               "E_el_c": E_el_c,
+               "E_el_total": E_el_total,
+               "HP_el_cost": E_el_total * data.El_price_ind * 1000,
+               "HP_el_CO2": E_el_total * data.Carbon_emissions_profile / 1000,
+               "Chiller_CO2": data.E_el_chiller * data.Carbon_emissions_profile / 1000,
+               "Cool_tower_CO2": data.Q_cool_tower * COOL_TOWER_EL_RATIO * data.Carbon_emissions_profile / 1000,
+               "Aux_heater_CO2": data.heat_aux_heater * data.CO2_gas / 1000,
+               "cost_source1": data.heat_source1 * data.WH_price,
+               "cost_source2": data.heat_source2 * data.WH_price}
+
+    return {column: columns[column].to_numpy(dtype=np.float64) for column in COSTING_COLUMNS}, metrics
+
+
+# In execution order, every stage comes after the stages it depends on.
+STAGES: Dict[str, Stage] = {
+    "fitting": Stage("fitting", _fitting_stage, ["air_temp", "hourofyear"], [], []),
+    "demand": Stage("demand", _demand_stage, ["air_temp", "%SH_y", "%DHW_y", *THERMAL_LOAD_COLUMNS],
+                    ["Tmin_i", "Tmax_i", "Tdhw"], []),
+    "signature": Stage("signature", _signature_stage, ["air_temp"], ["T_base_heat_degree"], ["demand"]),
+    "ground": Stage("ground", _ground_stage, ["hourofyear"], ["depth_aquifer"], ["fitting"]),
+    "dispatch": Stage("dispatch",
+                      _dispatch_stage,
+                      ["air_temp"],
+                      ["s1_schedule", "s2_schedule", "Ts1", "Ts2", "cap_source1", "cap_source2", "cap_ground",
+                       "DT_evap"],
+                      ["demand", "ground"]),
+    "costing": Stage("costing",
+                     _costing_stage,
+                     ["Carbon_emissions_profile", "El_price_ind", "Gas_price_ind", "WH_price", "CO2_gas"],
+                     ["Interest_Rate", "cap_source1", "cap_source2", "cap_ground"],
+                     ["demand", "dispatch"]),
+}
+
+
+def _array_hash(values: np.ndarray) -> str:
+    values = np.ascontiguousarray(values)
+    return hashlib.sha256(str(values.dtype).encode("utf-8") + values.tobytes()).hexdigest()
+
+
+def stage_key(stage: Stage,
+              data: pd.DataFrame,
+              values: Dict[str, Any],
+              upstream_keys: Dict[str, str],
+              technology_costs: Optional[pd.DataFrame] = None) -> str:
+    """
+    :return: A hex digest of everything the output of the stage depends on: its version, the content of its input
+    columns and of the index, the simulation values it reads, the keys of its upstream stages and, for the costing,
+    the technology costs.
+    """
+    options = {"stage": stage.name,
+               "version": stage.version,
+               "index": _array_hash(data.index.values.astype("datetime64[ns]")),
+               "columns": {column: _array_hash(data[column].to_numpy()) for column in stage.input_columns},
+               "values": {key: values[key] for key in stage.value_keys},
+               "upstream": {name: upstream_keys[name] for name in stage.upstream}}
+    if stage.name == "costing" and technology_costs is not None:
+        options["technology_costs"] = technology_costs.to_dict()
+
+    return options_hash(options)[:32]
+
+
+def _read_cached_stage(folder: str, stage: Stage, key: str) -> Optional[StageOutput]:
+    scalars_path = os.path.join(folder, f"{stage.name}-{key}.json")
+    if not os.path.exists(scalars_path):
+        return None
+
+    with open(scalars_path, "r") as f:
+        scalars = json.load(f)
+    columns_path = os.path.join(folder, f"{stage.name}-{key}.parquet")
+    columns = dict()
+    if os.path.exists(columns_path):
+        cached = pd.read_parquet(path=columns_path, engine="pyarrow")
+        columns = {column: cached[column].to_numpy() for column in cached.columns}
+
+    return columns, scalars
+
+
+def _write_cached_stage(folder: str, stage: Stage, key: str, output: StageOutput):
+    os.makedirs(folder, exist_ok=True)
+    columns, scalars = output
+    prefix = f"{stage.name}-"
+
+    # The scalars file marks the entry as complete, so it is written last.
+    if len(columns) > 0:
+        columns_path = os.path.join(folder, f"{prefix}{key}.parquet")
+        with atomic_write_path(columns_path) as temporary_path:
+            pd.DataFrame(columns).to_parquet(path=temporary_path, engine="pyarrow")
+
+    # numpy scalars are stored as their Python values.
+    scalars = {name: value.item() if isinstance(value, np.generic) else value for name, value in scalars.items()}
+    scalars_path = os.path.join(folder, f"{prefix}{key}.json")
+    with atomic_write_path(scalars_path) as temporary_path, open(temporary_path, "w") as f:
+        json.dump(scalars, f)
+
+    for filename in os.listdir(folder):
+        if filename.startswith(prefix) and not filename.startswith(f"{prefix}{key}."):
+            os.remove(os.path.join(folder, filename))
+
+
+def run_city_pipeline(dataset_name: str,
+                      city_key: str,
+                      data: pd.DataFrame,
+                      values: Dict[str, Any],
+                      technology_costs: Optional[pd.DataFrame] = None,
+                      cache_dir: Optional[str] = PIPELINE_CACHE_DIR,
+                      output_path: Optional[str] = None,
+                      allow_partial: bool = False,
+                      thermal_load: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+    """
+    Runs the STAGES on the hourly data of a city, reusing the cached output of the stages whose key did not change.
+
+    :param dataset_name: Name of the dataset of the city, part of the cache folder.
+    :param city_key: Key of the city.
+    :param data: Hourly data of the city as returned by the dataset.
+    :param values: Simulation values, with the same keys as simulation_values.json.
+    :param technology_costs: Costs of the central technologies, see load_technology_costs. If None, then the
+    annualized capital costs are NaN.
+    :param cache_dir: Folder of the cached stages. If None, then every stage is computed and nothing is cached.
+    :param output_path: If given, the processed data is written to output_path.csv and output_path.parquet (or only
+    to output_path if it ends with .csv).
+    :param allow_partial: If True, then the processed data is written even if some stages were skipped, i.e., without
+    their columns. Otherwise, the city is not written and the reason is reported in "not_written".
+    :param thermal_load: Hourly THERMAL_LOAD_COLUMNS, see load_thermal_load, aligned with data by timestamp. The
+    demand reads them, so it is skipped without a thermal load.
+    :return: A dictionary with the dataset, the city, the status of each stage (see STAGE_STATUSES), the reason of the
+    skipped stages, the scalars of the stages (e.g., the SWEEP_RESULT_COLUMNS of the costing), the output path (None
+    if nothing was written) and the reason why the processed data was not written (None if it was or if output_path
+    is None).
+    """
+    folder = None if cache_dir is None else os.path.join(cache_dir, dataset_name, city_key)
+    if thermal_load is not None:
+        data = data.assign(**{column: thermal_load[column].reindex(data.index) for column in THERMAL_LOAD_COLUMNS})
+    processed = data.copy()
+    keys: Dict[str, str] = dict()
+    scalars: Dict[str, Any] = dict()
+    report: Dict[str, Any] = {"dataset": dataset_name, "city": city_key, "stages": dict(), "skipped": dict()}
+
+    for stage in STAGES.values():
+        missing_columns = [column for column in stage.input_columns if column not in data.columns]
+        missing_stages = [name for name in stage.upstream if name not in keys]
+        if len(missing_columns) > 0 or len(missing_stages) > 0:
+            report["stages"][stage.name] = "skipped"
+            report["skipped"][stage.name] = (f"missing columns {missing_columns}" if len(missing_columns) > 0
+                                             else f"skipped stages {missing_stages}")
+            continue
+
+        keys[stage.name] = stage_key(stage, data, values, keys, technology_costs)
+        output = None if folder is None else _read_cached_stage(folder, stage, keys[stage.name])
+        report["stages"][stage.name] = "computed" if output is None else "cached"
+        if output is None:
+            output = stage.function(processed, scalars, values, technology_costs)
+            if folder is not None:
+                _write_cached_stage(folder, stage, keys[stage.name], output)
+
+        columns, stage_scalars = output
+        for column, column_values in columns.items():
+            processed[column] = column_values
+        scalars.update(stage_scalars)
+
+    report["scalars"] = scalars
+    report["output"] = None
+    report["not_written"] = None
+    if output_path is not None and len(report["skipped"]) > 0 and not allow_partial:
+        report["not_written"] = f"skipped stages {list(report['skipped'])}"
+    elif output_path is not None:
+        # The notebook keeps the thermal load apart from the data of the city.
+        report["output"] = write_processed_data(processed.drop(columns=THERMAL_LOAD_COLUMNS, errors="ignore"),
+                                                output_path)
+    return report
+
+
+def write_processed_data(data: pd.DataFrame, output_path: str) -> str:
+    """
+    Writes the processed data of a city to the files the processing notebook writes, a csv and a parquet file.
+
+    :return: output_path.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    if output_path.endswith(".csv"):
+        data.to_csv(path_or_buf=output_path)
+    else:
+        data.to_csv(path_or_buf=f"{output_path}.csv")
+        data.to_parquet(path=f"{output_path}.parquet", engine="pyarrow")
+
+    return output_path
+
+
+def _dataset_cities(dataset_name: str) -> Tuple[Any, Dict[str, str]]:
+    """
+    :return: The dataset and the processed path of each of its cities.
+    """
+    if dataset_name == "InsPireDataset":
+        dataset = InsPireDataset()
+        return dataset, {InsPireDataset.LONDON_UK: dataset.processed_london_uk_dataset_path,
+                         InsPireDataset.MADRID_SPA: dataset.processed_madrid_spa_dataset_path,
+                         InsPireDataset.ROME_IT: dataset.processed_rome_it_dataset_path,
+                         InsPireDataset.STUTTGART_GER: dataset.processed_stuttgart_ger_dataset_path}
+    if dataset_name == "NOAA2010Dataset":
+        dataset = NOAA2010Dataset()
+        return dataset, {NOAA2010Dataset.MIAMI_FL: dataset.processed_miami_fl_dataset_path,
+                         NOAA2010Dataset.FRESNO_CA: dataset.processed_fresno_ca_dataset_path,
+                         NOAA2010Dataset.OLYMPIA_WA: dataset.processed_olympia_wa_dataset_path,
+                         NOAA2010Dataset.ROCHESTER_NY: dataset.processed_rochester_ny_dataset_path}
+    if dataset_name == "OspitalettoDataset":
+        dataset = OspitalettoDataset()
+        return dataset, {OspitalettoDataset.OSPITALETTO: dataset.processed_dataset_path}
+
+    raise ValueError(f"Value of 'dataset_name' is invalid. Valid values are {PIPELINE_DATASETS}.")
+
+
+def available_cities(dataset_names: Tuple[str, ...] = PIPELINE_DATASETS) -> Dict[str, str]:
+    """
+    :param dataset_names: Names of the datasets of the cities, some of PIPELINE_DATASETS.
+    :return: A dictionary with the dataset name of each city key.
+    """
+    return {city_key: dataset_name
+            for dataset_name in dataset_names
+            for city_key in _dataset_cities(dataset_name)[1]}
+
+
+def load_pipeline_cities(dataset_name: str,
+                         city_keys: List[str],
+                         num_workers: int = 1) -> Tuple[Dict[str, pd.DataFrame], Dict[str, str]]:
+    """
+    :param dataset_name: One of PIPELINE_DATASETS.
+    :param city_keys: Keys of the cities of the dataset to load.
+    :param num_workers: Number of threads used to load the cities, if the dataset supports it.
+    :return: The hourly data and the processed path of each city.
+    """
+    dataset, paths = _dataset_cities(dataset_name)
+    if dataset_name == "InsPireDataset":
+        data = dataset.load_data(lazy=True).load(city_keys, num_workers=num_workers)
+    elif dataset_name == "NOAA2010Dataset":
+        data = {city_key: city_data for city_key, city_data in dataset.load_data().items() if city_key in city_keys}
+    else:
+        # The measurements are resampled to hours, the fit of the ambient temperature runs on the hour of the year.
+        hourly_data = dataset.load_hourly_data()
+        hourly_data["dayofyear"] = hourly_data.index.dayofyear
+        hourly_data["hourofyear"] = (hourly_data.index.dayofyear - 1) * 24 + hourly_data.index.hour + 1
+        data = {OspitalettoDataset.OSPITALETTO: hourly_data}
+
+    return data, {city_key: paths[city_key] for city_key in city_keys}
+
+
+def _run_city_pipeline_task(arguments: Tuple) -> Dict[str, Any]:
+    return run_city_pipeline(*arguments)
+
+
+def run_pipeline(values: Dict[str, Any],
+                 city_keys: Optional[List[str]] = None,
+                 num_workers: int = 1,
+                 technology_costs: Optional[pd.DataFrame] = None,
+                 cache_dir: Optional[str] = PIPELINE_CACHE_DIR,
+                 write_outputs: bool = True,
+                 allow_partial: bool = False,
+                 thermal_load_path: Optional[str] = THERMAL_LOAD_PATH) -> List[Dict[str, Any]]:
+    """
+    Loads the cities and runs their pipelines, in parallel processes if num_workers is greater than 1.
+
+    :param values: Simulation values, with the same keys as simulation_values.json.
+    :param city_keys: Keys of the cities of any of the PIPELINE_DATASETS. None runs the cities of the
+    COSTING_PIPELINE_DATASETS, the only ones whose pipelines reach the costing.
+    :param num_workers: Number of processes running the pipelines (and of threads loading the cities).
+    :param technology_costs: Costs of the central technologies, see load_technology_costs.
+    :param cache_dir: Folder of the cached stages. If None, then every stage is computed.
+    :param write_outputs: If True, then the processed data of each city is written to its processed path.
+    :param allow_partial: If True, then the cities with skipped stages are written as well, see run_city_pipeline.
+    :param thermal_load_path: Excel file with the thermal load of the cities, see load_thermal_load. If None, then
+    the demand and the stages after it are skipped.
+    :return: The report of each city, see run_city_pipeline, in the order of city_keys.
+    """
+    cities = available_cities()
+    city_keys = list(available_cities(COSTING_PIPELINE_DATASETS)) if city_keys is None else list(city_keys)
+    unknown_cities = [city_key for city_key in city_keys if city_key not in cities]
+    if len(unknown_cities) > 0:
+        raise ValueError(f"Cities {unknown_cities} are invalid. Valid cities are {list(cities)}.")
+
+    thermal_load = None if thermal_load_path is None else load_thermal_load(thermal_load_path)
+    tasks = []
+    for dataset_name in PIPELINE_DATASETS:
+        dataset_city_keys = [city_key for city_key in city_keys if cities[city_key] == dataset_name]
+        if len(dataset_city_keys) == 0:
+            continue
+
+        data, paths = load_pipeline_cities(dataset_name, dataset_city_keys, num_workers=num_workers)
+        tasks.extend((dataset_name, city_key, data[city_key], values, technology_costs, cache_dir,
+                      paths[city_key] if write_outputs else None, allow_partial, thermal_load)
+                     for city_key in dataset_city_keys)
+
+    if num_workers <= 1 or len(tasks) <= 1:
+        reports = [_run_city_pipeline_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(tasks))) as executor:
+            reports = list(executor.map(_run_city_pipeline_task, tasks))
+
+    order = {city_key: position for position, city_key in enumerate(city_keys)}
+    return sorted(reports, key=lambda report: order[report["city"]])
+
+
+def reports_frame(reports: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    :return: A DataFrame indexed by city with the dataset, the status of each stage and the SWEEP_RESULT_COLUMNS of
+    the cities that reached the costing.
+    """
+    rows = [{"city": report["city"],
+             "dataset": report["dataset"],
+             **report["stages"],
+             **{column: report["scalars"].get(column, np.nan) for column in SWEEP_RESULT_COLUMNS}}
+            for report in reports]
+    return pd.DataFrame(rows, columns=["city", "dataset", *STAGES, *SWEEP_RESULT_COLUMNS]).set_index("city")
+
+
+def main(arguments: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Regenerates the processed files of the cities.")
+    parser.add_argument("--config", default=SIMULATION_VALUES_PATH, help="JSON file with the simulation values.")
+    parser.add_argument("--cities", nargs="*", default=None,
+                        help="Keys of the cities to process, by default the cities whose stages reach the costing.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of processes, 1 runs the cities one after the other.")
+    parser.add_argument("--cache-dir", default=PIPELINE_CACHE_DIR, help="Folder of the cached stages.")
+    parser.add_argument("--no-cache", action="store_true", help="Computes every stage and does not cache them.")
+    parser.add_argument("--no-technology-costs", action="store_true",
+                        help="Does not read the technology costs, the annualized capital costs are NaN.")
+    parser.add_argument("--dry-run", action="store_true", help="Runs the stages without writing the processed files.")
+    parser.add_argument("--allow-partial", action="store_true",
+                        help="Writes the processed files of the cities with skipped stages as well.")
+    parser.add_argument("--thermal-load", default=THERMAL_LOAD_PATH,
+                        help="Excel file with the monthly heating and cooling load of the cities.")
+    parser.add_argument("--summary", default=None, help="CSV file with the stages and annual results of each city.")
+    args = parser.parse_args(arguments)
+
+    values = load_simulation_values(args.config)
+    technology_costs = None if args.no_technology_costs else load_technology_costs()
+
+    start = time.perf_counter()
+    reports = run_pipeline(values,
+                           city_keys=args.cities,
+                           num_workers=args.workers,
+                           technology_costs=technology_costs,
+                           cache_dir=None if args.no_cache else args.cache_dir,
+                           write_outputs=not args.dry_run,
+                           allow_partial=args.allow_partial,
+                           thermal_load_path=args.thermal_load)
+
+    for report in reports:
+        stages = ", ".join(f"{name} {status}" for name, status in report["stages"].items())
+        print(f"{report['city']} ({report['dataset']}): {stages}")
+        for name, reason in report["skipped"].items():
+            print(f"    {name} skipped, {reason}")
+        if report["output"] is not None:
+            print(f"    written to {report['output']}")
+        if report["not_written"] is not None:
+            print(f"    not written, {report['not_written']} (use --allow-partial to write it)")
+    print(f"Processed {len(reports)} cities in {time.perf_counter() - start:.1f} s.")
+
+    if args.summary is not None:
+        reports_frame(reports).to_csv(args.summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+DECIMATION_METHODS = ("lttb", "minmax")
+
+_INT32_INFO = np.iinfo(np.int32)
+
+
+def to_epoch_milliseconds(timestamps) -> np.ndarray:
+    """
+    :param timestamps: Timestamps as a datetime64 array, Series or DatetimeIndex.
+    :return: Milliseconds since the epoch as float64 (whole numbers, NaT becomes NaN). This is the representation of
+    Bokeh's datetime axes, and unlike int64 it is sent with the binary array encoding.
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_convert(None)
+
+    milliseconds = timestamps.asi8 // 1_000_000
+    return np.where(timestamps.isna(), np.nan, milliseconds.astype(np.float64))
+
+
+def compact_column(values, float_dtype=np.float32) -> np.ndarray:
+    """
+    Converts a column to the narrowest type that Bokeh sends as a binary array: timestamps to epoch milliseconds,
+    floats to float_dtype and integers to int32 when they fit. Categoricals become their string values.
+
+    :param values: Values of the column.
+    :param float_dtype: Type of the float columns.
+    :return: The compacted values.
+    """
+    values = pd.Series(values)
+    dtype = values.dtype
+
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return to_epoch_milliseconds(values)
+    if isinstance(dtype, pd.CategoricalDtype):
+        return values.astype(str).to_numpy()
+    if pd.api.types.is_bool_dtype(dtype):
+        return values.to_numpy()
+    if pd.api.types.is_integer_dtype(dtype):
+        array = values.to_numpy()
+        if len(array) == 0 or (array.min() >= _INT32_INFO.min and array.max() <= _INT32_INFO.max):
+            return array.astype(np.int32)
+        return array.astype(np.float64)
+    if pd.api.types.is_float_dtype(dtype):
+        return values.to_numpy(dtype=float_dtype)
+
+    return values.to_numpy()
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, num_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling. The first and last points are kept, the rest are split into
+    num_points - 2 buckets and each bucket keeps the point that forms the largest triangle with the point kept in
+    the previous bucket and the average of the next bucket. Peaks and valleys survive, unlike with plain striding.
+
+    :param x: Positions of the points, increasing.
+    :param y: Values of the points. NaN values are only kept when a whole bucket is NaN.
+    :param num_points: Number of points to keep, at least 3.
+    :return: Sorted positions of the kept points.
+    """
+    if num_points < 3:
+        raise ValueError(f"Value of 'num_points'={num_points} is invalid. Valid values are integers greater than 2.")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    num_values = len(y)
+    if num_points >= num_values:
+        return np.arange(num_values)
+
+    num_buckets = num_points - 2
+    # Buckets of the inner points, [edges[b], edges[b + 1]) for bucket b.
+    edges = np.linspace(1, num_values - 1, num_buckets + 1).astype(np.int64)
+
+    valid = ~np.isnan(y[1:-1])
+    counts = np.add.reduceat(valid, edges[:-1] - 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average_x = np.add.reduceat(np.where(valid, x[1:-1], 0), edges[:-1] - 1) / counts
+        average_y = np.add.reduceat(np.where(valid, y[1:-1], 0), edges[:-1] - 1) / counts
+    # The point that follows the last bucket is the last point.
+    average_x = np.append(average_x[1:], x[-1])
+    average_y = np.append(average_y[1:], y[-1])
+
+    selected = np.empty(num_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = num_values - 1
+
+    previous = 0
+    for bucket in range(num_buckets):
+        start, end = edges[bucket], edges[bucket + 1]
+        areas = np.abs((x[previous] - average_x[bucket]) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (average_y[bucket] - y[previous]))
+        areas[np.isnan(areas)] = -1
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def minmax_indices(y: np.ndarray, num_points: int) -> np.ndarray:
+    """
+    Min/max downsampling. The points are split into num_points // 2 buckets of equal length and each bucket keeps
+    its minimum and its maximum, so the envelope of the series is preserved exactly.
+
+    :param y: Values of the points. NaN values are ignored unless a whole bucket is NaN.
+    :param num_points: Maximum number of points to keep, at least 2. The first and last points are always kept.
+    :return: Sorted positions of the kept points.
+    """
+    if num_points < 2:
+        raise ValueError(f"Value of 'num_points'={num_points} is invalid. Valid values are integers greater than 1.")
+
+    y = np.asarray(y, dtype=np.float64)
+    num_values = len(y)
+    if num_points >= num_values:
+        return np.arange(num_values)
+
+    num_buckets = num_points // 2
+    bucket_size = -(-num_values // num_buckets)
+    padded = np.full(num_buckets * bucket_size, np.nan)
+    padded[:num_values] = y
+    padded = padded.reshape(num_buckets, bucket_size)
+
+    offsets = np.arange(num_buckets) * bucket_size
+    minimums = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    maximums = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+
+    selected = np.unique(np.concatenate([[0, num_values - 1], minimums, maximums]))
+    return selected[selected < num_values]
+
+
+def decimation_indices(data: pd.DataFrame,
+                       y: List[str],
+                       num_points: int,
+                       x: Optional[np.ndarray] = None,
+                       method: str = "lttb") -> np.ndarray:
+    """
+    :param data: DataFrame to downsample.
+    :param y: Columns whose shape should be preserved. The kept points are the union of the points kept for each of
+    them, so a figure with several lines may get up to len(y) * num_points points.
+    :param num_points: Target number of points per column.
+    :param x: Positions of the rows, used by LTTB. None uses the row number.
+    :param method: Either "lttb" or "minmax".
+    :return: Sorted positions of the rows to keep.
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Value of 'method'={method} is invalid. Valid values are {DECIMATION_METHODS}.")
+
+    x = np.arange(len(data), dtype=np.float64) if x is None else x
+    indices = [lttb_indices(x, data[column].to_numpy(dtype=np.float64), num_points)
+               if method == "lttb"
+               else minmax_indices(data[column].to_numpy(dtype=np.float64), num_points)
+               for column in y]
+
+    return np.unique(np.concatenate(indices)) if len(indices) > 0 else np.arange(len(data))
+
+
+def prepare_figure_source(data: pd.DataFrame,
+                          columns: List[str],
+                          x: Optional[str] = None,
+                          num_points: Optional[int] = None,
+                          method: str = "lttb",
+                          y: Optional[List[str]] = None,
+                          float_dtype=np.float32) -> Dict[str, np.ndarray]:
+    """
+    Builds the data of a ColumnDataSource for a single figure: only the columns that its glyphs and hover tools
+    reference, optionally downsampled, and compacted to types that Bokeh sends as binary arrays. Use it as
+    ColumnDataSource(data=prepare_figure_source(...)) instead of sharing one source with every processed column
+    across figures.
+
+    :param data: DataFrame with the data of the figure (e.g., the processed data of a city).
+    :param columns: Columns referenced by the figure. The index can be referenced by its name.
+    :param x: Column (or index name) of the x axis, added to the columns if missing. It is also the position of
+    the points for LTTB.
+    :param num_points: If given, then series longer than this are downsampled to about this number of points.
+    :param method: Downsampling method, either "lttb" or "minmax".
+    :param y: Columns whose shape is preserved by the downsampling. None uses the numeric columns other than x.
+    :param float_dtype: Type of the float columns.
+    :return: A dictionary from column names to arrays.
+    """
+    columns = list(columns)
+    if x is not None and x not in columns:
+        columns.insert(0, x)
+
+    index_name = data.index.name
+    if index_name is not None and index_name in columns:
+        data = data.reset_index()
+    missing_columns = [column for column in columns if column not in data.columns]
+    if len(missing_columns) > 0:
+        raise ValueError(f"Columns {missing_columns} are invalid. Valid values are {list(data.columns)}.")
+    data = data[columns]
+
+    if num_points is not None and len(data) > num_points:
+        if y is None:
+            y = [column for column in columns
+                 if column != x and pd.api.types.is_numeric_dtype(data[column].dtype)
+                 and not pd.api.types.is_bool_dtype(data[column].dtype)]
+        positions = None if x is None else compact_column(data[x], float_dtype=np.float64).astype(np.float64)
+        data = data.take(decimation_indices(data, y, num_points, x=positions, method=method))
+
+    return {column: compact_column(data[column], float_dtype=float_dtype) for column in columns}
+
+
+def source_nbytes(source: Dict[str, np.ndarray]) -> int:
+    """
+    :param source: Data of a ColumnDataSource.
+    :return: Size in bytes of its arrays, an estimate of the payload sent to the browser.
+    """
+    return sum(np.asarray(values).nbytes for values in source.values())
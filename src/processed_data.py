@@ -0,0 +1,126 @@
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.instrumentation import LoaderStats
+
+
+# Columns of the processed files that are saved in kW and loaded in MW.
+KW_TO_MW_COLUMNS = ["heat_source1", "heat_source2", "heat_aquifer", "E_el", "Total_consumption",
+                    "Total_consumption_fit"]
+
+
+def read_processed_parquet(path: str,
+                           columns: Optional[List[str]] = None,
+                           kw_to_mw_columns: List[str] = KW_TO_MW_COLUMNS) -> pd.DataFrame:
+    """
+    Reads a processed city file through a memory map, decoding only the requested columns (the index is always
+    read). The kW to MW conversion is applied only to the columns that are read.
+
+    :param path: Path of the parquet file.
+    :param columns: Columns to read. None reads all of them.
+    :param kw_to_mw_columns: Columns that are divided by 1000.
+    :return: A DataFrame with the requested columns.
+    """
+    table = pq.read_table(path, columns=columns, memory_map=True, use_pandas_metadata=True)
+    # Each column keeps its own block, so the frame is not consolidated into a second copy.
+    data = table.to_pandas(split_blocks=True, self_destruct=True)
+    del table
+
+    for column in kw_to_mw_columns:
+        if column in data.columns:
+            data[column] = data[column] / 1000
+
+    return data
+
+
+def load_processed_cities(paths: Dict[str, str],
+                          cities: Optional[List[str]] = None,
+                          columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    :param paths: A dictionary with the path (without extension) of the processed file of each city.
+    :param cities: Keys of the cities to read. None reads all of them.
+    :param columns: Columns to read. None reads all of them.
+    :return: A dictionary with the processed data of each requested city.
+    """
+    cities = list(paths) if cities is None else list(cities)
+    unknown_cities = [city for city in cities if city not in paths]
+    if len(unknown_cities) > 0:
+        raise ValueError(f"Cities {unknown_cities} are invalid. Valid cities are {list(paths)}.")
+
+    return {city: read_processed_parquet(f"{paths[city]}.parquet", columns=columns) for city in cities}
+
+
+class ProcessedCitiesMixin(object):
+    """
+    Loading of the processed files of the cities of a dataset, shared by the dataset classes so they read, cache and
+    time the files the same way. The classes define _processed_dataset_paths and the stats and processed_data
+    attributes.
+    """
+
+    stats: LoaderStats
+    processed_data: Dict[str, pd.DataFrame]
+
+    def _processed_dataset_paths(self) -> Dict[str, str]:
+        """
+        :return: A dictionary with the path (without extension) of the processed file of each city.
+        """
+        raise NotImplementedError
+
+    def _read_processed_files(self,
+                              cities: Optional[List[str]] = None,
+                              columns: Optional[List[str]] = None) -> Dict[str, pd.DataFrame]:
+        with self.stats.stage("read_processed_files") as record:
+            processed_data = load_processed_cities(self._processed_dataset_paths(), cities=cities, columns=columns)
+            record.num_rows = sum(data.shape[0] for data in processed_data.values())
+
+        return processed_data
+
+    def _load_all_processed_data(self, cities: Optional[List[str]] = None):
+        self.processed_data.update(self._read_processed_files(cities=cities))
+
+    def load_processed_data(self,
+                            reload: bool = False,
+                            cities: Optional[List[str]] = None,
+                            columns: Optional[List[str]] = None) -> Dict:
+        """
+
+        :param reload: If True, then the data is read again from the files.
+        :param cities: Keys of the cities to load. None loads all of them.
+        :param columns: Columns to load (the index is always loaded). None loads all of them. Only the requested
+        columns are read from the files and converted from kW to MW, and they are not kept in processed_data.
+        :return: A dictionary with the processed data of each requested city.
+        """
+        paths = self._processed_dataset_paths()
+        cities = list(paths) if cities is None else list(cities)
+
+        if columns is not None:
+            if not reload and all(city in self.processed_data for city in cities):
+                return {city: self.processed_data[city][columns] for city in cities}
+
+            return self._read_processed_files(cities=cities, columns=columns)
+
+        cities_to_load = [city for city in cities if reload or city not in self.processed_data]
+        if len(cities_to_load) > 0:
+            self._load_all_processed_data(cities=cities_to_load)
+
+        return {city: self.processed_data[city] for city in cities}
+
+    def load_aggregation_cube(self, reload: bool = False, measures: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Aggregates the processed data of all the cities by season, day of the week, hour and month in a single
+        grouping pass. The cube is cached in AGGREGATION_CACHE_DIR and rebuilt when the processed files change.
+
+        :param reload: If True, then the cube is rebuilt even if it is cached.
+        :param measures: Columns to aggregate. None aggregates DEFAULT_CUBE_MEASURES.
+        :return: The aggregation cube, see src.aggregation.build_aggregation_cube.
+        """
+        # src.aggregation reads the processed files through this module, so it is imported here.
+        from src.aggregation import AGGREGATION_CACHE_DIR, DEFAULT_CUBE_MEASURES, load_aggregation_cube
+
+        return load_aggregation_cube(self._processed_dataset_paths(),
+                                     cache_dir=os.path.join(AGGREGATION_CACHE_DIR, type(self).__name__),
+                                     measures=DEFAULT_CUBE_MEASURES if measures is None else measures,
+                                     reload=reload)
@@ -0,0 +1,590 @@
+import itertools
+import json
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.cache import read_excel_cached
+from src.degree_days import day_codes, daily_means, normalized_degree_days
+from src.dispatch import simulate_dispatch
+from src.functions import SECONDS_IN_YEAR, fit_sinusoids, fitting_curve, ground_temperature
+
+
+SIMULATION_VALUES_PATH: str = os.path.join(".", "data", "simulation_values.json")
+
+# User-defined thermal load of the processing notebook, a typical heating and cooling load (in MW) per month.
+THERMAL_LOAD_PATH: str = os.path.join(".", "data", "insPire", "thermal_demand_monthly.xlsx")
+THERMAL_LOAD_COLUMNS = ["heating_profile", "cooling_profile"]
+
+# Ground model used by the processing notebook: Kusuda with the ground at 1m and a diffusivity of 7e-7 m^2/s.
+GROUND_DEPTH: float = 1.0
+GROUND_DIFFUSIVITY: float = 7e-7
+
+# Climatic curve, the space heating system works between these outdoor temperatures.
+CLIMATIC_CURVE_MIN_OUTDOOR_TEMP: float = 2.38
+CLIMATIC_CURVE_MAX_OUTDOOR_TEMP: float = 7.25
+
+# Safety factors for oversizing. Source: Flexynets tool
+SF_CENT_HEATER: float = 1.0
+SF_CHILLER_EL: float = 1.1
+SF_COOL_TOWER: float = 1.0
+DF_HPS: float = 1.0
+SF_HPS: float = 1.1
+
+# In the Flexynets tool, the cooling tower consumes 2% of the heat it rejects as electricity.
+COOL_TOWER_EL_RATIO: float = 0.02
+
+# Technologies of the cost tables, in the order of the capacities used to size them.
+COST_TECHNOLOGIES = ["SHP_Boiler_Natural_gas", "Waste_heat_LT", "Ground_source_aq", "Chiller", "Cool_tower"]
+
+# Hourly columns of the city datasets used by the simulation. Only the InsPire cities have all of them, the NOAA2010
+# and Ospitaletto cities lack the hourly SH and SC consumption ratios and the carbon emissions profile.
+CITY_INPUT_COLUMNS = ["air_temp", "%SH_y", "%DHW_y", "SH_hourly_consumption_ratio", "DHW_hourly_consumption_ratio",
+                      "SC_hourly_consumption_ratio", "Carbon_emissions_profile", "El_price_ind", "Gas_price_ind",
+                      "WH_price", "CO2_gas", "hourofyear"]
+
+# Scalars of the fit of the ambient temperature that drive the ground model.
+AMBIENT_FIT_SCALARS = ["Tg_und", "DT_y", "dd_min", "dd_max"]
+
+DEMAND_COLUMNS = ["SH_dist", "DHW_dist", "Thermal_consumption", "SC_consumption", "space_heating_temp", "user_temp"]
+
+SWEEP_RESULT_COLUMNS = ["E_heat_demand", "E_cool_demand", "E_source1", "E_source2", "E_aquifer", "E_aux_heater",
+                        "E_cool_aux", "Q_cool_tower", "E_el_hps", "E_el_chiller", "E_el_cool_tower",
+                        "heat_peak", "network_peak", "aux_heat_cap", "aux_chiller_cap", "aux_ctower_cap",
+                        "rev_hps_cap", "CO2_hps", "CO2_chiller", "CO2_cool_tower", "CO2_aux_heater", "CO2_total",
+                        "OPEX_source1", "OPEX_source2", "OPEX_aux_heater", "OPEX_chiller", "OPEX_cool_tower",
+                        "OPEX_rev_hps", "OPEX_total", "CAPEX_annual_total"]
+
+_WORKER_INPUTS: Dict[str, Dict[str, Any]] = dict()
+_WORKER_TECHNOLOGY_COSTS: Optional[pd.DataFrame] = None
+
+
+def load_simulation_values(path: str = SIMULATION_VALUES_PATH) -> Dict[str, Any]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def parameter_grid(base_values: Dict[str, Any], grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """
+    :param base_values: Design point with every simulation value, e.g., the content of simulation_values.json.
+    :param grid: A dictionary that maps some keys of base_values to the values they take.
+    :return: A list with one copy of base_values for each combination of the grid values.
+    """
+    _check_parameter_keys(base_values, grid)
+
+    keys = list(grid.keys())
+    return [{**base_values, **dict(zip(keys, combination))}
+            for combination in itertools.product(*[grid[key] for key in keys])]
+
+
+def sample_parameters(base_values: Dict[str, Any],
+                      ranges: Dict[str, Tuple[float, float]],
+                      num_samples: int,
+                      seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    :param base_values: Design point with every simulation value, e.g., the content of simulation_values.json.
+    :param ranges: A dictionary that maps some keys of base_values to the (low, high) range they are sampled from.
+    :param num_samples: Number of scenarios to sample.
+    :param seed: Seed of the random generator.
+    :return: A list with num_samples copies of base_values, each one with values sampled uniformly from the ranges.
+    """
+    _check_parameter_keys(base_values, ranges)
+
+    random_state = np.random.RandomState(seed)
+    samples = {key: random_state.uniform(low, high, size=num_samples) for key, (low, high) in ranges.items()}
+
+    return [{**base_values, **{key: float(values[i]) for key, values in samples.items()}}
+            for i in range(num_samples)]
+
+
+def _check_parameter_keys(base_values: Dict[str, Any], parameters: Dict[str, Any]):
+    unknown_keys = set(parameters) - set(base_values)
+    if len(unknown_keys) > 0:
+        raise ValueError(f"Keys {sorted(unknown_keys)} are not simulation values. "
+                         f"Valid keys are {sorted(base_values)}.")
+
+
+def load_technology_costs(capex_path: str = os.path.join(".", "data", "data_SteamGenerationData_CAPEX.csv"),
+                          opex_path: str = os.path.join(".", "data", "data_SteamGenerationData_OPEX.csv"),
+                          country: str = "Italy",
+                          year: int = 2015,
+                          capacity: int = 10000) -> pd.DataFrame:
+    """
+    Reads the CAPEX, O&M cost and lifetime of the central technologies, the same way as the processing notebook.
+
+    :return: A DataFrame indexed by technology name with the CAPEX, OM_Cost and lifetime columns.
+    """
+    capex = pd.read_csv(capex_path, delimiter=";")
+    capex = capex[(capex.Country == country) & (capex.year == year) & (capex.Capacity == capacity)]
+
+    opex = pd.read_csv(opex_path, delimiter=";")
+    opex = opex[opex.Technology_Name.isin(COST_TECHNOLOGIES)].set_index("Technology_Name")
+
+    return pd.DataFrame({"CAPEX": [float(capex[technology].values[0]) for technology in COST_TECHNOLOGIES],
+                         "OM_Cost": opex.loc[COST_TECHNOLOGIES, "OM_Cost"].astype(float).to_numpy(),
+                         "lifetime": opex.loc[COST_TECHNOLOGIES, "lifetime"].astype(float).to_numpy()},
+                        index=pd.Index(COST_TECHNOLOGIES, name="Technology_Name"))
+
+
+def load_thermal_load(path: str = THERMAL_LOAD_PATH, year: int = 2017) -> pd.DataFrame:
+    """
+    Reads the user-defined thermal load and broadcasts the load of each month to its hours, the same way as the
+    processing notebook.
+
+    :param path: Excel file with one row per month and the THERMAL_LOAD_COLUMNS.
+    :param year: Year of the hours, the one of the city datasets.
+    :return: A DataFrame indexed by the hours of the year with the THERMAL_LOAD_COLUMNS. The first hour of the next
+    year, which the InsPire cities include, is not covered, so its load is NaN once aligned with a city.
+    """
+    monthly = read_excel_cached(path)[THERMAL_LOAD_COLUMNS]
+    monthly.index = pd.date_range(start=f"{year}-01-01", freq="MS", periods=12)
+    hours = pd.date_range(start=f"{year}-01-01 00:00", end=f"{year}-12-31 23:00", freq="H", name="timestamp")
+    return monthly.reindex(hours, method="ffill").astype(np.float64)
+
+
+def annuity_payment(rate: float, num_periods: float, present_value: np.ndarray) -> np.ndarray:
+    """
+    Same as numpy_financial.pmt(rate, num_periods, present_value), payments are negative.
+    """
+    present_value = np.asarray(present_value, dtype=np.float64)
+    if rate == 0:
+        return -present_value / num_periods
+
+    return -present_value * rate / (1 - (1 + rate) ** -np.asarray(num_periods, dtype=np.float64))
+
+
+def prepare_city_inputs(dataset: pd.DataFrame, thermal_load: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+    """
+    Extracts the hourly arrays needed by the simulation from the data of a city and fits the ambient temperature
+    curve that drives the ground model. These do not depend on the simulation values, so they are computed once per
+    city and shared by every scenario.
+
+    :param dataset: Hourly data of a city with the CITY_INPUT_COLUMNS, e.g., as returned by InsPireDataset. The
+    cities of NOAA2010Dataset and OspitalettoDataset are not supported: they lack some of these columns (e.g., the
+    carbon emissions profile), even with a user-defined thermal load.
+    :param thermal_load: Optional user-defined hourly heating_profile and cooling_profile columns (in MW), aligned with
+    dataset. If given, they replace the degree-days distribution of the demand, as in the processing notebook.
+    :return: A dictionary with the hourly arrays and the scalar values of the city.
+    """
+    missing_columns = [column for column in CITY_INPUT_COLUMNS if column not in dataset.columns]
+    if len(missing_columns) > 0:
+        raise ValueError(f"The city data lacks the columns {missing_columns} needed by the simulation. Only the "
+                         f"cities of InsPireDataset provide all of them, NOAA2010Dataset and OspitalettoDataset "
+                         f"cities are not supported.")
+
+    index = dataset.index
+    inputs: Dict[str, Any] = {column: dataset[column].to_numpy(dtype=np.float64) for column in CITY_INPUT_COLUMNS}
+    inputs["timestamp"] = index.values.astype("datetime64[ns]").astype(np.int64)
+
+    # Daily values are broadcast to the hours through the position of their day.
+    inputs["day_code"], days = day_codes(index)
+    inputs["daily_air_temp"] = daily_means(inputs["air_temp"], inputs["day_code"], len(days))[0]
+
+    if thermal_load is not None:
+        inputs["heating_profile"] = thermal_load["heating_profile"].reindex(index).to_numpy(dtype=np.float64)
+        inputs["cooling_profile"] = thermal_load["cooling_profile"].reindex(index).to_numpy(dtype=np.float64)
+
+    fit = fit_ambient_temperature(index, inputs["air_temp"], inputs["hourofyear"])
+    inputs.update({key: fit[key] for key in AMBIENT_FIT_SCALARS})
+
+    return inputs
+
+
+def fit_ambient_temperature(index: pd.DatetimeIndex, air_temp: np.ndarray, hourofyear: np.ndarray) -> Dict[str, Any]:
+    """
+    Fits the ambient temperature curve that drives the ground model, see the processing notebook.
+
+    :param index: Hourly timestamps of the city.
+    :param air_temp: Hourly air temperatures.
+    :param hourofyear: Hour of the year (starting at 1) of each timestamp.
+    :return: A dictionary with the hourly air_temp_fit curve and the AMBIENT_FIT_SCALARS.
+    """
+    num_hours = len(index)
+    fit = fit_sinusoids(np.arange(num_hours), np.asarray(air_temp, dtype=np.float64), period=num_hours).iloc[0]
+    T_ave_fit, DT_y_fit, phi = fit.disp, fit.amp, fit.phi
+    air_temp_fit = np.asarray(fitting_curve(np.asarray(hourofyear), T_ave_fit, DT_y_fit, num_hours, phi))
+
+    return {"air_temp_fit": air_temp_fit,
+            "Tg_und": float(T_ave_fit),
+            "DT_y": float(abs(DT_y_fit)),
+            "dd_min": int(index[np.argmin(air_temp_fit)].dayofyear),
+            "dd_max": int(index[np.argmax(air_temp_fit)].dayofyear)}
+
+
+def _save_city_inputs(inputs: Dict[str, Any], folder: str):
+    os.makedirs(folder, exist_ok=True)
+    scalars = dict()
+    for key, value in inputs.items():
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(folder, f"{key}.npy"), value)
+        else:
+            scalars[key] = value
+
+    with open(os.path.join(folder, "scalars.json"), "w") as f:
+        json.dump(scalars, f)
+
+
+def _open_city_inputs(folder: str) -> Dict[str, Any]:
+    # Memory-mapped, so every worker reads the same pages of the OS cache instead of holding its own copy.
+    with open(os.path.join(folder, "scalars.json"), "r") as f:
+        inputs = json.load(f)
+
+    for filename in os.listdir(folder):
+        if filename.endswith(".npy"):
+            inputs[filename[:-len(".npy")]] = np.load(os.path.join(folder, filename), mmap_mode="r")
+
+    return inputs
+
+
+def _initialize_worker(inputs_folder: str, city_keys: List[str], technology_costs: Optional[pd.DataFrame]):
+    global _WORKER_TECHNOLOGY_COSTS
+
+    for city_key in city_keys:
+        _WORKER_INPUTS[city_key] = _open_city_inputs(os.path.join(inputs_folder, city_key))
+    _WORKER_TECHNOLOGY_COSTS = technology_costs
+
+
+def distribute_demand(inputs: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    Distributes the yearly heating and cooling demand over the hours (see hourly_demand) and computes the temperature
+    required by the users through the climatic curve.
+
+    :param inputs: Inputs of the city as returned by prepare_city_inputs.
+    :param values: Simulation values, with the same keys as simulation_values.json.
+    :return: A dictionary with the hourly DEMAND_COLUMNS.
+    """
+    demand = hourly_demand(inputs, values)
+    space_heating_temp = climatic_curve(np.asarray(inputs["air_temp"]), values["Tmin_i"], values["Tmax_i"])
+    user_temp = users_temperature(demand["SH_dist"], demand["DHW_dist"], demand["Thermal_consumption"],
+                                  space_heating_temp, values["Tdhw"])
+
+    return {**demand, "space_heating_temp": space_heating_temp, "user_temp": user_temp}
+
+
+def hourly_demand(inputs: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    Distributes the yearly heating and cooling demand over the hours according to the degree days and the hourly
+    profiles, or takes the user-defined thermal load.
+
+    :param inputs: Inputs of the city as returned by prepare_city_inputs.
+    :param values: Simulation values, with the same keys as simulation_values.json.
+    :return: A dictionary with the hourly SH_dist, DHW_dist, Thermal_consumption and SC_consumption.
+    """
+    day_code = np.asarray(inputs["day_code"])
+    daily_air_temp = np.asarray(inputs["daily_air_temp"])
+
+    # Without degree days the distribution is undefined (NaN), as in the processing notebook.
+    heating_degree_days = normalized_degree_days(daily_air_temp, values["T_base_heat_degree"], "heating")[0, 0]
+    cooling_degree_days = normalized_degree_days(daily_air_temp, values["T_base_cool_degree"], "cooling")[0, 0]
+
+    if "heating_profile" in inputs:
+        thermal_consumption = np.asarray(inputs["heating_profile"])
+        sh_dist = thermal_consumption * inputs["%SH_y"]
+        dhw_dist = thermal_consumption * inputs["%DHW_y"]
+        sc_consumption = np.asarray(inputs["cooling_profile"])
+    else:
+        sh_dist = (values["Heat_year"] * inputs["%SH_y"] * inputs["SH_hourly_consumption_ratio"]
+                   * heating_degree_days[day_code])
+        dhw_dist = values["Heat_year"] * inputs["%DHW_y"] * inputs["DHW_hourly_consumption_ratio"] / 365
+        thermal_consumption = sh_dist + dhw_dist
+        sc_consumption = (values["Cool_year"] * inputs["SC_hourly_consumption_ratio"]
+                          * cooling_degree_days[day_code])
+
+    return {"SH_dist": sh_dist,
+            "DHW_dist": dhw_dist,
+            "Thermal_consumption": thermal_consumption,
+            "SC_consumption": sc_consumption}
+
+
+def climatic_curve(air_temp: np.ndarray, Tmin_i: float, Tmax_i: float) -> np.ndarray:
+    """
+    :return: The supply temperature of the space heating system for each outdoor temperature, Tmax_i below
+    CLIMATIC_CURVE_MIN_OUTDOOR_TEMP, Tmin_i above CLIMATIC_CURVE_MAX_OUTDOOR_TEMP and linear in between.
+    """
+    air_temp = np.asarray(air_temp)
+    m = (Tmax_i - Tmin_i) / (CLIMATIC_CURVE_MIN_OUTDOOR_TEMP - CLIMATIC_CURVE_MAX_OUTDOOR_TEMP)
+    b = -m * CLIMATIC_CURVE_MIN_OUTDOOR_TEMP + Tmax_i
+    return np.where(air_temp <= CLIMATIC_CURVE_MIN_OUTDOOR_TEMP,
+                    Tmax_i,
+                    np.where(air_temp >= CLIMATIC_CURVE_MAX_OUTDOOR_TEMP, Tmin_i, m * air_temp + b))
+
+
+def users_temperature(sh_dist: np.ndarray,
+                      dhw_dist: np.ndarray,
+                      thermal_consumption: np.ndarray,
+                      space_heating_temp: np.ndarray,
+                      Tdhw: float) -> np.ndarray:
+    """
+    :return: The temperature required by the users, the mean of the space heating and the domestic hot water
+    temperatures weighted by their share of the thermal consumption. NaN when there is no consumption.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (np.asarray(sh_dist) / thermal_consumption * space_heating_temp
+                + np.asarray(dhw_dist) / thermal_consumption * Tdhw)
+
+
+def ground_and_aquifer_temperatures(inputs: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    :param inputs: Hour of the year and ambient fit (Tg_und, DT_y and dd_min) of the city, see prepare_city_inputs.
+    :param values: Simulation values, with the same keys as simulation_values.json.
+    :return: A dictionary with the hourly ground_temp and aquifer_temp of the Kusuda model.
+    """
+    temperatures = ground_temperature(np.asarray(inputs["hourofyear"]) * 3600,
+                                      depths=[GROUND_DEPTH, values["depth_aquifer"]],
+                                      diffusivities=[GROUND_DIFFUSIVITY],
+                                      Tg_und=inputs["Tg_und"],
+                                      DT_y=inputs["DT_y"],
+                                      d_shift=inputs["dd_min"] * 24 * 3600,
+                                      period=SECONDS_IN_YEAR,
+                                      model="kusuda")
+
+    return {"ground_temp": temperatures[0, 0], "aquifer_temp": temperatures[1, 0]}
+
+
+def dispatch_network(dataset: pd.DataFrame, values: Dict[str, Any]) -> pd.DataFrame:
+    """
+    :param dataset: Hourly data with the columns required by simulate_dispatch.
+    :param values: Simulation values, with the same keys as simulation_values.json.
+    :return: The hourly operation of the network, see simulate_dispatch.
+    """
+    return simulate_dispatch(dataset,
+                             s1_schedule=np.array(values["s1_schedule"]),
+                             s2_schedule=np.array(values["s2_schedule"]),
+                             Ts1=values["Ts1"],
+                             Ts2=values["Ts2"],
+                             cap_source1=values["cap_source1"],
+                             cap_source2=values["cap_source2"],
+                             cap_ground=values["cap_ground"],
+                             DT_evap=values["DT_evap"])
+
+
+def scenario_metrics(inputs: Dict[str, Any],
+                     values: Dict[str, Any],
+                     dataset: pd.DataFrame,
+                     result: pd.DataFrame,
+                     technology_costs: Optional[pd.DataFrame] = None) -> Dict[str, float]:
+    """
+    :param inputs: Hourly prices and emission factors of the city, see prepare_city_inputs.
+    :param values: Simulation values, with the same keys as simulation_values.json.
+    :param dataset: Hourly Thermal_consumption and SC_consumption.
+    :param result: Hourly operation of the network as returned by simulate_dispatch.
+    :param technology_costs: Costs of the central technologies as returned by load_technology_costs. If None, then
+    the annualized capital costs are NaN.
+    :return: A dictionary with the annual energy, peak, emission and cost SWEEP_RESULT_COLUMNS values.
+    """
+    carbon_emissions = pd.Series(np.asarray(inputs["Carbon_emissions_profile"]), index=dataset.index)
+    el_price_ind = np.max(inputs["El_price_ind"])
+    thermal_consumption = dataset.Thermal_consumption
+    E_el_total = thermal_consumption / result.COP + dataset.SC_consumption / result.EER_cool
+    E_el_cool_tower = result.Q_cool_tower.sum() * COOL_TOWER_EL_RATIO
+
+    metrics = {"E_heat_demand": thermal_consumption.sum(),
+               "E_cool_demand": dataset.SC_consumption.sum(),
+               "E_source1": result.heat_source1.sum(),
+               "E_source2": result.heat_source2.sum(),
+               "E_aquifer": result.heat_aquifer.sum(),
+               "E_aux_heater": result.heat_aux_heater.sum(),
+               "E_cool_aux": result.cool_aux.sum(),
+               "Q_cool_tower": result.Q_cool_tower.sum(),
+               "E_el_hps": E_el_total.sum(),
+               "E_el_chiller": result.E_el_chiller.sum(),
+               "E_el_cool_tower": E_el_cool_tower,
+               "heat_peak": np.round(thermal_consumption.max()),
+               "network_peak": np.round(result.Q_net.max()),
+               "aux_heat_cap": np.round(result.heat_aux_heater.max() * SF_CENT_HEATER),
+               "aux_chiller_cap": result.E_el_chiller.max() * SF_CHILLER_EL,
+               "aux_ctower_cap": np.round(result.Q_cool_tower.max() * SF_COOL_TOWER),
+               "rev_hps_cap": E_el_total.max() / DF_HPS * SF_HPS,
+               "CO2_hps": (E_el_total * carbon_emissions / 1000).sum(),
+               "CO2_chiller": (result.E_el_chiller * carbon_emissions / 1000).sum(),
+               "CO2_cool_tower": (result.Q_cool_tower * COOL_TOWER_EL_RATIO * carbon_emissions / 1000).sum(),
+               "CO2_aux_heater": (result.heat_aux_heater * np.asarray(inputs["CO2_gas"]) / 1000).sum(),
+               "OPEX_source1": (result.heat_source1 * np.asarray(inputs["WH_price"])).sum(),
+               "OPEX_source2": (result.heat_source2 * np.asarray(inputs["WH_price"])).sum(),
+               "OPEX_aux_heater": result.heat_aux_heater.sum() * np.max(inputs["Gas_price_ind"]) * 1000,
+               "OPEX_chiller": result.E_el_chiller.sum() * el_price_ind * 1000,
+               "OPEX_cool_tower": E_el_cool_tower * el_price_ind * 1000,
+               "OPEX_rev_hps": (E_el_total * np.asarray(inputs["El_price_ind"]) * 1000).sum()}
+
+    metrics["CO2_total"] = (metrics["CO2_hps"] + metrics["CO2_chiller"] + metrics["CO2_cool_tower"]
+                            + metrics["CO2_aux_heater"])
+    metrics["OPEX_total"] = (metrics["OPEX_source1"] + metrics["OPEX_source2"] + metrics["OPEX_aux_heater"]
+                             + metrics["OPEX_chiller"] + metrics["OPEX_cool_tower"] + metrics["OPEX_rev_hps"])
+
+    if technology_costs is None:
+        metrics["CAPEX_annual_total"] = np.nan
+    else:
+        # Capacities in the order of COST_TECHNOLOGIES.
+        capacities = np.array([metrics["aux_heat_cap"],
+                               values["cap_source1"] + values["cap_source2"],
+                               values["cap_ground"],
+                               metrics["aux_chiller_cap"],
+                               metrics["aux_ctower_cap"]], dtype=np.float64)
+        costs = technology_costs.loc[COST_TECHNOLOGIES]
+        investment = annuity_payment(values["Interest_Rate"], costs.lifetime.to_numpy(),
+                                     costs.CAPEX.to_numpy() * capacities)
+        fixed_costs = annuity_payment(values["Interest_Rate"], costs.lifetime.to_numpy(),
+                                      costs.CAPEX.to_numpy() * costs.OM_Cost.to_numpy() * capacities)
+        metrics["CAPEX_annual_total"] = float(np.sum(investment + fixed_costs))
+
+    return {column: float(metrics[column]) for column in SWEEP_RESULT_COLUMNS}
+
+
+def simulate_scenario(inputs: Dict[str, Any],
+                      values: Dict[str, Any],
+                      technology_costs: Optional[pd.DataFrame] = None) -> Dict[str, float]:
+    """
+    Runs the hourly year of the processing notebook for a city and a set of simulation values: the demand
+    distribution, the users temperature, the ground and aquifer temperatures, the network dispatch and the annual
+    energy, peak, emission and cost figures.
+
+    :param inputs: Inputs of the city as returned by prepare_city_inputs.
+    :param values: Simulation values, with the same keys as simulation_values.json.
+    :param technology_costs: Costs of the central technologies as returned by load_technology_costs. If None, then
+    the annualized capital costs are NaN.
+    :return: A dictionary with the SWEEP_RESULT_COLUMNS values.
+    """
+    demand = distribute_demand(inputs, values)
+    temperatures = ground_and_aquifer_temperatures(inputs, values)
+
+    dataset = pd.DataFrame({"air_temp": np.asarray(inputs["air_temp"]),
+                            "user_temp": demand["user_temp"],
+                            "ground_temp": temperatures["ground_temp"],
+                            "aquifer_temp": temperatures["aquifer_temp"],
+                            "Thermal_consumption": demand["Thermal_consumption"],
+                            "SC_consumption": demand["SC_consumption"]},
+                           index=pd.DatetimeIndex(np.asarray(inputs["timestamp"]).astype("datetime64[ns]")))
+    result = dispatch_network(dataset, values)
+
+    return scenario_metrics(inputs, values, dataset, result, technology_costs)
+
+
+def _simulate_scenarios_batch(city_key: str, scenarios: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return [{"scenario_id": scenario_id,
+             "city": city_key,
+             **simulate_scenario(_WORKER_INPUTS[city_key], values, _WORKER_TECHNOLOGY_COSTS)}
+            for scenario_id, values in scenarios]
+
+
+def _scalar_parameter_keys(scenarios: List[Dict[str, Any]]) -> List[str]:
+    return sorted(key for key, value in scenarios[0].items() if isinstance(value, (int, float)))
+
+
+class _ResultsWriter(object):
+    """
+    Appends batches of result rows to a parquet or a CSV file, so the results of a sweep never need to fit in
+    memory.
+    """
+
+    def __init__(self, path: str, columns: List[str]):
+        self._path = path
+        self._columns = columns
+        self._is_csv = path.endswith(".csv")
+        self._parquet_writer: Optional[pq.ParquetWriter] = None
+        self._schema = pa.schema([("scenario_id", pa.int64()), ("city", pa.string())]
+                                 + [(column, pa.float64()) for column in columns[2:]])
+
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+        if self._is_csv:
+            pd.DataFrame(columns=columns).to_csv(path, index=False)
+        else:
+            self._parquet_writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: List[Dict[str, Any]]):
+        data = pd.DataFrame(rows, columns=self._columns)
+        if self._is_csv:
+            data.to_csv(self._path, mode="a", header=False, index=False)
+        else:
+            self._parquet_writer.write_table(pa.Table.from_pandas(data, schema=self._schema, preserve_index=False))
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def run_sweep(datasets: Dict[str, pd.DataFrame],
+              scenarios: List[Dict[str, Any]],
+              output_path: str,
+              num_workers: int = 1,
+              batch_size: int = 16,
+              thermal_loads: Optional[Dict[str, pd.DataFrame]] = None,
+              technology_costs: Optional[pd.DataFrame] = None) -> str:
+    """
+    Simulates every scenario on every city and streams one row per (scenario, city) to output_path with the
+    scalar simulation values of the scenario followed by the SWEEP_RESULT_COLUMNS.
+
+    The hourly inputs of the cities are prepared once and written to memory-mapped files that the worker processes
+    open when they start, so they are not pickled with each task. At most 2 * num_workers batches are in flight at
+    any time and the rows are written in scenario order.
+
+    :param datasets: A dictionary with the hourly data of each city, e.g., InsPireDataset().load_data(). See
+    prepare_city_inputs for the supported cities.
+    :param scenarios: Simulation values of each scenario, e.g., from parameter_grid or sample_parameters.
+    :param output_path: A parquet file, or a CSV file if it ends with .csv.
+    :param num_workers: Number of processes. If it is 1, then the scenarios run in the current process.
+    :param batch_size: Number of scenarios that each task simulates.
+    :param thermal_loads: Optional user-defined thermal loads for some cities, see prepare_city_inputs.
+    :param technology_costs: Optional costs of the central technologies, see load_technology_costs.
+    :return: output_path.
+    """
+    if len(scenarios) == 0:
+        raise ValueError("There are no scenarios to simulate.")
+
+    thermal_loads = thermal_loads or dict()
+    inputs = {city_key: prepare_city_inputs(dataset, thermal_load=thermal_loads.get(city_key))
+              for city_key, dataset in datasets.items()}
+
+    parameter_keys = _scalar_parameter_keys(scenarios)
+    writer = _ResultsWriter(output_path, ["scenario_id", "city", *parameter_keys, *SWEEP_RESULT_COLUMNS])
+
+    tasks = [(city_key, [(scenario_id, scenarios[scenario_id])
+                         for scenario_id in range(start, min(start + batch_size, len(scenarios)))])
+             for start in range(0, len(scenarios), batch_size)
+             for city_key in inputs]
+
+    def to_rows(batch_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [{**{key: scenarios[row["scenario_id"]][key] for key in parameter_keys}, **row}
+                for row in batch_results]
+
+    try:
+        if num_workers <= 1:
+            _initialize_worker_in_process(inputs, technology_costs)
+            for city_key, batch in tasks:
+                writer.write(to_rows(_simulate_scenarios_batch(city_key, batch)))
+        else:
+            with tempfile.TemporaryDirectory() as inputs_folder:
+                for city_key, city_inputs in inputs.items():
+                    _save_city_inputs(city_inputs, os.path.join(inputs_folder, city_key))
+
+                with ProcessPoolExecutor(max_workers=num_workers,
+                                         initializer=_initialize_worker,
+                                         initargs=(inputs_folder, list(inputs), technology_costs)) as executor:
+                    pending_tasks = deque()
+                    next_task = 0
+                    while next_task < len(tasks) or len(pending_tasks) > 0:
+                        while next_task < len(tasks) and len(pending_tasks) < 2 * num_workers:
+                            pending_tasks.append(executor.submit(_simulate_scenarios_batch, *tasks[next_task]))
+                            next_task += 1
+
+                        writer.write(to_rows(pending_tasks.popleft().result()))
+    finally:
+        writer.close()
+
+    return output_path
+
+
+def _initialize_worker_in_process(inputs: Dict[str, Dict[str, Any]], technology_costs: Optional[pd.DataFrame]):
+    global _WORKER_TECHNOLOGY_COSTS
+
+    _WORKER_INPUTS.clear()
+    _WORKER_INPUTS.update(inputs)
+    _WORKER_TECHNOLOGY_COSTS = technology_costs
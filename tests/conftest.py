@@ -0,0 +1,79 @@
+import os
+import threading
+import zlib
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from functools import partial
+from typing import Iterator, List, Tuple
+
+import pytest
+
+from benchmarks.synthetic import write_inspire_dataset
+
+
+class StandInRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the files of a folder like http.server, plus the ETag, If-None-Match, Range and If-Range headers used by
+    the ECA&D downloads. The status of every request is appended to the statuses list of the server.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.server.statuses.append(404)
+            self.send_error(404)
+            return
+
+        with open(path, "rb") as f:
+            content = f.read()
+        etag = f'"{zlib.crc32(content):08x}-{len(content)}"'
+
+        status, body = 200, content
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        elif range_header is not None and (if_range is None or if_range == etag):
+            start = int(range_header.split("=")[1].split("-")[0])
+            status, body = (416, b"") if start >= len(content) else (206, content[start:])
+
+        self.server.statuses.append(status)
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.date_time_string(int(os.path.getmtime(path))))
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {len(content) - len(body)}-{len(content) - 1}/{len(content)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def http_stand_in(tmp_path) -> Iterator[Tuple[str, str, List[int]]]:
+    """
+    :return: The folder served, its URL and the statuses of the requests.
+    """
+    folder = tmp_path / "remote"
+    folder.mkdir()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(StandInRequestHandler, directory=str(folder)))
+    server.statuses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield str(folder), f"http://127.0.0.1:{server.server_address[1]}", server.statuses
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(scope="session")
+def inspire_root(tmp_path_factory) -> str:
+    """
+    :return: A folder with the synthetic InsPire workbooks under data/insPire, written once per session. The datasets
+    read from ./data, so tests change to this folder before loading them.
+    """
+    root = str(tmp_path_factory.mktemp("inspire"))
+    write_inspire_dataset(root)
+    return root
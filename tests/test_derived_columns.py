@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.InsPireDataset import InsPireDataset
+from src.derived_columns import DerivedFrame
+from src.dispatch import simulate_dispatch
+from src.sweep import distribute_demand, ground_and_aquifer_temperatures, load_simulation_values, prepare_city_inputs
+
+
+SIMULATION_VALUES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data",
+                                      "simulation_values.json")
+
+
+@pytest.fixture
+def rome(inspire_root, monkeypatch) -> pd.DataFrame:
+    monkeypatch.chdir(inspire_root)
+    return InsPireDataset().load_data(lazy=True)[InsPireDataset.ROME_IT]
+
+
+def _simulated_dispatch(data: pd.DataFrame, values: dict) -> pd.DataFrame:
+    # As simulate_scenario, with the demand and temperatures of the city computed once for the values.
+    inputs = prepare_city_inputs(data)
+    demand = distribute_demand(inputs, values)
+    temperatures = ground_and_aquifer_temperatures(inputs, values)
+    dataset = pd.DataFrame({"air_temp": inputs["air_temp"],
+                            "user_temp": demand["user_temp"],
+                            "ground_temp": temperatures["ground_temp"],
+                            "aquifer_temp": temperatures["aquifer_temp"],
+                            "Thermal_consumption": demand["Thermal_consumption"],
+                            "SC_consumption": demand["SC_consumption"]},
+                           index=data.index)
+    return simulate_dispatch(dataset, values["s1_schedule"], values["s2_schedule"], values["Ts1"], values["Ts2"],
+                             values["cap_source1"], values["cap_source2"], values["cap_ground"], values["DT_evap"])
+
+
+def test_q_net_matches_simulate_dispatch(rome):
+    values = load_simulation_values(SIMULATION_VALUES_PATH)
+    frame = DerivedFrame(rome, values)
+    expected = _simulated_dispatch(rome, values)
+
+    for column in ["COP", "E_loss_tot", "Q_evap", "Q_cond", "Q_net", "heat_source1", "heat_aux_heater"]:
+        np.testing.assert_allclose(frame[column].to_numpy(), expected[column].to_numpy(), rtol=1e-12,
+                                   err_msg=column)
+
+
+def test_set_parameters_recomputes_only_the_dependent_columns(rome):
+    values = load_simulation_values(SIMULATION_VALUES_PATH)
+    frame = DerivedFrame(rome, values)
+    frame["Q_net"]
+    num_evaluations = frame.num_evaluations
+
+    discarded = frame.set_parameters(DT_evap=values["DT_evap"] + 5)
+    assert sorted(discarded) == sorted(["COP", "E_loss_s", "E_loss_r", "E_loss_tot", "Q_evap", "Q_net"])
+    assert frame.is_computed("Thermal_consumption") and frame.is_computed("ground_temp")
+
+    q_net = frame["Q_net"]
+    # COP, the heat losses, Q_evap and Q_net, without the demand nor the ground temperatures.
+    assert frame.num_evaluations == num_evaluations + 4
+    expected = _simulated_dispatch(rome, {**values, "DT_evap": values["DT_evap"] + 5})
+    np.testing.assert_allclose(q_net.to_numpy(), expected["Q_net"].to_numpy(), rtol=1e-12)
+
+    # Setting the same value again discards nothing.
+    assert frame.set_parameters(DT_evap=values["DT_evap"] + 5) == []
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.dispatch import DISPATCH_COLUMNS, simulate_dispatch
+
+
+# Per-row functions of the processing notebook, which simulate_dispatch replaces.
+def _calculate_tnet(temp_s1, temp_s2, temp_aq):
+    if temp_s1 == 0.0 and temp_s2 == 0.0:
+        return temp_aq
+    elif temp_s1 == 0.0:
+        return temp_s2
+    elif temp_s2 == 0.0:
+        return temp_s1
+    else:
+        return np.min([temp_s1, temp_s2])
+
+
+def _heat_losses(T_net, T_gr, DT_evap):
+    U = 13.9 / 1000
+    T_ret = T_net - DT_evap
+    HL_s = (T_net - T_gr) * U
+    HL_r = (T_ret - T_gr) * U
+    return HL_s, HL_r, HL_s + HL_r
+
+
+def _calculate_heatsupply(source1_cap, source2_cap, ground_source_cap, source1_temp, source2_temp, Q_net):
+    heat_source1 = 0.0
+    heat_source2 = 0.0
+    heat_aquifer = 0.0
+    heat_aux_heater = 0.0
+    cool_aux = 0.0
+    if Q_net > 0:
+        if source1_cap == 0.0 and source2_cap == 0.0:
+            if Q_net <= ground_source_cap:
+                heat_aquifer = Q_net
+            else:
+                heat_aquifer = ground_source_cap
+                heat_aux_heater = Q_net - heat_aquifer
+        elif source1_cap == 0.0:
+            if Q_net <= source2_cap:
+                heat_source2 = Q_net
+            elif Q_net <= source2_cap + ground_source_cap:
+                heat_source2 = source2_cap
+                heat_aquifer = Q_net - heat_source2
+            else:
+                heat_source2 = source2_cap
+                heat_aquifer = ground_source_cap
+                heat_aux_heater = Q_net - (heat_source2 + heat_aquifer)
+        elif source2_cap == 0.0:
+            if Q_net <= source1_cap:
+                heat_source1 = Q_net
+            elif Q_net <= source1_cap + ground_source_cap:
+                heat_source1 = source1_cap
+                heat_aquifer = Q_net - heat_source1
+            else:
+                heat_source1 = source1_cap
+                heat_aquifer = ground_source_cap
+                heat_aux_heater = Q_net - (heat_source1 + heat_aquifer)
+        else:
+            if source1_temp > source2_temp:
+                if Q_net <= source1_cap:
+                    heat_source1 = Q_net
+                elif Q_net <= source1_cap + source2_cap:
+                    heat_source1 = source1_cap
+                    heat_source2 = Q_net - source1_cap
+                elif Q_net <= source1_cap + source2_cap + ground_source_cap:
+                    heat_source1 = source1_cap
+                    heat_source2 = source2_cap
+                    heat_aquifer = Q_net - (heat_source1 + heat_source2)
+                else:
+                    heat_source1 = source1_cap
+                    heat_source2 = source2_cap
+                    heat_aquifer = ground_source_cap
+                    heat_aux_heater = Q_net - (heat_source1 + heat_source2 + heat_aquifer)
+            else:
+                if Q_net <= source2_cap:
+                    heat_source2 = Q_net
+                elif Q_net <= source1_cap + source2_cap:
+                    heat_source2 = source2_cap
+                    heat_source1 = Q_net - source2_cap
+                elif Q_net <= source1_cap + source2_cap + ground_source_cap:
+                    heat_source2 = source2_cap
+                    heat_source1 = source1_cap
+                    heat_aquifer = Q_net - (heat_source1 + heat_source2)
+                else:
+                    heat_source1 = source1_cap
+                    heat_source2 = source2_cap
+                    heat_aquifer = ground_source_cap
+                    heat_aux_heater = Q_net - (heat_source1 + heat_source2 + heat_aquifer)
+    else:
+        if -Q_net <= ground_source_cap:
+            heat_aquifer = Q_net
+        else:
+            heat_aquifer = -ground_source_cap
+            cool_aux = -Q_net - ground_source_cap
+
+    return heat_source1, heat_source2, heat_aquifer, heat_aux_heater, cool_aux
+
+
+def _calculate_chiller_el(air_temp, net_temp, cool_aux):
+    if air_temp + 5 >= net_temp:
+        return cool_aux / 10
+    return 0
+
+
+def _calculate_cooltower(air_temp, net_temp, cool_aux, E_el_chiller):
+    if air_temp + 5 <= net_temp:
+        return cool_aux
+    return cool_aux + E_el_chiller
+
+
+def _per_row_dispatch(dataset, s1_schedule, s2_schedule, Ts1, Ts2, cap_source1, cap_source2, cap_ground, DT_evap):
+    # The notebook cells, in order, with the per-row functions applied to each row.
+    DT_hx, n_HP, Te_o_cool, DT_cond = 2.5, 0.49, 10, 10
+    hours = dataset.index.hour
+    dayofweeks = dataset.index.dayofweek
+    data = dataset.copy()
+    data["source1_temp"] = Ts1 * s1_schedule[hours, dayofweeks]
+    data["source2_temp"] = Ts2 * s2_schedule[hours, dayofweeks]
+    data["net_temp"] = data.apply(lambda row: _calculate_tnet(row.source1_temp, row.source2_temp, row.aquifer_temp),
+                                  axis=1)
+
+    Tc_heat = data.user_temp + DT_hx
+    Te_heat = data.net_temp - DT_evap - DT_hx
+    data["COP"] = n_HP * (Tc_heat + 273.15) / (Tc_heat - Te_heat) - n_HP + 1
+    Te_cool = Te_o_cool - DT_hx
+    Tc_cool = data.net_temp + DT_cond + DT_hx
+    data["EER_cool"] = (1 - n_HP + n_HP * (Tc_cool + 273.15) / (Tc_cool - Te_cool)) - 1
+
+    data[["E_loss_s", "E_loss_r", "E_loss_tot"]] = data.apply(
+        lambda row: pd.Series(_heat_losses(row.net_temp, row.ground_temp, DT_evap)), axis=1)
+    data["Q_evap"] = data.Thermal_consumption * (1 - 1 / data.COP)
+    data["Q_cond"] = data.SC_consumption * (1 + 1 / data.EER_cool)
+    data["Q_net"] = data.Q_evap + data.E_loss_tot - data.Q_cond
+
+    data["source1_cap"] = cap_source1 * s1_schedule[hours, dayofweeks]
+    data["source2_cap"] = cap_source2 * s2_schedule[hours, dayofweeks]
+    data["ground_source_cap"] = cap_ground
+    data[["heat_source1", "heat_source2", "heat_aquifer", "heat_aux_heater", "cool_aux"]] = data.apply(
+        lambda row: pd.Series(_calculate_heatsupply(row.source1_cap, row.source2_cap, row.ground_source_cap,
+                                                    row.source1_temp, row.source2_temp, row.Q_net)), axis=1)
+    data["E_el_chiller"] = data.apply(lambda row: _calculate_chiller_el(row.air_temp, row.net_temp, row.cool_aux),
+                                      axis=1)
+    data["Q_cool_tower"] = data.apply(
+        lambda row: _calculate_cooltower(row.air_temp, row.net_temp, row.cool_aux, row.E_el_chiller), axis=1)
+
+    return data
+
+
+@pytest.mark.parametrize("Ts1, Ts2", [(40.0, 30.0), (25.0, 35.0), (30.0, 30.0)])
+def test_simulate_dispatch_matches_per_row_notebook(Ts1, Ts2):
+    rng = np.random.RandomState(0)
+    index = pd.date_range("2019-01-01", periods=8760, freq="H")
+    hours = np.arange(len(index))
+    air_temp = 12 + 10 * np.sin(2 * np.pi * hours / 8760) + rng.normal(0, 4, len(index))
+    dataset = pd.DataFrame({"air_temp": air_temp,
+                            "user_temp": rng.uniform(35, 60, len(index)),
+                            "ground_temp": 13 + 3 * np.sin(2 * np.pi * hours / 8760),
+                            "aquifer_temp": 15 + rng.normal(0, 0.5, len(index)),
+                            "Thermal_consumption": np.where(air_temp < 15, rng.uniform(0, 12, len(index)), 0.0),
+                            "SC_consumption": np.where(air_temp > 15, rng.uniform(0, 12, len(index)), 0.0)},
+                           index=index)
+    # Schedules with hours in which no source, one of them or both are working.
+    parameters = {"s1_schedule": (rng.uniform(size=(24, 7)) < 0.6).astype(np.float64),
+                  "s2_schedule": (rng.uniform(size=(24, 7)) < 0.6).astype(np.float64),
+                  "Ts1": Ts1,
+                  "Ts2": Ts2,
+                  "cap_source1": 3.0,
+                  "cap_source2": 2.0,
+                  "cap_ground": 2.5,
+                  "DT_evap": 3.0}
+
+    expected = _per_row_dispatch(dataset, **parameters)
+    result = simulate_dispatch(dataset, **parameters)
+
+    assert list(result.columns) == DISPATCH_COLUMNS
+    for column in DISPATCH_COLUMNS:
+        assert np.array_equal(result[column].to_numpy(dtype=np.float64),
+                              expected[column].to_numpy(dtype=np.float64)), column
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_ecad_dataset
+from src.ECADDataset import ECADMeanTemperatureDataset
+
+
+@pytest.mark.parametrize("use_columnar_store", [False, True])
+def test_climatology_bins_dates_on_the_leap_year_calendar(tmp_path, monkeypatch, use_columnar_store):
+    folder = write_ecad_dataset(str(tmp_path), num_stations=1, num_years=1)
+    # 2019 is a common year and 2020 a leap year: every day is 10 °C in 2019 and 20 °C in 2020, except 1 March.
+    dates = pd.date_range("2019-01-01", "2020-12-31", freq="D")
+    temperatures = np.where(dates.year == 2019, 100, 200)
+    temperatures[(dates.month == 3) & (dates.day == 1) & (dates.year == 2019)] = 500
+    temperatures[(dates.month == 3) & (dates.day == 1) & (dates.year == 2020)] = 700
+    with open(os.path.join(folder, "TG_STAID000001.txt"), "w") as f:
+        f.writelines(f"Mean temperature file, line {i + 1}\n" for i in range(20))
+        f.write("STAID, SOUID,    DATE,   TG, Q_TG\n")
+        f.writelines(f"     1,100001,{date},{temperature:5d},    0\n"
+                     for date, temperature in zip(dates.strftime("%Y%m%d"), temperatures))
+
+    monkeypatch.chdir(tmp_path)
+    climatology = ECADMeanTemperatureDataset().stream_mean_temperature_climatology(
+        use_columnar_store=use_columnar_store)
+    day_of_year = climatology["day_of_year"].loc[1]
+
+    # 1 March of both years falls in day 61, 29 February (day 60) is only measured in 2020.
+    assert day_of_year[61] == pytest.approx(60.0)
+    assert day_of_year[60] == pytest.approx(20.0)
+    assert day_of_year[59] == pytest.approx(15.0)
+    assert day_of_year[62] == pytest.approx(15.0)
+    assert day_of_year[366] == pytest.approx(15.0)
+    assert climatology["statistics"].loc[1, "num_days"] == len(dates)
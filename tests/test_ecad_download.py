@@ -0,0 +1,71 @@
+import json
+import os
+import zipfile
+
+from src.ECADDataset import ECADMeanTemperatureDataset
+
+
+def _write_zip(path: str, content: bytes):
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as f:
+        f.writestr("TG_STAID000001.txt", content)
+
+
+def test_download_resumes_partial_zip(tmp_path, monkeypatch, http_stand_in):
+    folder, url, statuses = http_stand_in
+    remote_zip_path = os.path.join(folder, "ECA_blend_tg.zip")
+    _write_zip(remote_zip_path, os.urandom(50000))
+    with open(remote_zip_path, "rb") as f:
+        remote_content = f.read()
+
+    monkeypatch.chdir(tmp_path)
+    dataset = ECADMeanTemperatureDataset(dataset_url=f"{url}/ECA_blend_tg.zip")
+    local_zip_path = os.path.join("data", "ECA_blend_tg.zip")
+
+    # An interrupted download: the first half of the zip and the validators of its response.
+    dataset._download_dataset_zip()
+    etag = json.load(open(os.path.join("data", "ECADMeanTemperatureDataset", "manifest.json")))["source"]["etag"]
+    os.replace(local_zip_path, f"{local_zip_path}.part")
+    with open(f"{local_zip_path}.part", "r+b") as f:
+        f.truncate(len(remote_content) // 2)
+    with open(f"{local_zip_path}.part.json", "w") as f:
+        json.dump({"url": dataset._dataset_url, "etag": etag, "last_modified": None}, f)
+
+    dataset._download_dataset_zip()
+    assert statuses == [200, 206]
+    assert open(local_zip_path, "rb").read() == remote_content
+    assert not os.path.exists(f"{local_zip_path}.part")
+
+    # A download interrupted after the last byte: the server answers that the range is past the end.
+    os.replace(local_zip_path, f"{local_zip_path}.part")
+    dataset._download_dataset_zip()
+    assert statuses[-1] == 416
+    assert open(local_zip_path, "rb").read() == remote_content
+
+
+def test_download_restarts_if_remote_zip_changed(tmp_path, monkeypatch, http_stand_in):
+    folder, url, statuses = http_stand_in
+    remote_zip_path = os.path.join(folder, "ECA_blend_tg.zip")
+    _write_zip(remote_zip_path, os.urandom(50000))
+
+    monkeypatch.chdir(tmp_path)
+    dataset = ECADMeanTemperatureDataset(dataset_url=f"{url}/ECA_blend_tg.zip")
+    local_zip_path = os.path.join("data", "ECA_blend_tg.zip")
+    dataset._download_dataset_zip()
+    os.replace(local_zip_path, f"{local_zip_path}.part")
+    with open(f"{local_zip_path}.part", "r+b") as f:
+        f.truncate(1000)
+    with open(f"{local_zip_path}.part.json", "w") as f:
+        json.dump({"url": dataset._dataset_url, "etag": '"stale"', "last_modified": None}, f)
+
+    # The If-Range validator does not match, so the server sends the whole zip.
+    dataset._download_dataset_zip()
+    assert statuses == [200, 200]
+    assert open(local_zip_path, "rb").read() == open(remote_zip_path, "rb").read()
+
+    # A complete .part file that is not the zip (e.g., it shrank remotely) is discarded and downloaded again.
+    os.remove(local_zip_path)
+    with open(f"{local_zip_path}.part", "wb") as f:
+        f.write(b"\0" * 100000)
+    dataset._download_dataset_zip()
+    assert statuses[-2:] == [416, 200]
+    assert zipfile.is_zipfile(local_zip_path)
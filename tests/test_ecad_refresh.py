@@ -0,0 +1,73 @@
+import os
+import shutil
+import zipfile
+
+import pandas as pd
+
+from benchmarks.synthetic import write_ecad_dataset
+from src.ECADDataset import ECADMeanTemperatureDataset
+
+
+def _write_zip(folder: str, zip_path: str):
+    with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as f:
+        for filename in sorted(os.listdir(folder)):
+            f.write(os.path.join(folder, filename), arcname=filename)
+
+
+def _sorted_mean_temperatures(dataset: ECADMeanTemperatureDataset) -> pd.DataFrame:
+    dataset.load_mean_temperatures()
+    return (dataset.mean_temperatures
+            .sort_values(["station_id", "date"])
+            .reset_index(drop=True))
+
+
+def test_refresh_dataset_appends_only_new_measurements(tmp_path, monkeypatch, http_stand_in):
+    folder, url, statuses = http_stand_in
+    remote_zip_path = os.path.join(folder, "ECA_blend_tg.zip")
+    source_folder = write_ecad_dataset(str(tmp_path / "source"), num_stations=3, num_years=2)
+    _write_zip(source_folder, remote_zip_path)
+
+    local_root = tmp_path / "local"
+    local_root.mkdir()
+    monkeypatch.chdir(local_root)
+    dataset = ECADMeanTemperatureDataset(dataset_url=f"{url}/ECA_blend_tg.zip")
+    assert set(dataset.refresh_dataset().action) == {"added"}
+    dataset.build_columnar_store()
+
+    # Nothing changed remotely: the server answers 304 and nothing is extracted or converted.
+    assert len(dataset.refresh_dataset()) == 0
+    assert statuses[-1] == 304
+
+    # The station 2 gets a new day of measurements.
+    with open(os.path.join(source_folder, "TG_STAID000002.txt"), "a") as f:
+        f.write("     2,100002,20200101,   53,    0\n")
+    _write_zip(source_folder, remote_zip_path)
+
+    store_path = os.path.join("data", "ECADMeanTemperatureDataset", "columnar_store")
+    store_files_before = {os.path.join(root, filename)
+                          for root, _, filenames in os.walk(store_path)
+                          for filename in filenames}
+    changes = dataset.refresh_dataset()
+    assert statuses[-1] == 200
+    assert changes.values.tolist() == [["TG_STAID000002.txt", "appended", 1]]
+
+    store_files_after = {os.path.join(root, filename)
+                         for root, _, filenames in os.walk(store_path)
+                         for filename in filenames}
+    new_files = store_files_after - store_files_before
+    assert store_files_before <= store_files_after
+    assert [os.path.basename(path) for path in new_files] == ["TG_STAID000002.20200101.parquet"]
+
+    # The refreshed store has the same measurements as a store built from scratch.
+    fresh_root = tmp_path / "fresh"
+    fresh_root.mkdir()
+    shutil.copy(remote_zip_path, fresh_root)
+    monkeypatch.chdir(fresh_root)
+    os.makedirs("data")
+    os.replace("ECA_blend_tg.zip", os.path.join("data", "ECA_blend_tg.zip"))
+    fresh_dataset = ECADMeanTemperatureDataset(dataset_url=f"{url}/ECA_blend_tg.zip")
+    fresh_dataset.build_columnar_store()
+    fresh = _sorted_mean_temperatures(fresh_dataset)
+
+    monkeypatch.chdir(local_root)
+    pd.testing.assert_frame_equal(_sorted_mean_temperatures(dataset), fresh)
@@ -0,0 +1,113 @@
+from math import sqrt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.network import NET_SCALING_FACTOR, PIPING_SHARE, PipeCatalogue, network_costs, network_length
+
+
+# Unsorted, with repeated inner diameters, so the first pipe in file order with D_i >= d is often neither the
+# narrowest fitting pipe nor the first of the repeated ones.
+NET_DATA = pd.DataFrame({"DN": [50, 100, 65, 80, 400, 150, 250, 500, 350],
+                         "D_i": [60.0, 120.0, 80.0, 80.0, 450.0, 170.0, 260.0, 505.0, 400.0],
+                         "SERIESX_cost": [30.0, 55.0, 40.0, 42.0, 310.0, 90.0, 150.0, 400.0, 260.0],
+                         "ins_cost_existing_district": [250.0, 300.0, 270.0, 275.0, 700.0, 380.0, 450.0, 900.0,
+                                                        600.0]})
+
+
+# Per-diameter loops and network length of the processing notebook, which the catalogue and network_costs replace.
+def _pipe_avg_diameter(d_scaling):
+    d_net_max = 505
+    D_pipe_list = []
+    for scale_factor in d_scaling:
+        D_pipe = sqrt(scale_factor * np.power(d_net_max, 2))
+        D_pipe_list.append(D_pipe)
+    return D_pipe_list
+
+
+def _first_pipe_values(net_data, avg_inner_pipe_diam, column):
+    values = []
+    for value in avg_inner_pipe_diam:
+        lo_e_range = (net_data['D_i'] >= value)
+        index_pipe = net_data['D_i'][lo_e_range].index[0]
+        values.append(net_data[column].loc[index_pipe])
+    return values
+
+
+def _get_piping_data(net_data, avg_inner_pipe_diam):
+    return _first_pipe_values(net_data, avg_inner_pipe_diam, 'DN')
+
+
+def _get_piping_cost_data(net_data, avg_inner_pipe_diam):
+    return _first_pipe_values(net_data, avg_inner_pipe_diam, 'SERIESX_cost')
+
+
+def _get_installation_costs(net_data, avg_inner_pipe_diam):
+    return _first_pipe_values(net_data, avg_inner_pipe_diam, 'ins_cost_existing_district')
+
+
+def _notebook_net_length(A_b, A_L):
+    plot_ratio = A_b / A_L
+    net_width = 61.8 * np.power(plot_ratio, -0.15)
+    return A_L / (net_width / 1000)  # km
+
+
+def _notebook_net_config(net_data, net_length_initial, piping_share, scaling_factor):
+    net_config = pd.DataFrame({'piping_share': piping_share, 'scaling_factor': scaling_factor}).astype(float)
+    net_config["dpipe_avg"] = _pipe_avg_diameter(net_config.scaling_factor)
+    net_config["DN_pipe"] = _get_piping_data(net_data, net_config.dpipe_avg)
+    net_config["pipe_price"] = _get_piping_cost_data(net_data, net_config.dpipe_avg)
+    net_config['ins_price'] = _get_installation_costs(net_data, net_config.dpipe_avg)
+    net_config['network_piping_length'] = net_length_initial * net_config.piping_share
+    net_config['network_piping_costs'] = net_config.network_piping_length * net_config.pipe_price
+    net_config['network_ins_cost'] = net_config.network_piping_length * net_config.ins_price
+    net_config['piping_cost_per_m'] = (net_config.pipe_price + net_config.ins_price)
+    net_config['total_net_cost'] = net_config.network_piping_length * (net_config.pipe_price + net_config.ins_price)
+    return net_config
+
+
+def test_catalogue_takes_the_first_pipe_in_file_order():
+    catalogue = PipeCatalogue(NET_DATA)
+    diameters = [10.0, 60.0, 61.0, 80.0, 121.0, 170.0, 399.0, 450.0, 451.0, 505.0]
+
+    assert catalogue.lookup(diameters, "DN").tolist() == _get_piping_data(NET_DATA, diameters)
+    assert catalogue.lookup(diameters, "SERIESX_cost").tolist() == _get_piping_cost_data(NET_DATA, diameters)
+    with pytest.raises(ValueError):
+        catalogue.rows([506.0])
+
+
+@pytest.mark.parametrize("A_b, A_L", [(1.778017714, 5.926725714), (0.5, 3.0)])
+def test_network_costs_match_the_notebook(A_b, A_L):
+    # The notebook computes the length in km and prices the network with its length in m.
+    net_length_initial = _notebook_net_length(A_b, A_L) * 1000
+    assert network_length(A_b, A_L) == pytest.approx(net_length_initial, rel=1e-12)
+
+    net_config = _notebook_net_config(NET_DATA, net_length_initial, PIPING_SHARE, NET_SCALING_FACTOR)
+    costs = network_costs(PipeCatalogue(NET_DATA),
+                          [network_length(A_b, A_L)],
+                          piping_shares=PIPING_SHARE,
+                          scaling_factors=NET_SCALING_FACTOR,
+                          pipe_type="SERIESX_cost",
+                          district_type="ins_cost_existing_district")
+
+    for column in ["dpipe_avg", "DN_pipe", "pipe_price", "ins_price", "piping_cost_per_m"]:
+        np.testing.assert_allclose(costs[column][0], net_config[column], rtol=1e-12, err_msg=column)
+    for column in ["network_piping_length", "network_piping_costs", "network_ins_cost", "total_net_cost"]:
+        np.testing.assert_allclose(costs[column][0, 0], net_config[column], rtol=1e-12, err_msg=column)
+
+
+def test_network_costs_of_several_configurations_and_lengths():
+    piping_shares = [PIPING_SHARE, [0.5, 0.2, 0.1, 0.1, 0.05, 0.05]]
+    scaling_factors = [NET_SCALING_FACTOR, [0.01, 0.05, 0.2, 0.3, 0.5, 0.9]]
+    lengths = network_length([1.0, 1.5, 2.0], [5.0, 5.5, 6.0])
+    costs = network_costs(PipeCatalogue(NET_DATA), lengths, piping_shares=piping_shares,
+                          scaling_factors=scaling_factors)
+
+    assert costs["total_net_cost"].shape == (2, 3, 6)
+    for configuration in range(2):
+        for position, length in enumerate(lengths):
+            net_config = _notebook_net_config(NET_DATA, length, piping_shares[configuration],
+                                              scaling_factors[configuration])
+            np.testing.assert_allclose(costs["total_net_cost"][configuration, position], net_config.total_net_cost,
+                                       rtol=1e-12)
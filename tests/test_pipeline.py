@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from src.InsPireDataset import InsPireDataset
+from src.pipeline import run_city_pipeline
+from src.sweep import THERMAL_LOAD_PATH, load_simulation_values, load_thermal_load
+
+
+SIMULATION_VALUES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data",
+                                      "simulation_values.json")
+
+
+@pytest.fixture
+def rome(inspire_root, monkeypatch) -> pd.DataFrame:
+    monkeypatch.chdir(inspire_root)
+    return InsPireDataset().load_data(lazy=True)[InsPireDataset.ROME_IT]
+
+
+# Cells of the processing notebook that the demand and signature stages replace.
+def _notebook_thermal_load(path):
+    thermal_load_data = pd.read_excel(path)
+    thermal_load_data['timestamp'] = pd.date_range(start='1/1/2017', freq="MS", periods=12)
+    thermal_load_data = thermal_load_data.set_index("timestamp")
+    thermal_load_data = thermal_load_data.resample("H").ffill()
+    df3 = thermal_load_data.iloc[[-1]].rename(lambda x: x + pd.offsets.YearBegin())
+    # DataFrame.append in the notebook.
+    return pd.concat([thermal_load_data, df3]).resample('h').ffill().iloc[:-1]
+
+
+def _notebook_climatic_curve(Tamb_h, Tmin_i, Tmax_i):
+    Tmin_o = 2.38
+    Tmax_o = 7.25
+    if Tamb_h <= Tmin_o:
+        Tsh = Tmax_i
+    elif Tamb_h >= Tmax_o:
+        Tsh = Tmin_i
+    else:
+        m = (Tmax_i - Tmin_i) / (Tmin_o - Tmax_o)
+        b = -m * Tmin_o + Tmax_i
+        Tsh = m * Tamb_h + b
+    return Tsh
+
+
+def _notebook_processing(dataset, thermal_load_data, values):
+    dataset = dataset.copy()
+    T_base_heat_degree = values["T_base_heat_degree"]
+
+    dataset['Thermal_consumption'] = thermal_load_data.heating_profile
+    dataset["SH_dist"] = thermal_load_data.heating_profile * dataset["%SH_y"]
+    dataset['DHW_dist'] = thermal_load_data.heating_profile * dataset["%DHW_y"]
+    dataset['SC_consumption'] = thermal_load_data.cooling_profile
+
+    dataset["Total_consumption_fit"] = np.nan
+    records_with_heat_degree_days = dataset[dataset.air_temp <= T_base_heat_degree]
+    # The hour after the thermal load (2018-01-01 00:00) has no consumption and is left out of the fit.
+    fit_records = records_with_heat_degree_days.dropna(subset=["Thermal_consumption"])
+    if records_with_heat_degree_days.shape[0] > 0:
+        slope, intercept, r_value, p_value, std_err = stats.linregress(fit_records.air_temp,
+                                                                       fit_records.Thermal_consumption)
+        dataset["Total_consumption_fit"] = slope * records_with_heat_degree_days.air_temp + intercept
+
+    dataset['space_heating_temp'] = dataset.air_temp.apply(_notebook_climatic_curve,
+                                                           args=(values["Tmin_i"], values["Tmax_i"]))
+    dataset["hot_water_temp"] = values["Tdhw"]
+
+    sh_consumption_ratio = dataset["SH_dist"] / dataset["Thermal_consumption"]
+    dhw_consumption_ratio = dataset["DHW_dist"] / dataset["Thermal_consumption"]
+    dataset["user_temp"] = (sh_consumption_ratio * dataset.space_heating_temp
+                            + dhw_consumption_ratio * dataset.hot_water_temp)
+    return dataset
+
+
+def test_processed_city_matches_the_notebook(rome, tmp_path):
+    values = load_simulation_values(SIMULATION_VALUES_PATH)
+    output_path = str(tmp_path / "rome_it_data")
+    report = run_city_pipeline("InsPireDataset", InsPireDataset.ROME_IT, rome, values, cache_dir=None,
+                               output_path=output_path, thermal_load=load_thermal_load())
+
+    assert report["skipped"] == dict() and report["output"] == output_path
+    processed = pd.read_parquet(f"{output_path}.parquet", engine="pyarrow")
+    expected = _notebook_processing(rome, _notebook_thermal_load(THERMAL_LOAD_PATH), values)
+
+    assert "heating_profile" not in processed.columns and "cooling_profile" not in processed.columns
+    assert np.isnan(processed["Thermal_consumption"].iloc[-1])
+    assert processed["Total_consumption_fit"].notna().sum() > 0
+    for column in ["Thermal_consumption", "SH_dist", "DHW_dist", "SC_consumption", "Total_consumption_fit",
+                   "space_heating_temp", "hot_water_temp", "user_temp"]:
+        # The notebook computes the fit in the float32 of air_temp.
+        np.testing.assert_allclose(processed[column].to_numpy(), expected[column].to_numpy(dtype=np.float64),
+                                   rtol=1e-6, err_msg=column)
+
+
+def test_city_without_thermal_load_is_not_written(rome, tmp_path):
+    values = load_simulation_values(SIMULATION_VALUES_PATH)
+    output_path = str(tmp_path / "rome_it_data")
+    report = run_city_pipeline("InsPireDataset", InsPireDataset.ROME_IT, rome, values, cache_dir=None,
+                               output_path=output_path)
+
+    assert report["stages"]["demand"] == "skipped" and report["stages"]["fitting"] == "computed"
+    assert report["output"] is None and report["not_written"] is not None
+    assert not os.path.exists(f"{output_path}.parquet")
+
+
+def test_thermal_load_is_part_of_the_demand_key(rome, tmp_path):
+    values = load_simulation_values(SIMULATION_VALUES_PATH)
+    thermal_load = load_thermal_load()
+    cache_dir = str(tmp_path / "cache")
+    run_city_pipeline("InsPireDataset", InsPireDataset.ROME_IT, rome, values, cache_dir=cache_dir,
+                      thermal_load=thermal_load)
+
+    report = run_city_pipeline("InsPireDataset", InsPireDataset.ROME_IT, rome, values, cache_dir=cache_dir,
+                               thermal_load=thermal_load)
+    assert set(report["stages"].values()) == {"cached"}
+
+    report = run_city_pipeline("InsPireDataset", InsPireDataset.ROME_IT, rome, values, cache_dir=cache_dir,
+                               thermal_load=thermal_load * 2)
+    assert report["stages"]["fitting"] == "cached" and report["stages"]["ground"] == "cached"
+    for name in ["demand", "signature", "dispatch", "costing"]:
+        assert report["stages"][name] == "computed", name